@@ -1,4 +1,3 @@
-import duckdb
 from llms_evaluator import LLMsEvaluator
 
 
@@ -6,9 +5,7 @@ def setup_duckdb_tpch():
     """
     Set up DuckDB with TPCH sample data.
     """
-    # Connect to DuckDB file
-    conn = duckdb.connect("./docs/tpch-sf10.db")
-    
+    # The evaluator opens the DuckDB file set in DUCKDB_PATH (read-only)
     try:
 
         evaluator = LLMsEvaluator(
@@ -37,8 +34,6 @@ def setup_duckdb_tpch():
         
     except Exception as e:
         print(f"Error setting up DuckDB: {e}")
-    finally:
-        conn.close()
 
 
 if __name__ == "__main__":
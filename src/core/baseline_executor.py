@@ -1,5 +1,7 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from data.baseline_store import BaselineStore
 from data.questions_loader import QuestionsLoader
 from utils.file_utils import FileUtils
 
@@ -23,52 +25,107 @@ class BaselineExecutor:
         drop_results_if_exists: bool = False,
         questions_file_name: str = None,
         database_source: str = None,
+        force: bool = False,
+        max_workers: int = 1,
+        direct_export: bool = False,
     ):
         """
-        Run the SQL queries from the questions file and export the results to CSV files.
+        Run the SQL queries from the questions file and export the results to CSV files,
+        and to Arrow files when pyarrow is installed (see BaselineStore).
+
+        Baselines are regenerated incrementally: the manifest keeps a hash of the SQL query,
+        data source and database of each question, and only new or changed questions are
+        executed again, unless force is set.
+
+        With max_workers greater than 1 the queries run concurrently, each worker on its own
+        DuckDB cursor or pooled SQL Server connection (see DatabaseService.get_connection).
+        Each result is written when its query finishes, and the summary is written in the
+        order of the questions once all of them are done.
+
+        With direct_export and the DuckDB source, each query is written to a Parquet file by
+        DuckDB (COPY ... TO, see DatabaseService.export_sql_query) and the CSV file is written
+        from it, so the results are never fetched into pandas.
 
         :param questions: List of questions to process.
         :param sql_query_column: Column name in the questions file that contains the SQL queries.
         :param summary_file_name: Name of the summary file to be created.
         :param results_to_path: Path where the results will be saved.
         :param persist_results: If True, the results will be saved to CSV files.
-        :param drop_results_if_exists: If True, the existing results will be removed before running the queries.
+        :param drop_results_if_exists: If True, the results of questions no longer in the questions file
+            are removed, and with force all the existing results are removed before running the queries.
         :param questions_file_name: Fallback file name if questions is None.
         :param database_source: The database source to execute the queries against.
+        :param force: If True, all the queries are executed, even if their baseline is up to date.
+        :param max_workers: Number of baseline queries executed concurrently.
+        :param direct_export: If True, DuckDB writes the results to the files without pandas.
         :return: None
         """
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be greater than 0, got {max_workers}.")
+
+        if direct_export and (not persist_results or self.db_service.decode_source(database_source) != "duckdb"):
+            print(
+                f"[WARNING] Direct export requires DuckDB and persisted results, "
+                f"results from {database_source} are fetched into pandas."
+            )
+            direct_export = False
 
         if questions is None and questions_file_name:
             questions = QuestionsLoader.load_questions_from_file(questions_file_name)
 
-        if drop_results_if_exists:
+        if drop_results_if_exists and force:
             FileUtils.remove_baseline_datasets(results_to_path)
 
-        summary_text = []
-        summary_text.append("question_number\tduration_sql\tcolumns\trows")
+        # e.g. the baseline folder of the smoke tier, under a results path of its own
+        os.makedirs(results_to_path, exist_ok=True)
 
-        for question in questions:
+        store = BaselineStore(results_to_path) if persist_results else None
+        if store is not None and not force:
+            store.load_manifest()
+        database = self.db_service.database_identity(database_source)
 
-            question_number = question["question_number"]
-            sql_query = question.get(sql_query_column, "")
-            df, executed, rows, columns, duration_sql = self.db_service.execute_sql_query(
-                sql_query, database_source
-            )
+        summary_text = []
+        summary_text.append("question_number\tduration_sql\tcolumns\trows")
 
-            summary_text.append(f"{question_number}\t{duration_sql:.1f}\t{columns}\t{rows}")
-
-            if df is not None and not df.empty and persist_results:
-                file_name = f"{results_to_path}/question_{int(question_number):02d}.csv"
-                file_name = file_name.replace("//", "/")
-                df.to_csv(
-                    file_name,
-                    index=False,
-                    header=True,
-                    encoding="utf-8",
-                    sep="\t",
+        if max_workers <= 1:
+            results = [
+                self._execute_question(
+                    question, sql_query_column, store, database_source, database, force, direct_export
                 )
-
-        print(f"  Question #{question_number}: SQL: {duration_sql:.1f} sec(s), " f"{rows} row(s) affected...")
+                for question in questions
+            ]
+        else:
+            # each result is written as soon as its query finishes, the summary keeps the questions order
+            results = [None] * len(questions)
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="baseline") as executor:
+                futures = {
+                    executor.submit(
+                        self._execute_question,
+                        question,
+                        sql_query_column,
+                        store,
+                        database_source,
+                        database,
+                        force,
+                        direct_export,
+                    ): index
+                    for index, question in enumerate(questions)
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+
+        summary_text.extend(summary_line for summary_line, _ in results)
+        unchanged = sum(1 for _, executed in results if not executed)
+
+        if store is not None:
+            if drop_results_if_exists:
+                current = {int(question["question_number"]) for question in questions}
+                for question_number in store.stored_question_numbers():
+                    if question_number not in current:
+                        store.remove(question_number)
+            store.save_manifest()
+
+        print(f"  {len(questions) - unchanged} baseline queries executed, {unchanged} unchanged.")
 
         # save the summary file
         summary_file_path = os.path.join(results_to_path, summary_file_name)
@@ -78,3 +135,54 @@ class BaselineExecutor:
             file.write("\n".join(summary_text))
         print(f"Summary file {summary_file_path} generated.")
         print("All baseline queries processed.")
+
+    def _execute_question(self, question, sql_query_column, store, database_source, database, force, direct_export):
+        """
+        Execute the baseline query of a question and write its result, unless its baseline is up to date.
+        The duration is measured by the worker running the query.
+
+        :return: Tuple (summary line, True if the query was executed).
+        """
+        question_number = question["question_number"]
+        sql_query = question.get(sql_query_column, "")
+        content_hash = BaselineStore.content_hash(sql_query, database_source, database)
+
+        if store is not None and not force and store.is_current(question_number, content_hash):
+            # same query, source and database: keep the baseline
+            entry = store.entry(question_number)
+            print(f"  Question #{question_number}: unchanged, baseline kept.")
+            return f"{question_number}\t{entry['duration_sql']:.1f}\t{entry['columns']}\t{entry['rows']}", False
+
+        if direct_export:
+            store.remove(question_number)
+            executed, rows, schema, duration_sql = self.db_service.export_sql_query(
+                sql_query,
+                database_source,
+                store.file_path(question_number, "parquet"),
+                csv_path=store.file_path(question_number, "csv"),
+            )
+            columns = len(schema)
+            if executed:
+                store.add_exported(question_number, rows, schema, content_hash, duration_sql)
+        elif store is not None and store.available():
+            # the Arrow file of the baseline keeps the types of the database (e.g. DECIMAL)
+            table, executed, rows, columns, duration_sql = self.db_service.fetch_arrow_sql_query(
+                sql_query, database_source
+            )
+            if executed:
+                store.write(question_number, None, content_hash, duration_sql, table=table)
+            else:
+                # executed again on the next run
+                store.remove(question_number)
+        else:
+            df, executed, rows, columns, duration_sql, _ = self.db_service.execute_sql_query(sql_query, database_source)
+            if store is not None:
+                if executed:
+                    store.write(question_number, df, content_hash, duration_sql)
+                else:
+                    # executed again on the next run
+                    store.remove(question_number)
+
+        print(f"  Question #{question_number}: SQL: {duration_sql:.1f} sec(s), " f"{rows} row(s) affected...")
+
+        return f"{question_number}\t{duration_sql:.1f}\t{columns}\t{rows}", True
@@ -1,6 +1,9 @@
 import os
 import time
 
+from core.task_scheduler import TaskScheduler
+from data.baseline_store import BaselineIndex
+
 
 class ModelEvaluator:
     """
@@ -27,6 +30,7 @@ class ModelEvaluator:
         log_summary=True,
         iteration="",
         data_source=None,
+        max_workers=1,
     ):
         """
         Iterate each model and execute each sql question.
@@ -35,7 +39,7 @@ class ModelEvaluator:
         :param models: List of models to evaluate.
         :param models_configs: Model configurations.
         :param all_questions: List of all questions to process.
-        :param baseline_datasets: Baseline datasets for comparison.
+        :param baseline_datasets: Baseline datasets for comparison (BaselineIndex, or a list of entries).
         :param semantic_rules: Semantic rules content.
         :param system_message: System message template.
         :param temperature: Temperature for the LLM.
@@ -45,6 +49,8 @@ class ModelEvaluator:
         :param log_summary: If True, a summary file will be created with the results.
         :param iteration: Iteration identifier.
         :param data_source: The database source to execute the queries against.
+        :param max_workers: Number of (model, question) tasks executed concurrently.
+            With 1 the models and questions are processed one by one.
         :return: files_generated: List of generated files,
                 summary_text: Summary of the processing with the model.
         """
@@ -63,6 +69,9 @@ class ModelEvaluator:
         ):
             raise Exception("One or more required configuration variables are None.")
 
+        if not isinstance(baseline_datasets, BaselineIndex):
+            baseline_datasets = BaselineIndex(baseline_datasets)
+
         files_generated = []
         summary_text = []
 
@@ -81,7 +90,10 @@ class ModelEvaluator:
                 "Timestamp\tQuestion\tModel\tLLM_time\tSQL_time\tRows\tColumns\t"
                 "Rows_equality\tColumns_equality\tDatasets_equality\t"
                 "Total_tokens\tPrompt_tokens\tCompletion_tokens\t"
-                "Cost_total_EUR\tCost_input_tokens_EUR\tCost_output_tokens_EUR\n"
+                "Cost_total_EUR\tCost_input_tokens_EUR\tCost_output_tokens_EUR\t"
+                "Cache_hit\tDatasets_multiset_equality\tTimed_out\tAdmission\tProxy_failed\t"
+                "LLM_TTFT\tLLM_tokens_per_sec\tLLM_overhead\t"
+                "LLM_attempts\tLLM_hedges\tLLM_wasted_tokens\tCost_wasted_EUR\n"
             )
 
             summary_text.append(row_header)
@@ -94,49 +106,44 @@ class ModelEvaluator:
             with open(summary_file_path, "w", encoding="utf-8") as file:
                 file.write("\n".join(summary_text))
 
-        for model in models:
-
-            model_id = model["id"]
-            if model_id is None or model_id == "":
-                raise ValueError(f"Model {model_id} not found in the variable model.")
-
-            model_name = model["name"]
-            if model_name is None or model_name == "":
-                raise ValueError(f"Model {model_name} not found in the variable model.")
-
-            print(f"\nProcessing questions with model {model_name}, temperature {temperature}")
+        models_to_process = [(model, self._get_model_config(model, models_configs)) for model in models]
 
-            model_config = next(
-                (cfg for cfg in models_configs if cfg["id"] == model_id),
-                None,
-            )
-
-            if model_config is None:
-                raise ValueError(f"Model {model_id} not found in the variable model_config.")
-
-            model_summary_text = self.question_processor.process_questions_with_model(
-                questions=all_questions,
+        if max_workers > 1:
+            model_results = self._process_models_concurrently(
+                models=models_to_process,
+                all_questions=all_questions,
                 baseline_datasets=baseline_datasets,
-                model=model,
-                model_config=model_config,
+                semantic_rules=semantic_rules,
                 system_message=system_message,
+                temperature=temperature,
+                iteration=iteration,
+                data_source=data_source,
+                max_workers=max_workers,
+            )
+        else:
+            model_results = self._process_models_serially(
+                models=models_to_process,
+                all_questions=all_questions,
+                baseline_datasets=baseline_datasets,
                 semantic_rules=semantic_rules,
+                system_message=system_message,
                 temperature=temperature,
-                max_tokens=10000,
                 iteration=iteration,
                 data_source=data_source,
             )
 
+        for model, model_questions, model_summary_text in model_results:
+
             if log_results:
                 # save the results to a YAML file
                 file_name = f"{results_to_path}/{file_name_prefix}_{model['name']}_{d}.yaml"
                 file_name = file_name.replace("//", "/")
                 if os.path.exists(file_name):
                     os.remove(file_name)
-                self.questions_obj.save_questions(yaml_file=file_name)
+                self.questions_obj.save_questions(yaml_file=file_name, questions=model_questions)
                 files_generated.append(file_name)
 
-            print(f"Processed questions with model {model_name}")
+            print(f"Processed questions with model {model['name']}")
             print("---")
 
             if log_summary:
@@ -149,3 +156,117 @@ class ModelEvaluator:
         print("All batches processed.")
 
         return files_generated, summary_text
+
+    def _process_models_serially(
+        self,
+        models,
+        all_questions,
+        baseline_datasets,
+        semantic_rules,
+        system_message,
+        temperature,
+        iteration,
+        data_source,
+    ):
+        """
+        Process the questions of each model one after the other.
+
+        :return: generator of (model, processed questions, summary lines) per model.
+        """
+        for model, model_config in models:
+
+            print(f"\nProcessing questions with model {model['name']}, temperature {temperature}")
+
+            model_summary_text = self.question_processor.process_questions_with_model(
+                questions=all_questions,
+                baseline_datasets=baseline_datasets,
+                model=model,
+                model_config=model_config,
+                system_message=system_message,
+                semantic_rules=semantic_rules,
+                temperature=temperature,
+                max_tokens=10000,
+                iteration=iteration,
+                data_source=data_source,
+            )
+
+            yield model, all_questions, model_summary_text
+
+    def _process_models_concurrently(
+        self,
+        models,
+        all_questions,
+        baseline_datasets,
+        semantic_rules,
+        system_message,
+        temperature,
+        iteration,
+        data_source,
+        max_workers,
+    ):
+        """
+        Process all the (model, question) pairs on a pool of max_workers threads.
+        Results are still returned per model and in the order of the models list,
+        so the generated files are identical to the serial execution.
+
+        :return: generator of (model, processed questions, summary lines) per model.
+        """
+        print(
+            f"\nProcessing {len(models)} model(s) x {len(all_questions)} question(s) "
+            f"with {max_workers} worker(s), temperature {temperature}"
+        )
+
+        scheduler = TaskScheduler(
+            self.question_processor,
+            max_workers=max_workers,
+            get_rate_limiter=self.question_processor.llm_service.get_rate_limiter,
+        )
+
+        for model, model_questions, model_summary_text in scheduler.run(
+            models=models,
+            questions=all_questions,
+            baseline_datasets=baseline_datasets,
+            system_message=system_message,
+            semantic_rules=semantic_rules,
+            temperature=temperature,
+            max_tokens=10000,
+            iteration=iteration,
+            data_source=data_source,
+        ):
+            total_rows = sum(question["rows"] for question in model_questions)
+            total_time_sql = round(sum(question["duration_sql"] for question in model_questions), 2)
+            total_time_llm = round(sum(question["duration_llm"] for question in model_questions), 2)
+
+            print(
+                f"  Batch summary ({model['name']}): processed {len(model_questions)} queries, "
+                f"{total_rows} rows, {total_time_sql} sec SQL, {total_time_llm} sec LLM"
+            )
+
+            yield model, model_questions, model_summary_text
+
+    @staticmethod
+    def _get_model_config(model, models_configs):
+        """
+        Validate the model and get its provider configuration.
+
+        :param model: Model to evaluate.
+        :param models_configs: Model configurations.
+        :return: the configuration of the provider of the model.
+        """
+        model_id = model["id"]
+        if model_id is None or model_id == "":
+            raise ValueError(f"Model {model_id} not found in the variable model.")
+
+        model_name = model["name"]
+        if model_name is None or model_name == "":
+            raise ValueError(f"Model {model_name} not found in the variable model.")
+
+        model_config = next(
+            (cfg for cfg in models_configs if cfg["id"] == model_id),
+            None,
+        )
+
+        if model_config is None:
+            raise ValueError(f"Model {model_id} not found in the variable model_config.")
+
+        return model_config
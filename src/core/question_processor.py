@@ -1,9 +1,12 @@
+import os
 import time
 import uuid
 
 from langfuse import get_client, observe
 
 from utils.data_utils import DataUtils
+from utils.llm_utils import latency_metrics
+from utils.plan_utils import format_plan_summary, plan_rejection
 from utils.sql_utils import remove_quotations
 
 
@@ -13,10 +16,50 @@ class QuestionProcessor:
     Extracted from LLMsEvaluator.process_questions_with_model()
     """
 
-    def __init__(self, llm_service, db_service, db_schema):
+    def __init__(
+        self,
+        llm_service,
+        db_service,
+        db_schema,
+        comparison_backend="pandas",
+        query_timeout=None,
+        admission=None,
+        admission_timeout=None,
+        proxy_db_service=None,
+    ):
+        """
+        :param llm_service: LLM service generating the SQL queries.
+        :param db_service: Database service executing the SQL queries.
+        :param db_schema: Database schema tables.
+        :param comparison_backend: "pandas" to fetch the LLM results and compare them in pandas,
+            "duckdb" to compare them inside the database when the source is DuckDB,
+            "streaming" to fetch them in chunks and compare them as they are fetched.
+        :param query_timeout: Seconds after which an LLM-generated query is cancelled (0 for no timeout),
+            defaults to SQL_QUERY_TIMEOUT. A question can override it with its query_timeout key.
+        :param admission: What to do with the LLM queries whose estimated plan cannot match the baseline
+            (see utils.plan_utils.plan_rejection): "off" to run them without checking the plan, "reject"
+            to not run them, "deprioritize" to run them with admission_timeout. Defaults to SQL_ADMISSION.
+        :param admission_timeout: Seconds given to the deprioritized queries (0 for no limit),
+            defaults to SQL_ADMISSION_TIMEOUT or 10.
+        :param proxy_db_service: Database service of a small proxy of the DuckDB database (e.g. a lower
+            TPC-H scale factor). The LLM queries are run there first and only the ones that pass are run
+            against the full-size database, None to run them directly.
+        """
+        if query_timeout is None:
+            query_timeout = float(os.getenv("SQL_QUERY_TIMEOUT", 0))
+        if admission is None:
+            admission = os.getenv("SQL_ADMISSION", "off")
+        if admission_timeout is None:
+            admission_timeout = float(os.getenv("SQL_ADMISSION_TIMEOUT", 10))
+
         self.llm_service = llm_service
         self.db_service = db_service
         self.db_schema = db_schema
+        self.comparison_backend = comparison_backend
+        self.query_timeout = query_timeout
+        self.admission = admission
+        self.admission_timeout = admission_timeout
+        self.proxy_db_service = proxy_db_service
 
     @observe(capture_input=False, capture_output=True)
     def process_questions_with_model(
@@ -38,7 +81,7 @@ class QuestionProcessor:
         and log the results.
 
         :param questions: List of questions to process.
-        :param baseline_datasets: Baseline datasets for comparison.
+        :param baseline_datasets: Baseline datasets for comparison (BaselineIndex).
         :param model: Model to use for generating chat completions.
         :param model_config: Model configuration [id, endpoint, api_key].
         :param system_message: System message template.
@@ -59,125 +102,25 @@ class QuestionProcessor:
         summary_text = []
 
         for question in questions:
-            
-            # Assign iteration and model_name to each question
-            question["iteration"] = iteration
-            question["model_name"] = model.get("name", "")
-
-            question_number = question["question_number"]
-            user_question = question["user_question"]
-            tables_used = question["tables_used"]
-            sql_query = ""
-
-            table_scripts = []
-
-            for table in tables_used:
-                table_script = self.db_schema.get_table_script(table)
-                if table_script:
-                    table_scripts.append(table_script)
-            database_tables_context = "\n".join(table_scripts)
-
-            # Get the platform for this specific model from the model_config
-            selected_model = next(
-                (
-                    m
-                    for m in model_config.get("models", [])
-                    if m.get("name") == model["name"]
-                ),
-                {},
-            )
-            # Default fallback
-            platform = selected_model.get("platform", "azure_openai")
 
-            # Call the process_query function with the loaded question
-            sql_query, metadata = self.llm_service.generate_sql_query(
-                platform=platform,
+            row_log = self.process_question(
+                question=question,
+                baseline_datasets=baseline_datasets,
                 model=model,
-                question_number=question_number,
-                user_prompt=user_question,
-                database_tables_context=database_tables_context,
-                temperature=temperature,
-                max_tokens=max_tokens,
+                model_config=model_config,
                 system_message=system_message,
                 semantic_rules=semantic_rules,
-                **model_config,
-            )
-
-            sql_query, changed = remove_quotations(sql_query)
-            df, executed, rows, columns, duration_sql = self.db_service.execute_sql_query(
-                sql_query, data_source
-            )
-
-            # compare the result with the baseline
-            baseline_entry = next(
-                (item for item in baseline_datasets if item["question_number"] == question_number),
-                None,
-            )
-            baseline_df = baseline_entry["df"] if baseline_entry else None
-
-            (
-                rows_equality,
-                columns_equality,
-                datasets_equality,
-            ) = DataUtils.compare_dataframes(baseline_df, df, question_number)
-
-            duration_llm = round(metadata.get("duration", 0), 2)
-
-            question["llm_sql_query"] = sql_query
-            question["tables_used"] = tables_used
-            question["executed"] = executed
-            question["rows"] = rows
-            question["columns"] = columns
-            
-            question["rows_equality"] = rows_equality
-            question["columns_equality"] = columns_equality
-            question["datasets_equality"] = datasets_equality
-
-            question["duration_sql"] = duration_sql
-            question["duration_llm"] = duration_llm
-            question["llm_sql_query_changed"] = changed
-
-            question["total_tokens"] = metadata.get("total_tokens", 0)
-            question["prompt_tokens"] = metadata.get("prompt_tokens", 0)
-            question["completion_tokens"] = metadata.get("completion_tokens", 0)
-
-            selected_model = next(
-                (m for m in model_config.get("models", []) if m.get("name") == model["name"]),
-                {},
-            )
-
-            # Calculate costs
-            cost_input_EUR = question["prompt_tokens"] * (selected_model.get("cost_input_tokens_EUR_1K", 0.0) / 1000)
-            cost_output_EUR = question["completion_tokens"] * (
-                selected_model.get("cost_output_tokens_EUR_1K", 0.0) / 1000
+                temperature=temperature,
+                max_tokens=max_tokens,
+                iteration=iteration,
+                data_source=data_source,
             )
-            question["cost_input_EUR"] = round(cost_input_EUR, 6)
-            question["cost_output_EUR"] = round(cost_output_EUR, 6)
-            question["cost_total_EUR"] = round(cost_input_EUR + cost_output_EUR, 6)
 
-            total_rows += rows
-            total_time_sql += duration_sql
-            total_time_llm += duration_llm
+            total_rows += question["rows"]
+            total_time_sql += question["duration_sql"]
+            total_time_llm += question["duration_llm"]
             total_queries += 1
 
-            print(
-                f"    Question #{question_number:02d}: LLM: {duration_llm:.1f} sec(s), "
-                f"SQL: {duration_sql:.1f} sec(s), {rows} row(s) and {columns} column(s) affected. "
-                f"{rows_equality} rows equality, "
-                f"{columns_equality} columns equality, "
-                f"{datasets_equality} datasets equality."
-            )
-
-            row_log = (
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{question_number}\t{model.get('name', '')}\t"
-                f"{duration_llm:.1f}\t{duration_sql:.1f}\t{rows}\t{columns}\t"
-                f"{rows_equality}\t{columns_equality}\t"
-                f"{datasets_equality}\t"
-                f"{question['total_tokens']}\t{question['prompt_tokens']}\t"
-                f"{question['completion_tokens']}\t{question['cost_total_EUR']}\t"
-                f"{question['cost_input_EUR']}\t{question['cost_output_EUR']}"
-            )
-
             summary_text.append(row_log)
 
         batch_id = "batch_id-" + str(uuid.uuid4())
@@ -208,3 +151,257 @@ class QuestionProcessor:
         print(f"  Batch ID     : {batch_id} processed in {total_time} second(s)\n")
 
         return summary_text
+
+    @observe(capture_input=False, capture_output=True)
+    def process_question(
+        self,
+        question,
+        baseline_datasets,
+        model,
+        model_config,
+        system_message,
+        semantic_rules,
+        temperature,
+        max_tokens,
+        iteration,
+        data_source,
+    ):
+        """
+        Process a single question: generate the SQL query using the LLM,
+        run the SQL Query and compare the results with the baseline.
+        The question dictionary is updated in place with the results.
+
+        :param question: Question to process.
+        :param baseline_datasets: Baseline datasets for comparison (BaselineIndex).
+        :param model: Model to use for generating chat completions.
+        :param model_config: Model configuration [id, endpoint, api_key].
+        :param system_message: System message template.
+        :param semantic_rules: Semantic rules content.
+        :param temperature: Temperature for the LLM.
+        :param max_tokens: Maximum tokens for the LLM.
+        :param iteration: Iteration identifier.
+        :param data_source: The database source to execute the queries against.
+        :return: summary line (tab separated) of the processed question.
+        """
+
+        # Assign iteration and model_name to each question
+        question["iteration"] = iteration
+        question["model_name"] = model.get("name", "")
+
+        question_number = question["question_number"]
+        user_question = question["user_question"]
+        tables_used = question["tables_used"]
+        sql_query = ""
+
+        table_scripts = []
+
+        for table in tables_used:
+            table_script = self.db_schema.get_table_script(table)
+            if table_script:
+                table_scripts.append(table_script)
+        database_tables_context = "\n".join(table_scripts)
+
+        # Get the platform for this specific model from the model_config
+        selected_model = next(
+            (m for m in model_config.get("models", []) if m.get("name") == model["name"]),
+            {},
+        )
+        # Default fallback
+        platform = selected_model.get("platform", "azure_openai")
+
+        # Call the process_query function with the loaded question
+        llm_start = time.time()
+        sql_query, metadata = self.llm_service.generate_sql_query(
+            platform=platform,
+            model=model,
+            question_number=question_number,
+            user_prompt=user_question,
+            database_tables_context=database_tables_context,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            system_message=system_message,
+            semantic_rules=semantic_rules,
+            **model_config,
+        )
+        llm_wall_time = time.time() - llm_start
+
+        sql_query, changed = remove_quotations(sql_query)
+
+        baseline_entry = baseline_datasets.get(question_number)
+        baseline_df = baseline_entry["df"] if baseline_entry else None
+        baseline_profile = baseline_entry["precision_profile"] if baseline_entry else None
+
+        # the timeout of the question overrides the global one
+        query_timeout = question.get("query_timeout")
+        if query_timeout is None:
+            query_timeout = self.query_timeout
+
+        admission = self._admit(sql_query, data_source, baseline_df, question_number)
+        if admission == "deprioritized" and self.admission_timeout:
+            query_timeout = min(query_timeout or self.admission_timeout, self.admission_timeout)
+
+        proxy_failed = False
+        if self.proxy_db_service is not None and sql_query and admission != "rejected":
+            # the query is only promoted to the full-size database if it runs on the proxy
+            passed, proxy_duration_sql, proxy_timed_out = self.proxy_db_service.check_sql_query(
+                sql_query, data_source, query_timeout
+            )
+            proxy_failed = not passed
+
+        if admission == "rejected":
+            # the plan cannot match the baseline, the query is not run
+            executed, rows, columns, duration_sql, timed_out = False, 0, 0, 0, False
+            metrics = (0.00, 0.00, 0.00, 0.00)
+        elif proxy_failed:
+            # failed on the proxy, the time spent there is the SQL time
+            executed, rows, columns, duration_sql, timed_out = False, 0, 0, proxy_duration_sql, proxy_timed_out
+            metrics = (0.00, 0.00, 0.00, 0.00)
+        elif self.comparison_backend == "duckdb" and self.db_service.decode_source(data_source) == "duckdb":
+            # run the query and compare the result with the baseline inside DuckDB
+            _, executed, rows, columns, duration_sql, metrics, timed_out = self.db_service.compare_with_baseline(
+                sql_query, data_source, baseline_df, question_number, baseline_profile, timeout=query_timeout
+            )
+        elif self.comparison_backend == "streaming":
+            # fetch the result in chunks, stopping once the metrics cannot change
+            _, executed, rows, columns, duration_sql, metrics, timed_out = self.db_service.compare_streaming(
+                sql_query,
+                data_source,
+                baseline_df,
+                question_number,
+                baseline_profile,
+                baseline_entry.prepared if baseline_entry else None,
+                timeout=query_timeout,
+            )
+        else:
+            df, executed, rows, columns, duration_sql, timed_out = self.db_service.execute_sql_query(
+                sql_query, data_source, query_timeout
+            )
+
+            # compare the result with the baseline
+            metrics = DataUtils.compare_dataframes(
+                baseline_df,
+                df,
+                question_number,
+                baseline_profile,
+                baseline_entry.prepared if baseline_entry else None,
+            )
+
+        (
+            rows_equality,
+            columns_equality,
+            datasets_equality,
+            datasets_multiset_equality,
+        ) = metrics
+
+        duration_llm = round(metadata.get("duration", 0), 2)
+        time_to_first_token, tokens_per_sec, llm_overhead = latency_metrics(metadata, llm_wall_time)
+
+        question["llm_sql_query"] = sql_query
+        question["tables_used"] = tables_used
+        question["executed"] = executed
+        question["timed_out"] = timed_out
+        question["admission"] = admission
+        question["proxy_failed"] = proxy_failed
+        question["rows"] = rows
+        question["columns"] = columns
+
+        question["rows_equality"] = rows_equality
+        question["columns_equality"] = columns_equality
+        question["datasets_equality"] = datasets_equality
+        question["datasets_multiset_equality"] = datasets_multiset_equality
+
+        question["duration_sql"] = duration_sql
+        question["duration_llm"] = duration_llm
+        # streamed completions only (LLM_STREAM), None otherwise
+        question["llm_time_to_first_token"] = time_to_first_token
+        question["llm_time_to_sql"] = metadata.get("time_to_sql")
+        question["llm_tokens_per_sec"] = tokens_per_sec
+        question["llm_overhead"] = llm_overhead
+        question["llm_sql_query_changed"] = changed
+
+        question["total_tokens"] = metadata.get("total_tokens", 0)
+        question["prompt_tokens"] = metadata.get("prompt_tokens", 0)
+        question["completion_tokens"] = metadata.get("completion_tokens", 0)
+        question["llm_cache_hit"] = metadata.get("cache_hit", False)
+
+        # Calculate costs
+        cost_input_EUR = question["prompt_tokens"] * (selected_model.get("cost_input_tokens_EUR_1K", 0.0) / 1000)
+        cost_output_EUR = question["completion_tokens"] * (selected_model.get("cost_output_tokens_EUR_1K", 0.0) / 1000)
+        question["cost_input_EUR"] = round(cost_input_EUR, 6)
+        question["cost_output_EUR"] = round(cost_output_EUR, 6)
+        question["cost_total_EUR"] = round(cost_input_EUR + cost_output_EUR, 6)
+
+        # Requests sent for the call (retries and hedges), and tokens of the answers not used
+        wasted_prompt_tokens = metadata.get("wasted_prompt_tokens", 0)
+        wasted_completion_tokens = metadata.get("wasted_completion_tokens", 0)
+        cost_wasted_input_EUR = wasted_prompt_tokens * (selected_model.get("cost_input_tokens_EUR_1K", 0.0) / 1000)
+        cost_wasted_output_EUR = wasted_completion_tokens * (
+            selected_model.get("cost_output_tokens_EUR_1K", 0.0) / 1000
+        )
+        question["llm_attempts"] = metadata.get("attempts", 0)
+        question["llm_hedges"] = metadata.get("hedges", 0)
+        question["llm_wasted_tokens"] = wasted_prompt_tokens + wasted_completion_tokens
+        question["cost_wasted_EUR"] = round(cost_wasted_input_EUR + cost_wasted_output_EUR, 6)
+
+        llm_source = " (cached)" if question["llm_cache_hit"] else ""
+        sql_status = " (timed out)" if timed_out else ""
+        if proxy_failed:
+            sql_status += " (failed on the proxy)"
+
+        print(
+            f"    Question #{question_number:02d}: LLM{llm_source}: {duration_llm:.1f} sec(s), "
+            f"SQL{sql_status}: {duration_sql:.1f} sec(s), {rows} row(s) and {columns} column(s) affected. "
+            f"{rows_equality} rows equality, "
+            f"{columns_equality} columns equality, "
+            f"{datasets_equality} datasets equality."
+        )
+
+        row_log = (
+            f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{question_number}\t{model.get('name', '')}\t"
+            f"{duration_llm:.1f}\t{duration_sql:.1f}\t{rows}\t{columns}\t"
+            f"{rows_equality}\t{columns_equality}\t"
+            f"{datasets_equality}\t"
+            f"{question['total_tokens']}\t{question['prompt_tokens']}\t"
+            f"{question['completion_tokens']}\t{question['cost_total_EUR']}\t"
+            f"{question['cost_input_EUR']}\t{question['cost_output_EUR']}\t"
+            f"{question['llm_cache_hit']}\t{datasets_multiset_equality}\t{timed_out}\t{admission}\t{proxy_failed}\t"
+            f"{self._format_optional(time_to_first_token)}\t{self._format_optional(tokens_per_sec)}\t"
+            f"{llm_overhead:.2f}\t{question['llm_attempts']}\t{question['llm_hedges']}\t"
+            f"{question['llm_wasted_tokens']}\t{question['cost_wasted_EUR']}"
+        )
+
+        return row_log
+
+    def _admit(self, sql_query, data_source, baseline_df, question_number):
+        """
+        Check the estimated plan of an LLM query before running it (see utils.plan_utils.plan_rejection),
+        logging the plan summary of the queries that are not admitted.
+
+        :param sql_query: SQL query generated by the LLM.
+        :param data_source: The database source to execute the query against.
+        :param baseline_df: Baseline resultset, or None.
+        :param question_number: Question number.
+        :return: "admitted", "rejected" or "deprioritized", or "" when admission control is off
+            or the plan is not available.
+        """
+        if self.admission == "off" or not sql_query:
+            return ""
+
+        summary = self.db_service.explain_sql_query(sql_query, data_source)
+        if summary is None:
+            return ""
+
+        reason = plan_rejection(summary, None if baseline_df is None else len(baseline_df))
+        if reason is None:
+            return "admitted"
+
+        admission = "rejected" if self.admission == "reject" else "deprioritized"
+        print(
+            f"[WARNING] Question #{question_number}: query {admission}, {reason}. Plan: {format_plan_summary(summary)}"
+        )
+        return admission
+
+    @staticmethod
+    def _format_optional(value):
+        """Format an optional metric of the summary, empty when it is not available."""
+        return "" if value is None else f"{value:.2f}"
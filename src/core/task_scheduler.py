@@ -0,0 +1,179 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class TaskScheduler:
+    """
+    Runs (model, question) tasks concurrently on a bounded pool of worker threads.
+
+    The global concurrency is bounded by max_workers, and the tasks of each
+    provider (the id of the entry in models_configs) are bounded by the
+    current concurrency limit of the provider's RateLimiter, which starts at
+    its max_concurrency setting from the models YAML file and is halved on a
+    429. Following the limiter keeps the workers from waiting on it while
+    holding slots the other providers could use.
+    """
+
+    def __init__(self, question_processor, max_workers: int = 4, get_rate_limiter=None):
+        """
+        :param question_processor: Processor of the (model, question) tasks.
+        :param max_workers: Number of worker threads.
+        :param get_rate_limiter: Function returning the RateLimiter of a provider from its
+            model_config (e.g. LLMService.get_rate_limiter). Without it the tasks of a
+            provider are bounded by its max_concurrency.
+        """
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be greater than 0, got {max_workers}.")
+
+        self.question_processor = question_processor
+        self.max_workers = max_workers
+        self.get_rate_limiter = get_rate_limiter
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._in_flight = {}
+        self._limits = {}
+        self._rate_limiters = {}
+        self._total_in_flight = 0
+        self._executor = None
+
+    def run(
+        self,
+        models,
+        questions,
+        baseline_datasets,
+        system_message,
+        semantic_rules,
+        temperature,
+        max_tokens,
+        iteration,
+        data_source,
+    ):
+        """
+        Fan out every (model, question) pair across the worker pool.
+        Each task works on its own copy of the question, so the questions
+        list is never modified.
+
+        :param models: List of (model, model_config) tuples to evaluate.
+        :param questions: List of questions to process.
+        :param baseline_datasets: Baseline datasets for comparison.
+        :param system_message: System message template.
+        :param semantic_rules: Semantic rules content.
+        :param temperature: Temperature for the LLM.
+        :param max_tokens: Maximum tokens for the LLM.
+        :param iteration: Iteration identifier.
+        :param data_source: The database source to execute the queries against.
+        :return: generator of (model, processed questions, summary lines), one per
+            model in the order of the models list, yielded as soon as all
+            the questions of the model are done.
+        """
+
+        self._limits = {model_config["id"]: model_config.get("max_concurrency") for _, model_config in models}
+        self._rate_limiters = {}
+        if self.get_rate_limiter is not None:
+            self._rate_limiters = {
+                model_config["id"]: self.get_rate_limiter(model_config) for _, model_config in models
+            }
+        self._pending = {}
+        self._in_flight = {}
+        self._total_in_flight = 0
+
+        models_tasks = []
+
+        for model, model_config in models:
+            provider_id = model_config["id"]
+            model_tasks = []
+
+            for question in questions:
+                task = {
+                    "future": Future(),
+                    "provider_id": provider_id,
+                    "question": dict(question),
+                    "kwargs": {
+                        "baseline_datasets": baseline_datasets,
+                        "model": model,
+                        "model_config": model_config,
+                        "system_message": system_message,
+                        "semantic_rules": semantic_rules,
+                        "temperature": temperature,
+                        "max_tokens": max_tokens,
+                        "iteration": iteration,
+                        "data_source": data_source,
+                    },
+                }
+                self._pending.setdefault(provider_id, deque()).append(task)
+                model_tasks.append(task)
+
+            models_tasks.append((model, model_tasks))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm_eval") as executor:
+            self._executor = executor
+            self._dispatch()
+
+            try:
+                for model, model_tasks in models_tasks:
+                    summary_text = [task["future"].result() for task in model_tasks]
+                    model_questions = [task["question"] for task in model_tasks]
+                    yield model, model_questions, summary_text
+            finally:
+                # drop the tasks not started yet if the caller stops early or a task fails
+                with self._lock:
+                    for tasks in self._pending.values():
+                        for task in tasks:
+                            task["future"].cancel()
+                        tasks.clear()
+                self._executor = None
+
+    def _dispatch(self):
+        """
+        Submit pending tasks to the executor while there is global capacity,
+        honouring the concurrency limit of each provider.
+        Providers are visited round-robin so a single provider cannot
+        take all the workers.
+        """
+        with self._lock:
+            progress = True
+            while progress and self._total_in_flight < self.max_workers:
+                progress = False
+                for provider_id, tasks in self._pending.items():
+                    if not tasks or self._total_in_flight >= self.max_workers:
+                        continue
+
+                    limit = self._provider_limit(provider_id)
+                    in_flight = self._in_flight.get(provider_id, 0)
+                    if limit and in_flight >= limit:
+                        continue
+
+                    task = tasks.popleft()
+                    self._in_flight[provider_id] = in_flight + 1
+                    self._total_in_flight += 1
+                    self._executor.submit(self._run_task, task)
+                    progress = True
+
+    def _provider_limit(self, provider_id):
+        """
+        Tasks of a provider allowed in flight: the current limit of its rate limiter,
+        else its max_concurrency, no limit if None.
+        """
+        rate_limiter = self._rate_limiters.get(provider_id)
+        if rate_limiter is None:
+            return self._limits.get(provider_id)
+        limit = rate_limiter.limit
+        return None if limit is None else max(1, int(limit))
+
+    def _run_task(self, task):
+        """
+        Execute one (model, question) task and release its slot.
+        """
+        try:
+            row_log = self.question_processor.process_question(question=task["question"], **task["kwargs"])
+            task["future"].set_result(row_log)
+        except BaseException as e:
+            task["future"].set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight[task["provider_id"]] -= 1
+                self._total_in_flight -= 1
+            if self._executor is not None:
+                self._dispatch()
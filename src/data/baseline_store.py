@@ -0,0 +1,445 @@
+import hashlib
+import json
+import operator
+import os
+import threading
+from collections.abc import Mapping
+from functools import partial
+
+import duckdb
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # the Arrow files are optional, baselines are always written as CSV
+    pa = None
+    feather = None
+
+from utils.dataframe_utils import arrow_to_dataframe, precision_profile, prepare_baseline
+
+MANIFEST_FILE_NAME = "baseline_manifest.json"
+
+# prepared baselines kept per question, besides the one without rounding
+MAX_PREPARED_BASELINES = int(os.getenv("MAX_PREPARED_BASELINES", 4))
+
+
+class BaselineStore:
+    """
+    Store of the baseline resultsets: tab-separated CSV files, columnar Arrow files
+    and a manifest.
+
+    Each resultset is written as question_NN.csv and, when pyarrow is installed, as an
+    uncompressed Arrow IPC file (question_NN.arrow), so dates, strings of digits or
+    integer columns are read back as they were returned by the database instead of being
+    re-inferred from the CSV text. Given the Arrow table fetched from the database, the
+    file keeps its exact types (e.g. DECIMAL) and is read back with arrow_to_dataframe,
+    as the result was fetched; otherwise it has the types of the fetched DataFrame.
+    Arrow files are memory-mapped when read, and only when a question needs its baseline.
+
+    Baselines exported by DuckDB (see DatabaseService.export_sql_query) are Parquet files
+    (question_NN.parquet) instead of Arrow files, read back through DuckDB, which gives
+    the same DataFrame types as fetching the query result, with or without pyarrow.
+
+    The manifest (baseline_manifest.json) lists the files of each question with their
+    number of rows, schema and SQL duration, and the content hash of the query that
+    produced them (see content_hash), so unchanged questions are not executed again.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Directory of the baseline datasets.
+        """
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_FILE_NAME)
+        self.manifest = {}
+        # write and remove are called by concurrent workers (see BaselineExecutor)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available() -> bool:
+        """
+        :return: True if pyarrow is installed.
+        """
+        return pa is not None
+
+    @staticmethod
+    def content_hash(sql_query: str, source: str, database: str) -> str:
+        """
+        Hash of what determines a baseline resultset.
+
+        :param sql_query: SQL query of the question.
+        :param source: Data source (e.g. "duckdb").
+        :param database: Identity of the database (see DatabaseService.database_identity).
+        :return: Hexadecimal SHA-256 digest.
+        """
+        content = json.dumps([sql_query or "", source or "", database or ""])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def entry(self, question_number) -> dict:
+        """
+        :param question_number: Question number.
+        :return: Manifest entry of the question, or None.
+        """
+        return self.manifest.get(str(int(question_number)))
+
+    def is_current(self, question_number, content_hash: str) -> bool:
+        """
+        Check if the baseline of a question was produced by the same query,
+        data source and database, and its files are still there.
+
+        :param question_number: Question number.
+        :param content_hash: Content hash of the question (see content_hash).
+        :return: True if the baseline does not need to be executed again.
+        """
+        entry = self.entry(question_number)
+        if entry is None or entry.get("hash") != content_hash:
+            return False
+        return all(os.path.isfile(os.path.join(self.path, entry[key])) for key in ("csv", "file") if entry.get(key))
+
+    def file_path(self, question_number, extension: str) -> str:
+        """
+        :param question_number: Question number.
+        :param extension: File extension (csv, arrow or parquet).
+        :return: Path of the file of the question.
+        """
+        return os.path.join(self.path, f"question_{int(question_number):02d}.{extension}")
+
+    def write(self, question_number, df: pd.DataFrame, content_hash: str = None, duration_sql: float = 0, table=None):
+        """
+        Write the resultset of a question as CSV and Arrow files and add it to the manifest,
+        replacing the previous files of the question. Empty resultsets have no files.
+        The manifest is written by save_manifest.
+
+        :param question_number: Question number.
+        :param df: Resultset of the baseline query, converted from table if None.
+        :param content_hash: Content hash of the question (see content_hash).
+        :param duration_sql: Duration of the query in seconds.
+        :param table: pyarrow.Table of the resultset as fetched from the database, written to
+            the Arrow file with its exact types instead of the types of df.
+        """
+        self.remove(question_number)
+        if df is None and table is not None:
+            df = arrow_to_dataframe(table)
+        entry = {
+            "hash": content_hash,
+            "rows": 0 if df is None else len(df),
+            "columns": 0 if df is None else len(df.columns),
+            "duration_sql": duration_sql,
+        }
+
+        if df is not None and not df.empty:
+            entry["csv"] = f"question_{int(question_number):02d}.csv"
+            df.to_csv(
+                os.path.join(self.path, entry["csv"]),
+                index=False,
+                header=True,
+                encoding="utf-8",
+                sep="\t",
+            )
+            if self.available():
+                entry.update(self._write_arrow(question_number, df, table))
+
+        with self._lock:
+            self.manifest[str(int(question_number))] = entry
+
+    def add_exported(self, question_number, rows: int, schema: list, content_hash: str = None, duration_sql: float = 0):
+        """
+        Add to the manifest the Parquet and CSV files of a question written by the database
+        (see DatabaseService.export_sql_query), replacing its previous entry.
+
+        :param question_number: Question number.
+        :param rows: Number of rows of the resultset.
+        :param schema: List of [column name, type] pairs of the resultset.
+        :param content_hash: Content hash of the question (see content_hash).
+        :param duration_sql: Duration of the query in seconds.
+        """
+        entry = {
+            "hash": content_hash,
+            "rows": rows,
+            "columns": len(schema),
+            "duration_sql": duration_sql,
+        }
+
+        if rows:
+            entry["csv"] = os.path.basename(self.file_path(question_number, "csv"))
+            entry["file"] = os.path.basename(self.file_path(question_number, "parquet"))
+            entry["schema"] = schema
+        else:
+            # empty resultsets have no files
+            for extension in ("csv", "parquet"):
+                if os.path.isfile(self.file_path(question_number, extension)):
+                    os.remove(self.file_path(question_number, extension))
+
+        with self._lock:
+            self.manifest[str(int(question_number))] = entry
+
+    def _write_arrow(self, question_number, df: pd.DataFrame, table=None) -> dict:
+        """
+        Write the resultset of a question as an Arrow file, from the fetched Arrow table when given.
+
+        :return: Manifest keys of the Arrow file (file, schema, and source_types when it has the
+            types of the database), empty if it was not written.
+        """
+        file_name = f"question_{int(question_number):02d}.arrow"
+        try:
+            if table is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                source_types = False
+            else:
+                # the Arrow file has one chunk per column, so it is memory-mapped without copies
+                table = table.combine_chunks()
+                source_types = True
+            feather.write_feather(table, os.path.join(self.path, file_name), compression="uncompressed")
+        except (OSError, TypeError, ValueError, pa.ArrowException) as e:
+            print(f"[WARNING] Question #{question_number}: baseline not written as Arrow, the CSV file is used: {e}")
+            return {}
+
+        keys = {"file": file_name, "schema": [[field.name, str(field.type)] for field in table.schema]}
+        if source_types:
+            keys["source_types"] = True
+        return keys
+
+    def remove(self, question_number):
+        """
+        Remove the files of a question and its manifest entry.
+
+        :param question_number: Question number.
+        """
+        with self._lock:
+            self.manifest.pop(str(int(question_number)), None)
+        for extension in ("csv", "arrow", "parquet"):
+            file_path = self.file_path(question_number, extension)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def save_manifest(self):
+        """
+        Write the manifest, replacing the previous one.
+        """
+        temp_path = self.manifest_path + ".tmp"
+        with self._lock:
+            manifest = dict(self.manifest)
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"questions": manifest}, file, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def load_manifest(self) -> bool:
+        """
+        Load the manifest of the directory.
+
+        :return: True if the manifest exists and could be read.
+        """
+        if not os.path.isfile(self.manifest_path):
+            return False
+
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                self.manifest = json.load(file).get("questions", {})
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Baseline manifest {self.manifest_path} could not be read: {e}")
+            self.manifest = {}
+            return False
+
+        return True
+
+    def question_numbers(self, typed_only: bool = False):
+        """
+        :param typed_only: Only the questions with an Arrow or Parquet file that can be read.
+        :return: Question numbers in the manifest.
+        """
+        return sorted(
+            int(question_number)
+            for question_number, entry in self.manifest.items()
+            if not typed_only or self._readable(entry.get("file"))
+        )
+
+    def _readable(self, file_name: str) -> bool:
+        """
+        :return: True if the Arrow or Parquet file can be read.
+        """
+        if not file_name:
+            return False
+        return file_name.endswith(".parquet") or self.available()
+
+    def stored_question_numbers(self):
+        """
+        :return: Question numbers in the manifest or with files in the directory.
+        """
+        question_numbers = set(int(question_number) for question_number in self.manifest)
+        if os.path.isdir(self.path):
+            for file in os.listdir(self.path):
+                if file.startswith("question_") and file.endswith((".csv", ".arrow", ".parquet")):
+                    question_numbers.add(int(file.split("_")[1].split(".")[0]))
+        return sorted(question_numbers)
+
+    def read(self, question_number) -> pd.DataFrame:
+        """
+        Read the resultset of a question from its memory-mapped Arrow file, or
+        from its Parquet file through DuckDB. Arrow files with the types of the database
+        are converted as fetched results (see arrow_to_dataframe), the others with
+        columns without nulls not copied when possible (split_blocks).
+
+        :param question_number: Question number.
+        :return: DataFrame with the resultset.
+        """
+        entry = self.entry(question_number)
+        file_path = os.path.join(self.path, entry["file"])
+        if file_path.endswith(".parquet"):
+            with duckdb.connect() as conn:
+                return conn.execute("SELECT * FROM read_parquet(?)", [file_path]).df()
+
+        table = feather.read_table(file_path, memory_map=True)
+        if entry.get("source_types"):
+            return arrow_to_dataframe(table)
+        return table.to_pandas(split_blocks=True)
+
+
+class BaselineDataset(Mapping):
+    """
+    Baseline entry of a question, read-only mapping with the question_number,
+    df and precision_profile keys. The DataFrame is loaded on first access and
+    kept, and its precision profile is computed once.
+
+    The prepared baseline (see prepare_baseline) is computed once when the
+    DataFrame is loaded, and for each other rounding of its numeric columns
+    when a comparison needs it.
+    """
+
+    def __init__(self, question_number: int, load_df):
+        """
+        :param question_number: Question number.
+        :param load_df: Function returning the DataFrame of the baseline.
+        """
+        self._question_number = question_number
+        self._load_df = load_df
+        self._values = None
+        self._exact_columns = None
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the DataFrame, its precision profile and its prepared baseline, once.
+
+        :return: Dictionary with the question_number, df and precision_profile keys.
+        """
+        with self._lock:
+            if self._values is None:
+                df = self._load_df()
+                profile = precision_profile(df)
+                self._values = {
+                    "question_number": self._question_number,
+                    "df": df,
+                    "precision_profile": profile,
+                }
+                # columns left unchanged when rounded to their own precision
+                self._exact_columns = {
+                    column for column, decimals in profile.items() if df[column].round(decimals).equals(df[column])
+                }
+                # an LLM result at least as precise as the baseline rounds it to its own precision
+                self._prepared[self._rounding_key(profile)] = prepare_baseline(df, profile)
+        return self._values
+
+    def prepared(self, precisions: dict) -> dict:
+        """
+        Get the prepared baseline for the decimal places of its rounded columns.
+        In the common case (an LLM result with the same numeric columns, at least
+        as precise as the baseline) it is the one prepared at load time.
+
+        :param precisions: Dictionary of column name to decimal places (see shared_precisions).
+        :return: Prepared baseline (see prepare_baseline).
+        """
+        values = self.load()
+        key = self._rounding_key(precisions)
+
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            prepared = prepare_baseline(
+                values["df"], {column: decimals for column, decimals in key if decimals is not None}
+            )
+            with self._lock:
+                if len(self._prepared) < MAX_PREPARED_BASELINES:
+                    self._prepared[key] = prepared
+        return prepared
+
+    def _rounding_key(self, precisions: dict) -> tuple:
+        """
+        Key of the prepared baselines: decimal places of each numeric column (None if
+        not rounded), leaving out the columns that rounding would not change.
+        """
+        profile = self._values["precision_profile"]
+        key = []
+        for column, own_decimals in profile.items():
+            decimals = precisions.get(column)
+            if column in self._exact_columns and decimals in (None, own_decimals):
+                continue
+            key.append((column, decimals))
+        return tuple(key)
+
+    def __getitem__(self, key):
+        if key == "question_number":
+            return self._question_number
+        return self.load()[key]
+
+    def __iter__(self):
+        return iter(("question_number", "df", "precision_profile"))
+
+    def __len__(self):
+        return 3
+
+    def __repr__(self):
+        state = "loaded" if self._values is not None else "not loaded"
+        return f"BaselineDataset(question_number={self._question_number}, {state})"
+
+
+class BaselineIndex:
+    """
+    Baseline datasets keyed by question number, replacing the scan of the list
+    of baselines for each (model, question).
+    """
+
+    def __init__(self, baseline_datasets=()):
+        """
+        :param baseline_datasets: Baseline entries, BaselineDataset or dictionaries
+            with question_number and df keys.
+        """
+        self._datasets = {}
+        for entry in baseline_datasets:
+            if not isinstance(entry, BaselineDataset):
+                entry = BaselineDataset(entry["question_number"], partial(operator.getitem, entry, "df"))
+            self._datasets[int(entry["question_number"])] = entry
+
+    def get(self, question_number, default=None):
+        """
+        :param question_number: Question number.
+        :param default: Value returned when the question has no baseline.
+        :return: BaselineDataset of the question.
+        """
+        return self._datasets.get(int(question_number), default)
+
+    def preload(self, question_numbers=None):
+        """
+        Load the baselines of the given questions ahead of the evaluation, with
+        their precision profiles and prepared baselines.
+
+        :param question_numbers: Question numbers to load, all the baselines if None.
+        """
+        if question_numbers is None:
+            question_numbers = list(self._datasets)
+        for question_number in question_numbers:
+            entry = self.get(question_number)
+            if entry is not None:
+                entry.load()
+
+    def __contains__(self, question_number):
+        return int(question_number) in self._datasets
+
+    def __iter__(self):
+        return iter(self._datasets.values())
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def __repr__(self):
+        return f"BaselineIndex({len(self._datasets)} question(s))"
@@ -116,8 +116,13 @@ class ModelsConfig:
                     "id": provider["id"],
                     "endpoint": endpoint,
                     "api_key": api_key,
+                    "max_concurrency": provider.get("max_concurrency"),
+                    "rpm": provider.get("rpm"),
+                    "tpm": provider.get("tpm"),
                     "models": enabled_models,
                 }
+                if provider.get("hedge_provider"):
+                    config["hedge"] = self._load_hedge_config(provider, raw_configs)
                 models_configs.append(config)
 
         if not models_configs or not models:
@@ -144,6 +149,49 @@ class ModelsConfig:
             None,
         )
 
+    def _load_hedge_config(self, provider: Dict[str, Any], raw_configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Load the provider receiving the hedge requests of a provider: the duplicates of its
+        slow calls (see LLMService). The hedge provider is another entry of models_configs,
+        enabled or not, serving the same platform; hedge_model names its deployment when it
+        differs from the model name.
+
+        Args:
+            provider: The raw provider configuration, with hedge_provider
+            raw_configs: All the raw provider configurations
+
+        Returns:
+            Configuration of the hedge provider [id, endpoint, api_key, rpm, tpm,
+            max_concurrency, model]
+
+        Raises:
+            Exception: If the hedge provider is not found or its credentials are missing.
+        """
+        hedge_id = provider["hedge_provider"]
+        hedge_provider = next((cfg for cfg in raw_configs if cfg.get("id") == hedge_id), None)
+        if hedge_provider is None:
+            raise Exception(f"Hedge provider '{hedge_id}' of provider '{provider['id']}' not found.")
+
+        endpoint, api_key = self._load_credentials_from_env(hedge_id)
+        if not endpoint or not api_key:
+            env_id = hedge_id.replace('-', '_')
+            raise Exception(
+                f"Missing environment variables for hedge provider '{hedge_id}': "
+                f"ENDPOINT_{env_id}, API_KEY_{env_id}"
+            )
+
+        hedge = {
+            "id": hedge_id,
+            "endpoint": endpoint,
+            "api_key": api_key,
+            "max_concurrency": hedge_provider.get("max_concurrency"),
+            "rpm": hedge_provider.get("rpm"),
+            "tpm": hedge_provider.get("tpm"),
+        }
+        if provider.get("hedge_model"):
+            hedge["model"] = provider["hedge_model"]
+        return hedge
+
     def _load_credentials_from_env(self, config_id: str) -> Tuple[str, str]:
         """
         Load endpoint and API key from environment variables.
@@ -77,18 +77,32 @@ class Questions:
                             "sql_query": item.get("sql_query", ""),
                             "llm_sql_query": item.get("llm_sql_query", ""),
                             "tables_used": item.get("tables_used", []),
+                            "query_timeout": item.get("query_timeout"),
                             "executed": item.get("executed", False),
+                            "timed_out": item.get("timed_out", False),
+                            "admission": item.get("admission", ""),
+                            "proxy_failed": item.get("proxy_failed", False),
                             "llm_sql_query_changed": item.get("llm_sql_query_changed", False),
                             "rows": item.get("rows", 0),
                             "columns": item.get("columns", 0),
                             "rows_equality": item.get("rows_equality", 0),
                             "columns_equality": item.get("columns_equality", 0),
                             "datasets_equality": item.get("datasets_equality", 0),
+                            "datasets_multiset_equality": item.get("datasets_multiset_equality", 0),
                             "duration_sql": item.get("duration_sql", 0),
                             "duration_llm": item.get("duration_llm", 0),
+                            "llm_time_to_first_token": item.get("llm_time_to_first_token"),
+                            "llm_time_to_sql": item.get("llm_time_to_sql"),
+                            "llm_tokens_per_sec": item.get("llm_tokens_per_sec"),
+                            "llm_overhead": item.get("llm_overhead"),
+                            "llm_attempts": item.get("llm_attempts", 0),
+                            "llm_hedges": item.get("llm_hedges", 0),
+                            "llm_wasted_tokens": item.get("llm_wasted_tokens", 0),
+                            "cost_wasted_EUR": item.get("cost_wasted_EUR", 0),
                             "prompt_tokens": item.get("prompt_tokens", 0),
                             "completion_tokens": item.get("completion_tokens", 0),
                             "total_tokens": item.get("total_tokens", 0),
+                            "llm_cache_hit": item.get("llm_cache_hit", False),
                             "cost_input_EUR": prompt_tokens * (cost_input_tokens_1k / 1000),
                             "cost_output_EUR": completion_tokens * (cost_output_tokens_1k / 1000),
                             "cost_total_EUR": prompt_tokens * (cost_input_tokens_1k / 1000)
@@ -123,18 +137,32 @@ class Questions:
                         "sql_query": question.get("sql_query", ""),
                         "llm_sql_query": question.get("llm_sql_query", ""),
                         "tables_used": question.get("tables_used", []),
+                        "query_timeout": question.get("query_timeout"),
                         "executed": question.get("executed", False),
+                        "timed_out": question.get("timed_out", False),
+                        "admission": question.get("admission", ""),
+                        "proxy_failed": question.get("proxy_failed", False),
                         "llm_sql_query_changed": question.get("llm_sql_query_changed", False),
                         "rows": question.get("rows", 0),
                         "columns": question.get("columns", 0),
                         "rows_equality": question.get("rows_equality", 0),
                         "columns_equality": question.get("columns_equality", 0),
                         "datasets_equality": question.get("datasets_equality", 0),
+                        "datasets_multiset_equality": question.get("datasets_multiset_equality", 0),
                         "duration_sql": question.get("duration_sql", 0),
                         "duration_llm": question.get("duration_llm", 0),
+                        "llm_time_to_first_token": question.get("llm_time_to_first_token"),
+                        "llm_time_to_sql": question.get("llm_time_to_sql"),
+                        "llm_tokens_per_sec": question.get("llm_tokens_per_sec"),
+                        "llm_overhead": question.get("llm_overhead"),
+                        "llm_attempts": question.get("llm_attempts", 0),
+                        "llm_hedges": question.get("llm_hedges", 0),
+                        "llm_wasted_tokens": question.get("llm_wasted_tokens", 0),
+                        "cost_wasted_EUR": question.get("cost_wasted_EUR", 0),
                         "prompt_tokens": question.get("prompt_tokens", 0),
                         "completion_tokens": question.get("completion_tokens", 0),
                         "total_tokens": question.get("total_tokens", 0),
+                        "llm_cache_hit": question.get("llm_cache_hit", False),
                         "cost_input_EUR": prompt_tokens * (cost_input_tokens_1k / 1000),
                         "cost_output_EUR": completion_tokens * (cost_output_tokens_1k / 1000),
                         "cost_total_EUR": (prompt_tokens * (cost_input_tokens_1k / 1000))
@@ -154,12 +182,18 @@ class Questions:
         """
         return self.questions
 
-    def save_questions(self, yaml_file):
+    def save_questions(self, yaml_file, questions=None):
         """
         Save the current list of questions back to the YAML file.
+
+        :param yaml_file: Path to the YAML file.
+        :param questions: Optional list of questions to save instead of the current list.
         """
         try:
-            data_to_dump = {"questions": self.questions}
+            if questions is None:
+                questions = self.questions
+
+            data_to_dump = {"questions": questions}
 
             yaml_text: str = yaml.dump(
                 data_to_dump,
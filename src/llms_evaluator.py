@@ -9,6 +9,7 @@ from data.models_config import ModelsConfig
 from data.questions import Questions
 from data.schema import Database_schema_tables
 from services.database_service import DatabaseService
+from services.llm_cache import LLMResponseCache
 from services.llm_service import LLMService
 from utils.data_utils import DataUtils
 from utils.file_utils import FileUtils
@@ -24,6 +25,13 @@ class LLMsEvaluator:
         system_message_file_name=None,
         models_file_name=None,
         data_source=None,
+        llm_cache_mode="off",
+        llm_stream=None,
+        comparison_backend="pandas",
+        query_timeout=None,
+        admission=None,
+        tier="full",
+        proxy_duckdb_path=None,
     ):
 
         load_dotenv()
@@ -66,9 +74,39 @@ class LLMsEvaluator:
 
         models_config = ModelsConfig(models_file_name)
         self.models_configs, self.models = models_config.load_models_from_yaml()
-        self.llm_service = LLMService()
-        self.db_service = DatabaseService()
-        self.question_processor = QuestionProcessor(self.llm_service, self.db_service, self.db_schema)
+        self.llm_cache = LLMResponseCache(mode=llm_cache_mode) if llm_cache_mode != "off" else None
+        self.llm_service = LLMService(cache=self.llm_cache, stream=llm_stream)
+        # tiered execution: "tiered" runs the LLM queries on a small proxy of the DuckDB database
+        # before the full-size one, "smoke" runs everything (baselines included) on the proxy
+        if proxy_duckdb_path is None:
+            proxy_duckdb_path = os.getenv("DUCKDB_PROXY_PATH", "")
+        if tier != "full" and not (data_source and DatabaseService.decode_source(data_source) == "duckdb"):
+            print(f"[WARNING] The {tier} execution requires DuckDB, queries run against {data_source}.")
+            tier = "full"
+        if tier != "full" and not proxy_duckdb_path:
+            print(f"[WARNING] DUCKDB_PROXY_PATH is not set, the {tier} execution is disabled.")
+            tier = "full"
+        self.tier = tier
+
+        self.db_service = DatabaseService(duckdb_path=proxy_duckdb_path if tier == "smoke" else None)
+        self.proxy_db_service = DatabaseService(duckdb_path=proxy_duckdb_path) if tier == "tiered" else None
+        if data_source:
+            self.db_service.warm_up(data_source)
+            if self.proxy_db_service is not None:
+                self.proxy_db_service.warm_up(data_source)
+        if comparison_backend == "duckdb" and data_source and self.db_service.decode_source(data_source) != "duckdb":
+            print(
+                f"[WARNING] In-database comparison requires DuckDB, results from {data_source} are compared in pandas."
+            )
+        self.question_processor = QuestionProcessor(
+            self.llm_service,
+            self.db_service,
+            self.db_schema,
+            comparison_backend=comparison_backend,
+            query_timeout=query_timeout,
+            admission=admission,
+            proxy_db_service=self.proxy_db_service,
+        )
         self.model_evaluator = ModelEvaluator(self.question_processor, self.questions_obj)
         self.baseline_executor = BaselineExecutor(self.db_service)
 
@@ -103,12 +141,13 @@ class LLMsEvaluator:
         log_results: bool = True,
         log_summary: bool = True,
         iteration: str = "",
+        max_workers: int = 1,
     ) -> str:
         """
         Iterate each model and execute each sql question in self.all_questions.
         Compares the resultsets and log results.
         """
-        return self.model_evaluator.evaluate_models(
+        result = self.model_evaluator.evaluate_models(
             models=self.models,
             models_configs=self.models_configs,
             all_questions=self.all_questions,
@@ -122,8 +161,19 @@ class LLMsEvaluator:
             log_summary=log_summary,
             iteration=iteration,
             data_source=self.data_source,
+            max_workers=max_workers,
         )
 
+        if self.llm_cache is not None:
+            print(
+                f"LLM cache ({self.llm_cache.mode}): {self.llm_cache.hits} hit(s), {self.llm_cache.misses} miss(es)."
+            )
+        result_cache = self.db_service.result_cache
+        if result_cache is not None:
+            print(f"SQL result cache: {result_cache.hits} hit(s), {result_cache.misses} miss(es).")
+
+        return result
+
     def execute_queries(
         self,
         sql_query_column: str,
@@ -132,9 +182,15 @@ class LLMsEvaluator:
         persist_results: bool = True,
         drop_results_if_exists: bool = False,
         data_source: str = None,
+        force: bool = False,
+        max_workers: int = 1,
+        direct_export: bool = False,
     ):
         """
         Run the SQL queries from the questions file and export the results to CSV files.
+        Only new or changed questions are executed, unless force is set, and up to
+        max_workers queries run concurrently. With direct_export, DuckDB writes the
+        results to Parquet and CSV files without fetching them into pandas.
         """
         if data_source is None:
             data_source = self.data_source
@@ -148,10 +204,16 @@ class LLMsEvaluator:
             drop_results_if_exists=drop_results_if_exists,
             questions_file_name=self.questions_file_name,
             database_source=data_source,
+            force=force,
+            max_workers=max_workers,
+            direct_export=direct_export,
         )
 
     def load_baseline_datasets(self, baseline_path: str):
         """
         Loads baseline datasets from the specified directory path.
+        Only the baselines of the questions to evaluate are read, with their
+        fingerprints, column signatures and precision profiles.
         """
         self.baseline_datasets = DataUtils.load_baseline_datasets(baseline_path)
+        self.baseline_datasets.preload([question["question_number"] for question in self.all_questions])
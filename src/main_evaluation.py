@@ -47,6 +47,12 @@ if __name__ == "__main__":
         action="store_true",
         help="Run step 1 to get resultsets from the data source.",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --get_baseline_from_data_source, execute all the baseline queries "
+        "instead of only the new or changed ones.",
+    )
     parser.add_argument(
         "--data_source",
         type=str,
@@ -54,6 +60,81 @@ if __name__ == "__main__":
         choices=["sql-server", "duckdb"],
         help="Data source to use for evaluation.",
     )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=int(os.getenv("MAX_WORKERS", 1)),
+        help="Number of (model, question) tasks executed concurrently. "
+        "The per-provider limit is the max_concurrency setting of the models file.",
+    )
+    parser.add_argument(
+        "--baseline_workers",
+        type=int,
+        default=int(os.getenv("BASELINE_MAX_WORKERS", 1)),
+        help="With --get_baseline_from_data_source, number of baseline queries executed concurrently. "
+        "For SQL Server it should not exceed the connection pool (SQL_SERVER_POOL_SIZE + SQL_SERVER_MAX_OVERFLOW).",
+    )
+    parser.add_argument(
+        "--direct_export",
+        action="store_true",
+        default=os.getenv("BASELINE_DIRECT_EXPORT", "false").lower() in ("1", "true", "yes"),
+        help="With --get_baseline_from_data_source and the duckdb data source, write the baseline "
+        "resultsets to Parquet and CSV files with DuckDB COPY, without fetching them into pandas.",
+    )
+    parser.add_argument(
+        "--cache-mode",
+        "--cache_mode",
+        dest="cache_mode",
+        type=str,
+        default=os.getenv("LLM_CACHE_MODE", "off"),
+        choices=["off", "read", "readwrite", "refresh"],
+        help="On-disk cache of the LLM responses: off, read (use cached responses), "
+        "readwrite (use and store), refresh (ignore cached responses and store the new ones).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=os.getenv("LLM_STREAM", "false").lower() in ("1", "true", "yes"),
+        help="Stream the LLM completions and stop them once the SQL block is complete, "
+        "recording the time to the first token and to the SQL.",
+    )
+    parser.add_argument(
+        "--comparison-backend",
+        "--comparison_backend",
+        dest="comparison_backend",
+        type=str,
+        default=os.getenv("COMPARISON_BACKEND", "pandas"),
+        choices=["pandas", "duckdb", "streaming"],
+        help="Where the LLM results are compared with the baseline: pandas (fetch the results), "
+        "duckdb (inside the database, only with the duckdb data source), or streaming (fetch the "
+        "results in chunks and stop once the metrics cannot change).",
+    )
+    parser.add_argument(
+        "--query_timeout",
+        type=float,
+        default=float(os.getenv("SQL_QUERY_TIMEOUT", 0)),
+        help="Seconds after which an LLM-generated query is cancelled and recorded as timed out (0 for no timeout). "
+        "A question can override it with its query_timeout key in the questions file.",
+    )
+    parser.add_argument(
+        "--admission",
+        type=str,
+        default=os.getenv("SQL_ADMISSION", "off"),
+        choices=["off", "reject", "deprioritize"],
+        help="Check the estimated plan of the LLM-generated queries before running them: plans with a large "
+        "cartesian product or far more estimated rows than the baseline are not run (reject) or only get "
+        "SQL_ADMISSION_TIMEOUT seconds (deprioritize).",
+    )
+    parser.add_argument(
+        "--tier",
+        type=str,
+        default=os.getenv("EVALUATION_TIER", "full"),
+        choices=["full", "tiered", "smoke"],
+        help="With the duckdb data source: full (run the queries against DUCKDB_PATH), tiered (run the "
+        "LLM-generated queries against the small proxy database DUCKDB_PROXY_PATH first, and only the ones "
+        "that pass against DUCKDB_PATH), or smoke (baselines and LLM queries against DUCKDB_PROXY_PATH, "
+        "with the results in the smoke folder).",
+    )
     args = parser.parse_args()
 
     evaluator = LLMsEvaluator(
@@ -63,10 +144,20 @@ if __name__ == "__main__":
         system_message_file_name=args.system_message_file_name,
         models_file_name=args.models_file_name,
         data_source=args.data_source,
+        llm_cache_mode=args.cache_mode,
+        llm_stream=args.stream,
+        comparison_backend=args.comparison_backend,
+        query_timeout=args.query_timeout,
+        admission=args.admission,
+        tier=args.tier,
     )
 
     temperature = 0.9
     results_path = "./docs/results"
+    if evaluator.tier == "smoke":
+        # baselines and results of the proxy database are kept apart from the full-size ones
+        results_path += "/smoke"
+        os.makedirs(results_path, exist_ok=True)
 
     # STEP 1: run the queries in the database in order
     # to have a baseline to compare the results
@@ -77,6 +168,9 @@ if __name__ == "__main__":
             results_to_path=results_path + "/baseline_dataset_" + args.data_source,
             persist_results=True,
             drop_results_if_exists=True,
+            force=args.force,
+            max_workers=args.baseline_workers,
+            direct_export=args.direct_export,
         )
 
     # STEP 2: load the dataframes with the resultsets to compare
@@ -102,6 +196,7 @@ if __name__ == "__main__":
             log_results=True,
             log_summary=True,
             iteration=i_str,
+            max_workers=args.max_workers,
         )
 
         t = time.time() - t
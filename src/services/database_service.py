@@ -1,12 +1,40 @@
+import math
 import os
+import threading
 import time
 import traceback
 import urllib.parse
+import uuid
+from contextlib import contextmanager
 
 import pandas as pd
 import duckdb
 from langfuse import observe
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from services.query_sandbox import QuerySandbox
+from services.sql_result_cache import SQLResultCache
+from utils.dataframe_utils import arrow_to_dataframe
+from utils.duckdb_comparison import compare_in_duckdb
+from utils.plan_utils import duckdb_plan_summary, sql_server_plan_summary
+from utils.streaming_comparison import StreamingComparator
+
+try:
+    import pyarrow as pa
+except ImportError:  # results are fetched as DataFrames
+    pa = None
+
+try:
+    from arrow_odbc import read_arrow_batches_from_odbc
+except ImportError:  # SQL Server results are fetched with pandas
+    read_arrow_batches_from_odbc = None
+
+
+class QueryTimeoutError(RuntimeError):
+    """
+    Raised when a query is cancelled because it ran longer than its timeout.
+    """
 
 
 class DatabaseService:
@@ -14,10 +42,103 @@ class DatabaseService:
     Service class for database interactions.
     Extracted SQL execution logic from LLMsEvaluator.process_questions_with_model()
     and decode_source from module_data.
+
+    Connections are opened once per source and process: SQL Server uses a single
+    SQLAlchemy engine with a QueuePool (warmed up once when it is created), and
+    DuckDB opens the database file once and hands out one cursor per thread.
+
+    Results of execute_sql_query are cached by data source and canonical SQL,
+    so equivalent queries generated by different models or iterations run once.
+
+    With fetch_arrow, results are fetched as Arrow tables (DuckDB to_arrow_table, or
+    arrow-odbc for SQL Server when installed) and converted to DataFrames with the
+    same types, keeping strings in Arrow memory instead of Python objects.
+
+    Queries can be given a timeout: DuckDB queries are interrupted from a timer
+    thread, SQL Server queries run with the ODBC query timeout, which cancels them
+    on the server.
+
+    With sandbox, the DuckDB queries of execute_sql_query run in a pool of worker
+    processes (see services.query_sandbox.QuerySandbox) with their own memory limits,
+    so a query running out of memory fails alone instead of the whole evaluation.
     """
 
+    def __init__(
+        self,
+        pool_size: int = None,
+        max_overflow: int = None,
+        pool_recycle: int = None,
+        duckdb_read_only: bool = None,
+        result_cache: SQLResultCache = None,
+        fetch_arrow: bool = None,
+        duckdb_path: str = None,
+        sandbox: bool = None,
+    ):
+        """
+        Args:
+            pool_size (int): Connections kept in the SQL Server pool.
+                Defaults to SQL_SERVER_POOL_SIZE or 5.
+            max_overflow (int): Extra connections allowed above pool_size.
+                Defaults to SQL_SERVER_MAX_OVERFLOW or 10.
+            pool_recycle (int): Seconds after which a pooled connection is recycled.
+                Defaults to SQL_SERVER_POOL_RECYCLE or 1800.
+            duckdb_read_only (bool): Open the DuckDB file in read-only mode.
+                Defaults to DUCKDB_READ_ONLY or True.
+            result_cache (SQLResultCache): Cache of the query results. Defaults to a new
+                SQLResultCache, unless SQL_RESULT_CACHE is false.
+            fetch_arrow (bool): Fetch the results of execute_sql_query as Arrow tables.
+                Defaults to SQL_FETCH_ARROW or False, ignored if pyarrow is not installed.
+            duckdb_path (str): DuckDB database file of the duckdb source, e.g. a smaller scale
+                factor of the database. Defaults to DUCKDB_PATH or ./data/tpch.db.
+            sandbox (bool): Run the DuckDB queries of execute_sql_query in worker processes.
+                Defaults to SQL_SANDBOX or False, ignored if pyarrow is not installed or the
+                DuckDB file is not opened read-only.
+        """
+        if pool_size is None:
+            pool_size = int(os.getenv("SQL_SERVER_POOL_SIZE", 5))
+        if max_overflow is None:
+            max_overflow = int(os.getenv("SQL_SERVER_MAX_OVERFLOW", 10))
+        if pool_recycle is None:
+            pool_recycle = int(os.getenv("SQL_SERVER_POOL_RECYCLE", 1800))
+        if duckdb_read_only is None:
+            duckdb_read_only = os.getenv("DUCKDB_READ_ONLY", "true").lower() in ("1", "true", "yes")
+        if result_cache is None and os.getenv("SQL_RESULT_CACHE", "true").lower() in ("1", "true", "yes"):
+            result_cache = SQLResultCache()
+        if fetch_arrow is None:
+            fetch_arrow = os.getenv("SQL_FETCH_ARROW", "false").lower() in ("1", "true", "yes")
+        if duckdb_path is None:
+            duckdb_path = os.getenv("DUCKDB_PATH", "./data/tpch.db")
+        if fetch_arrow and pa is None:
+            print("[WARNING] pyarrow is not installed, results are fetched as DataFrames.")
+            fetch_arrow = False
+        if sandbox is None:
+            sandbox = os.getenv("SQL_SANDBOX", "false").lower() in ("1", "true", "yes")
+        if sandbox and pa is None:
+            print("[WARNING] pyarrow is not installed, queries run in the evaluator process.")
+            sandbox = False
+        if sandbox and not duckdb_read_only:
+            print("[WARNING] The sandbox needs DUCKDB_READ_ONLY, queries run in the evaluator process.")
+            sandbox = False
+
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.duckdb_read_only = duckdb_read_only
+        self.result_cache = result_cache
+        self.fetch_arrow = fetch_arrow
+        self.duckdb_path = duckdb_path
+        self.sandbox = sandbox
+
+        self._engines = {}
+        self._duckdb_connections = {}
+        self._sandbox = None
+        self._thread_local = threading.local()
+        self._lock = threading.Lock()
+
     @observe
-    def get_dynamic_sql(self, source: str, sql_query: str, as_data_frame: bool = False):
+    def get_dynamic_sql(
+        self, source: str, sql_query: str, as_data_frame: bool = False, as_arrow: bool = False, timeout: float = None
+    ):
         """
         Execute dynamic SQL query on specified database source.
 
@@ -26,9 +147,12 @@ class DatabaseService:
                          Supports "sql-server", "duckdb".
             sql_query (str): The SQL query to execute.
             as_data_frame (bool): If True, the result is returned as a pandas DataFrame.
+            as_arrow (bool): If True, the result is returned as a pyarrow Table.
+            timeout (float): Seconds after which the query is cancelled, no timeout if None or 0.
         Returns:
-            str or pd.DataFrame: The result as a string or DataFrame.
+            str, pd.DataFrame or pyarrow.Table: The result as a string, DataFrame or Arrow table.
         Raises:
+            QueryTimeoutError: If the query was cancelled after timeout seconds.
             RuntimeError: If there is an error connecting to or executing 
                          the query in the database.
         """
@@ -36,23 +160,29 @@ class DatabaseService:
             conn = self.get_connection(source)
             source = self.decode_source(source)
 
-            if source in ["duckdb"]:
-                # Handle DuckDB connections
-                if as_data_frame:
-                    df = conn.execute(sql_query).df()
-                    return df
-                else:
-                    df = conn.execute(sql_query).df()
-                    return df.to_string(index=False)
-            else:
-                # Handle SQL Server connections (existing code)
-                df = pd.read_sql(sql_query, conn)
-                
-                if as_data_frame:
-                    return df
+            with self._deadline(source, conn, timeout) as conn:
+                if as_arrow:
+                    return self._fetch_arrow(source, sql_query, conn, timeout)
+
+                if source in ["duckdb"]:
+                    # Handle DuckDB connections
+                    if as_data_frame:
+                        df = conn.execute(sql_query).df()
+                        return df
+                    else:
+                        df = conn.execute(sql_query).df()
+                        return df.to_string(index=False)
                 else:
-                    return df.to_string(index=False)
+                    # Handle SQL Server connections (existing code)
+                    df = pd.read_sql(sql_query, conn)
 
+                    if as_data_frame:
+                        return df
+                    else:
+                        return df.to_string(index=False)
+
+        except QueryTimeoutError:
+            raise
         except Exception as e:
             tb = traceback.extract_tb(e.__traceback__)
             frame = tb[0]
@@ -64,6 +194,111 @@ class DatabaseService:
                 "Error connecting or executing the query in the database."
             ) from e
 
+    def _fetch_arrow(self, source, sql_query, conn, timeout=None):
+        """
+        Fetch the result of a query as a pyarrow Table, without building a DataFrame.
+        SQL Server results are read with arrow-odbc when installed, else with pandas.
+        The timeout is only applied here to the arrow-odbc connection, see _deadline.
+
+        Returns:
+            pyarrow.Table: Result of the query
+        """
+        if source == "duckdb":
+            result = conn.execute(sql_query)
+            # to_arrow_table replaces fetch_arrow_table in recent DuckDB versions
+            fetch = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+            return fetch()
+
+        if read_arrow_batches_from_odbc is not None:
+            reader = read_arrow_batches_from_odbc(
+                query=sql_query,
+                connection_string=self._odbc_connection_string(),
+                batch_size=int(os.getenv("SQL_FETCH_BATCH_SIZE", 65536)),
+                query_timeout_sec=self._odbc_timeout(timeout),
+            )
+            return pa.Table.from_batches(reader, schema=reader.schema)
+
+        return pa.Table.from_pandas(pd.read_sql(sql_query, conn), preserve_index=False)
+
+    @contextmanager
+    def _deadline(self, source, conn, timeout):
+        """
+        Cancel the query executed inside the block once timeout seconds have elapsed.
+        DuckDB queries are interrupted by a timer (interrupt only stops the query of
+        this thread's cursor), SQL Server queries run on a pooled connection with the
+        ODBC query timeout, so the driver cancels them on the server.
+
+        Args:
+            source (str): Decoded database source
+            conn: Connection returned by get_connection
+            timeout (float): Seconds before the query is cancelled, no timeout if None or 0
+
+        Yields:
+            Connection to execute the query with
+
+        Raises:
+            QueryTimeoutError: If the query was cancelled after timeout seconds
+        """
+        if not timeout:
+            yield conn
+            return
+
+        if source == "duckdb":
+            expired = threading.Event()
+
+            def interrupt():
+                expired.set()
+                conn.interrupt()
+
+            timer = threading.Timer(timeout, interrupt)
+            timer.daemon = True
+            timer.start()
+            try:
+                yield conn
+            except Exception as e:
+                if expired.is_set():
+                    raise QueryTimeoutError(f"Query cancelled after {timeout} sec(s).") from e
+                raise
+            finally:
+                timer.cancel()
+        else:
+            with conn.connect() as connection:
+                driver_connection = connection.connection.driver_connection
+                driver_connection.timeout = self._odbc_timeout(timeout)
+                try:
+                    yield connection
+                except Exception as e:
+                    # HYT00 is the ODBC state of an expired query timeout
+                    if "HYT00" in str(e):
+                        raise QueryTimeoutError(f"Query cancelled after {timeout} sec(s).") from e
+                    raise
+                finally:
+                    driver_connection.timeout = 0
+
+    @staticmethod
+    def _odbc_timeout(timeout):
+        """
+        ODBC query timeout of a timeout in seconds: a whole number of seconds, 0 for no timeout.
+        """
+        return max(1, math.ceil(timeout)) if timeout else 0
+
+    @staticmethod
+    def _odbc_connection_string():
+        """
+        ODBC connection string of the SQL Server database, for arrow-odbc.
+        """
+        server = os.getenv("SQL_SERVER")
+        database = os.getenv("SQL_SERVER_DATABASE")
+        username = os.getenv("SQL_SERVER_USERNAME")
+        # braces quote the password, a closing brace inside it is doubled
+        password = (os.getenv("SQL_SERVER_PASSWORD") or "").replace("}", "}}")
+
+        return (
+            "Driver={ODBC Driver 18 for SQL Server};"
+            f"Server={server};Database={database};UID={username};PWD={{{password}}};"
+            "TrustServerCertificate=yes"
+        )
+
     @staticmethod
     def decode_source(source):
         """
@@ -82,36 +317,93 @@ class DatabaseService:
         }
         return sources.get(source.lower(), source.lower())
 
-    def execute_sql_query(self, sql_query: str, source: str):
+    def explain_sql_query(self, sql_query: str, source: str):
+        """
+        Get the estimated plan of a query without running it (DuckDB EXPLAIN,
+        SQL Server SET SHOWPLAN_XML) and summarize its cardinality and cost
+        (see utils.plan_utils).
+
+        Args:
+            sql_query (str): SQL query to explain
+            source (str): Database source identifier (e.g., "sql-server", "duckdb")
+
+        Returns:
+            dict: Plan summary (estimated_rows, estimated_cost, max_estimated_rows, cartesian,
+                operators), or None if the query cannot be explained
+        """
+        if not sql_query:
+            return None
+
+        conn = self.get_connection(source)
+        source = self.decode_source(source)
+
+        try:
+            if source == "duckdb":
+                rows = conn.execute(f"EXPLAIN (FORMAT json) {sql_query.strip().rstrip(';')}").fetchall()
+                return duckdb_plan_summary(rows[0][1])
+
+            with conn.connect() as connection:
+                connection.exec_driver_sql("SET SHOWPLAN_XML ON")
+                try:
+                    rows = connection.exec_driver_sql(sql_query).fetchall()
+                finally:
+                    connection.exec_driver_sql("SET SHOWPLAN_XML OFF")
+            return sql_server_plan_summary("".join(row[0] for row in rows))
+        except Exception as e:
+            print(f"[WARNING] SQL plan not available: {e}")
+            return None
+
+    def execute_sql_query(self, sql_query: str, source: str, timeout: float = None):
         """
         Execute SQL query and return results with metadata.
+        Results are served from the result cache when an equivalent query was
+        already executed against the same source, with its original duration.
+        A cached result whose original duration exceeds the timeout is reported
+        as timed out, as the query would have been.
 
         Args:
             sql_query (str): SQL query to execute
             source (str): Database source identifier (e.g., "sql-server", "duckdb")
+            timeout (float): Seconds after which the query is cancelled, no timeout if None or 0
 
         Returns:
-            tuple: (df, executed, rows, columns, duration_sql)
+            tuple: (df, executed, rows, columns, duration_sql, timed_out)
                 - df: DataFrame with results or None
                 - executed: bool indicating if execution was successful
                 - rows: number of rows returned
                 - columns: number of columns returned
-                - duration_sql: execution time in seconds
+                - duration_sql: execution time in seconds, time until cancellation if timed out
+                - timed_out: bool indicating if the query was cancelled by the timeout
         """
         executed = True
+        timed_out = False
         df = None
         rows = 0
         columns = 0
         duration_sql = 0
 
         if sql_query:
+            t = time.time()
             try:
-                t = time.time()
-                df = self.get_dynamic_sql(source, sql_query, True)
-                duration_sql = time.time() - t
+                if self.result_cache is not None:
+                    df, duration_sql, _ = self.result_cache.get_or_execute(
+                        self._result_cache_source(source),
+                        sql_query,
+                        lambda: self._timed_sql(source, sql_query, timeout),
+                    )
+                else:
+                    df, duration_sql = self._timed_sql(source, sql_query, timeout)
+                if timeout and duration_sql > timeout:
+                    raise QueryTimeoutError(f"Query cancelled after {timeout} sec(s).")
                 if df is not None:
                     rows = len(df)
                     columns = len(df.columns)
+            except QueryTimeoutError:
+                df = None
+                executed = False
+                timed_out = True
+                duration_sql = max(time.time() - t, timeout)
+                print(f"[WARNING] SQL execution timed out after {timeout} sec(s).")
             except Exception as e:
                 df = None
                 executed = False
@@ -123,13 +415,445 @@ class DatabaseService:
 
         duration_sql = round(duration_sql, 2)
 
-        return df, executed, rows, columns, duration_sql
+        return df, executed, rows, columns, duration_sql, timed_out
+
+    def fetch_arrow_sql_query(self, sql_query: str, source: str):
+        """
+        Execute a query and fetch its result as an Arrow table, with the types of the database
+        (e.g. DECIMAL columns are not converted to float64), bypassing the result cache.
+        Used for the baselines, whose Arrow files keep these types (see BaselineStore).
+
+        Args:
+            sql_query (str): SQL query to execute
+            source (str): Database source identifier (e.g., "sql-server", "duckdb")
+
+        Returns:
+            tuple: (table, executed, rows, columns, duration_sql)
+                - table: pyarrow.Table with the result or None
+                - executed: bool indicating if execution was successful
+                - rows: number of rows returned
+                - columns: number of columns returned
+                - duration_sql: execution time in seconds
+        """
+        if not sql_query:
+            return None, False, 0, 0, 0
+
+        t = time.time()
+        try:
+            if self.sandbox and self.decode_source(source) == "duckdb":
+                table, duration_sql = self._execute_in_sandbox(sql_query)
+            else:
+                table = self.get_dynamic_sql(source, sql_query, as_arrow=True)
+                duration_sql = time.time() - t
+        except Exception as e:
+            print(f"[ERROR] SQL execution failed: {e}")
+            return None, False, 0, 0, round(time.time() - t, 2)
+
+        return table, True, table.num_rows, table.num_columns, round(duration_sql, 2)
+
+    def compare_with_baseline(
+        self,
+        sql_query: str,
+        source: str,
+        baseline_df: pd.DataFrame,
+        question_number,
+        baseline_profile: dict = None,
+        sample_rows: int = 5,
+        timeout: float = None,
+    ):
+        """
+        Execute a query in DuckDB and compare its result with the baseline inside the
+        database (see utils.duckdb_comparison.compare_in_duckdb). The result is kept
+        in a temporary table and the baseline is registered next to it, so only a
+        sample of the rows is fetched into pandas. The result cache is not used.
+
+        Args:
+            sql_query (str): SQL query to execute
+            source (str): Database source identifier, must be "duckdb"
+            baseline_df (pd.DataFrame): Baseline resultset, or None
+            question_number: Question number
+            baseline_profile (dict): Precision profile of the baseline
+            sample_rows (int): Rows of the result fetched as a sample
+            timeout (float): Seconds after which the query is cancelled, no timeout if None or 0
+
+        Returns:
+            tuple: (sample_df, executed, rows, columns, duration_sql, metrics, timed_out)
+                - sample_df: DataFrame with the first rows of the result or None
+                - executed: bool indicating if execution was successful
+                - rows: number of rows returned
+                - columns: number of columns returned
+                - duration_sql: execution time in seconds, time until cancellation if timed out
+                - metrics: (rows_equality, columns_equality, datasets_equality,
+                  datasets_multiset_equality), as DataUtils.compare_dataframes
+                - timed_out: bool indicating if the query was cancelled by the timeout
+
+        Raises:
+            ValueError: If the source is not DuckDB
+        """
+        if self.decode_source(source) != "duckdb":
+            raise ValueError(f"In-database comparison is not supported for source: {source}")
+
+        metrics = (0.00, 0.00, 0.00, 0.00)
+        if not sql_query:
+            return None, False, 0, 0, 0, metrics, False
+
+        conn = self.get_connection(source)
+        suffix = uuid.uuid4().hex
+        llm_relation = f"llm_result_{suffix}"
+        baseline_relation = f"baseline_{suffix}"
+
+        t = time.time()
+        try:
+            with self._deadline("duckdb", conn, timeout):
+                conn.execute(f"CREATE TEMP TABLE {llm_relation} AS {sql_query.strip().rstrip(';')}")
+            duration_sql = time.time() - t
+            rows = conn.execute(f"SELECT COUNT(*) FROM {llm_relation}").fetchone()[0]
+            sample_df = conn.execute(f"SELECT * FROM {llm_relation} LIMIT {int(sample_rows)}").df()
+            columns = len(sample_df.columns)
+        except QueryTimeoutError:
+            print(f"[WARNING] SQL execution timed out after {timeout} sec(s).")
+            conn.execute(f"DROP TABLE IF EXISTS {llm_relation}")
+            return None, False, 0, 0, round(time.time() - t, 2), metrics, True
+        except Exception as e:
+            print(f"[ERROR] SQL execution failed: {e}")
+            conn.execute(f"DROP TABLE IF EXISTS {llm_relation}")
+            return None, False, 0, 0, 0, metrics, False
+
+        try:
+            if baseline_df is not None and not baseline_df.empty:
+                conn.register(baseline_relation, baseline_df)
+                metrics = compare_in_duckdb(
+                    conn, baseline_relation, baseline_df, llm_relation, question_number, baseline_profile
+                )
+        except Exception as e:
+            print(f"[ERROR] Question #{question_number}: comparison failed: {e}")
+        finally:
+            conn.unregister(baseline_relation)
+            conn.execute(f"DROP TABLE IF EXISTS {llm_relation}")
+
+        return sample_df, True, rows, columns, round(duration_sql, 2), metrics, False
+
+    def compare_streaming(
+        self,
+        sql_query: str,
+        source: str,
+        baseline_df: pd.DataFrame,
+        question_number,
+        baseline_profile: dict = None,
+        baseline_prepared=None,
+        chunk_rows: int = None,
+        timeout: float = None,
+    ):
+        """
+        Execute a query and compare its result with the baseline as it is fetched, in
+        chunks (see utils.streaming_comparison.StreamingComparator), so an oversized
+        result is never loaded as a whole. Fetching stops as soon as the metrics cannot
+        change anymore, the number of rows is then the number of rows read.
+        The timeout covers the execution and the whole fetch, comparison included.
+        The result cache is not used.
+
+        Args:
+            sql_query (str): SQL query to execute
+            source (str): Database source identifier (e.g., "sql-server", "duckdb")
+            baseline_df (pd.DataFrame): Baseline resultset, or None
+            question_number: Question number
+            baseline_profile (dict): Precision profile of the baseline
+            baseline_prepared (callable): Prepared baseline for the decimal places of its
+                rounded columns (e.g. BaselineDataset.prepared)
+            chunk_rows (int): Rows fetched per chunk. Defaults to SQL_FETCH_BATCH_SIZE or 65536.
+            timeout (float): Seconds after which the query is cancelled, no timeout if None or 0
+
+        Returns:
+            tuple: (sample_df, executed, rows, columns, duration_sql, metrics, timed_out)
+                - sample_df: DataFrame with the first rows of the result or None
+                - executed: bool indicating if execution was successful
+                - rows: number of rows read
+                - columns: number of columns returned
+                - duration_sql: execution and fetch time in seconds, comparison excluded,
+                  time until cancellation if timed out
+                - metrics: (rows_equality, columns_equality, datasets_equality,
+                  datasets_multiset_equality), as DataUtils.compare_dataframes
+                - timed_out: bool indicating if the query was cancelled by the timeout
+        """
+        metrics = (0.00, 0.00, 0.00, 0.00)
+        if not sql_query:
+            return None, False, 0, 0, 0, metrics, False
+
+        comparator = StreamingComparator(baseline_df, question_number, baseline_profile, baseline_prepared)
+        duration_sql = 0
+        started = time.time()
+
+        try:
+            t = time.time()
+            chunks = self.stream_sql_query(sql_query, source, chunk_rows, timeout)
+            for chunk in chunks:
+                duration_sql += time.time() - t
+                if not comparator.update(chunk):
+                    chunks.close()
+                    break
+                t = time.time()
+            else:
+                duration_sql += time.time() - t
+        except QueryTimeoutError:
+            print(f"[WARNING] SQL execution timed out after {timeout} sec(s).")
+            return None, False, 0, 0, round(time.time() - started, 2), metrics, True
+        except Exception as e:
+            print(f"[ERROR] SQL execution failed: {e}")
+            return None, False, 0, 0, 0, metrics, False
+
+        if comparator.stopped:
+            print(f"  Question #{question_number}: LLM result not read after {comparator.rows} row(s).")
+
+        metrics = comparator.result()
+        return comparator.sample, True, comparator.rows, comparator.columns, round(duration_sql, 2), metrics, False
+
+    def stream_sql_query(self, sql_query: str, source: str, chunk_rows: int = None, timeout: float = None):
+        """
+        Execute a query and fetch its result in chunks: record batches with fetch_arrow,
+        else DataFrame chunks (DuckDB fetch_df_chunk, pandas read_sql with chunksize).
+
+        Args:
+            sql_query (str): SQL query to execute
+            source (str): Database source identifier (e.g., "sql-server", "duckdb")
+            chunk_rows (int): Rows fetched per chunk. Defaults to SQL_FETCH_BATCH_SIZE or 65536.
+            timeout (float): Seconds after which the query is cancelled, no timeout if None or 0
+
+        Yields:
+            pd.DataFrame: Chunks of the result, the first one even if the result is empty
+
+        Raises:
+            QueryTimeoutError: If the query was cancelled after timeout seconds
+        """
+        if chunk_rows is None:
+            chunk_rows = int(os.getenv("SQL_FETCH_BATCH_SIZE", 65536))
+
+        conn = self.get_connection(source)
+        source = self.decode_source(source)
+
+        with self._deadline(source, conn, timeout) as conn:
+            if source == "duckdb":
+                result = conn.execute(sql_query)
+                if self.fetch_arrow:
+                    # to_arrow_reader replaces fetch_record_batch in recent DuckDB versions
+                    reader = (getattr(result, "to_arrow_reader", None) or result.fetch_record_batch)(chunk_rows)
+                    yield from self._arrow_chunks(reader)
+                else:
+                    # a chunk of fetch_df_chunk has vectors of 2048 rows
+                    vectors = max(1, chunk_rows // 2048)
+                    chunk = result.fetch_df_chunk(vectors)
+                    yield chunk
+                    while len(chunk):
+                        chunk = result.fetch_df_chunk(vectors)
+                        if len(chunk):
+                            yield chunk
+
+            elif self.fetch_arrow and read_arrow_batches_from_odbc is not None:
+                reader = read_arrow_batches_from_odbc(
+                    query=sql_query,
+                    connection_string=self._odbc_connection_string(),
+                    batch_size=chunk_rows,
+                    query_timeout_sec=self._odbc_timeout(timeout),
+                )
+                yield from self._arrow_chunks(reader)
+
+            else:
+                yield from pd.read_sql(sql_query, conn, chunksize=chunk_rows)
+
+    @staticmethod
+    def _arrow_chunks(reader):
+        """
+        Convert the record batches of a reader to DataFrames (see arrow_to_dataframe).
+        """
+        empty = True
+        for batch in reader:
+            empty = False
+            yield arrow_to_dataframe(pa.Table.from_batches([batch]))
+        if empty:
+            yield arrow_to_dataframe(reader.schema.empty_table())
+
+    def check_sql_query(self, sql_query: str, source: str, timeout: float = None):
+        """
+        Execute a query in DuckDB and read its result to the end without keeping it, to
+        find out if it runs, e.g. against a smaller scale factor of the database before
+        the full-size one. DuckDB returns from execute once a streaming query is planned,
+        so its errors (e.g. a failed conversion) are only raised while its rows are read:
+        the rows are read in batches, within the timeout. The result cache is not used.
+
+        Args:
+            sql_query (str): SQL query to execute
+            source (str): Database source identifier, must be "duckdb"
+            timeout (float): Seconds after which the query is cancelled, no timeout if None or 0
+
+        Returns:
+            tuple: (executed, duration_sql, timed_out)
+                - executed: bool indicating if execution was successful
+                - duration_sql: execution time in seconds, time until cancellation if timed out
+                - timed_out: bool indicating if the query was cancelled by the timeout
+
+        Raises:
+            ValueError: If the source is not DuckDB
+        """
+        if self.decode_source(source) != "duckdb":
+            raise ValueError(f"Query check is not supported for source: {source}")
+
+        if not sql_query:
+            return False, 0, False
+
+        conn = self.get_connection(source)
+        t = time.time()
+        try:
+            with self._deadline("duckdb", conn, timeout):
+                result = conn.execute(sql_query)
+                batch_rows = int(os.getenv("SQL_FETCH_BATCH_SIZE", 65536))
+                if pa is not None:
+                    # to_arrow_reader replaces fetch_record_batch in recent DuckDB versions
+                    for _ in (getattr(result, "to_arrow_reader", None) or result.fetch_record_batch)(batch_rows):
+                        pass
+                else:
+                    # a chunk of fetch_df_chunk has vectors of 2048 rows
+                    while len(result.fetch_df_chunk(max(1, batch_rows // 2048))):
+                        pass
+        except QueryTimeoutError:
+            print(f"[WARNING] SQL execution timed out after {timeout} sec(s).")
+            return False, round(time.time() - t, 2), True
+        except Exception as e:
+            print(f"[ERROR] SQL execution failed: {e}")
+            return False, round(time.time() - t, 2), False
+
+        return True, round(time.time() - t, 2), False
+
+    def export_sql_query(self, sql_query: str, source: str, file_path: str, csv_path: str = None):
+        """
+        Execute a query in DuckDB and write its result to a Parquet file with COPY,
+        so the rows are never fetched into pandas. The number of rows and the columns
+        are read from the metadata of the written file. The result cache is not used.
+        The CSV copy is written by DuckDB, not pandas, so its values are formatted as
+        DuckDB casts them to text (e.g. 1.50 for a DECIMAL(15, 2) and true for a boolean,
+        where the CSV files of BaselineStore.write have 1.5 and True); the baseline is
+        read back from the Parquet file. Nothing is kept of a failed export.
+
+        Args:
+            sql_query (str): SQL query to execute
+            source (str): Database source identifier, must be "duckdb"
+            file_path (str): Path of the Parquet file
+            csv_path (str): Path of a tab-separated CSV copy of the Parquet file, not written if None
+                or if the result has no rows
+
+        Returns:
+            tuple: (executed, rows, schema, duration_sql)
+                - executed: bool indicating if execution was successful
+                - rows: number of rows written
+                - schema: list of [column name, DuckDB type] pairs
+                - duration_sql: execution time in seconds, writing the Parquet file included
+
+        Raises:
+            ValueError: If the source is not DuckDB
+        """
+        if self.decode_source(source) != "duckdb":
+            raise ValueError(f"Direct export is not supported for source: {source}")
+
+        if not sql_query:
+            return False, 0, [], 0
+
+        conn = self.get_connection(source)
+        file_literal = "'" + file_path.replace("'", "''") + "'"
+
+        try:
+            t = time.time()
+            conn.execute(f"COPY ({sql_query.strip().rstrip(';')}) TO {file_literal} (FORMAT parquet)")
+            duration_sql = time.time() - t
+            rows = conn.execute("SELECT num_rows FROM parquet_file_metadata(?)", [file_path]).fetchone()[0]
+            schema = [
+                [name, column_type]
+                for name, column_type, *_ in conn.execute(f"DESCRIBE SELECT * FROM {file_literal}").fetchall()
+            ]
+            if csv_path and rows:
+                csv_literal = "'" + csv_path.replace("'", "''") + "'"
+                conn.execute(f"COPY (SELECT * FROM {file_literal}) TO {csv_literal} (FORMAT csv, DELIMITER '\t')")
+        except Exception as e:
+            print(f"[ERROR] SQL execution failed: {e}")
+            for path in (file_path, csv_path):
+                if path and os.path.isfile(path):
+                    os.remove(path)
+            return False, 0, [], 0
+
+        return True, int(rows), schema, round(duration_sql, 2)
+
+    def _timed_sql(self, source, sql_query, timeout=None):
+        """
+        Execute a query as a DataFrame and measure its duration,
+        fetching it as an Arrow table first with fetch_arrow.
+
+        Returns:
+            tuple: (df, duration_sql)
+        """
+        if self.sandbox and self.decode_source(source) == "duckdb":
+            table, duration_sql = self._execute_in_sandbox(sql_query, timeout)
+            t = time.time()
+            return arrow_to_dataframe(table), duration_sql + time.time() - t
+
+        t = time.time()
+        if self.fetch_arrow:
+            df = arrow_to_dataframe(self.get_dynamic_sql(source, sql_query, as_arrow=True, timeout=timeout))
+        else:
+            df = self.get_dynamic_sql(source, sql_query, True, timeout=timeout)
+        return df, time.time() - t
+
+    def _execute_in_sandbox(self, sql_query, timeout=None):
+        """
+        Execute a DuckDB query in a worker process of the sandbox.
+
+        Returns:
+            tuple: (table, duration_sql), without the startup of the worker
+        """
+        try:
+            return self._get_sandbox().execute(sql_query, timeout)
+        except TimeoutError as e:
+            raise QueryTimeoutError(str(e)) from e
+
+    def _get_sandbox(self):
+        """
+        Get the query sandbox, created on first use.
+
+        Returns:
+            QuerySandbox: Pool of worker processes for the DuckDB file
+        """
+        with self._lock:
+            if self._sandbox is None:
+                self._sandbox = QuerySandbox(self.duckdb_path)
+            return self._sandbox
+
+    def database_identity(self, source):
+        """
+        Identify the database a source points to: the DuckDB file, or the
+        SQL Server server and database.
+
+        Args:
+            source (str): Database source identifier
+
+        Returns:
+            str: Identity of the database, e.g. "duckdb:/path/to/tpch.db"
+        """
+        source = self.decode_source(source or "")
+        if source == "duckdb":
+            return f"duckdb:{os.path.abspath(self.duckdb_path)}"
+        return f"{source}:{os.getenv('SQL_SERVER')}/{os.getenv('SQL_SERVER_DATABASE')}"
+
+    def _result_cache_source(self, source):
+        """
+        Identify the database of a source in the result cache keys.
+        """
+        return self.database_identity(source)
 
     def get_connection(self, source):
         """
         Get database connection engine.
         Extracted from module_data.get_connection()
 
+        The SQL Server engine and the DuckDB database are created on first use
+        and reused afterwards. For DuckDB each thread gets its own cursor of
+        the shared connection.
+
         Args:
             source (str): Database source identifier
 
@@ -140,39 +864,118 @@ class DatabaseService:
             RuntimeError: If connection fails
         """
         source = self.decode_source(source)
-        engine = None
 
         if source == "sql-server":
-            server = os.getenv("SQL_SERVER")
-            database = os.getenv("SQL_SERVER_DATABASE")
-            username = os.getenv("SQL_SERVER_USERNAME")
-            password = os.getenv("SQL_SERVER_PASSWORD")
-            password = urllib.parse.quote_plus(password)
-
-            connection_string = (
-                f"mssql+pyodbc://{username}:{password}@{server}/{database}"
-                "?driver=ODBC+Driver+18+for+SQL+Server&TrustServerCertificate=yes"
-            )
+            with self._lock:
+                if source not in self._engines:
+                    self._engines[source] = self._create_sql_server_engine()
+                return self._engines[source]
 
         elif source == "duckdb":
             # File-based DuckDB
-            db_path = os.getenv("DUCKDB_PATH", "./data/tpch.db")
-            return duckdb.connect(db_path)
+            return self._get_duckdb_cursor(self.duckdb_path)
 
         else:
             raise ValueError(f"Unsupported database source: {source}")
 
-        # For SQL sources, create SQLAlchemy engine
-        if source in ["sql-server"]:
-            engine = create_engine(connection_string)
+    def warm_up(self, source):
+        """
+        Open the connection of the source ahead of the first query, so the
+        connection setup is not measured as part of any query duration.
+
+        Args:
+            source (str): Database source identifier
+        """
+        self.get_connection(source)
+        if self.sandbox and self.decode_source(source) == "duckdb":
+            self._get_sandbox().start()
+
+    def close(self):
+        """
+        Dispose the SQL Server engines, close the DuckDB connections, stop
+        the sandbox workers and clear the result cache.
+        """
+        with self._lock:
+            engines = list(self._engines.values())
+            connections = list(self._duckdb_connections.values())
+            sandbox = self._sandbox
+            self._engines.clear()
+            self._duckdb_connections.clear()
+            self._sandbox = None
+
+        if sandbox is not None:
+            sandbox.close()
+
+        for engine in engines:
+            engine.dispose()
+        for conn in connections:
+            conn.close()
+
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+        self._thread_local = threading.local()
+
+    def _create_sql_server_engine(self):
+        """
+        Create the pooled SQLAlchemy engine for SQL Server and warm it up.
+
+        Returns:
+            sqlalchemy.engine.Engine: Database engine
+
+        Raises:
+            RuntimeError: If connection fails
+        """
+        server = os.getenv("SQL_SERVER")
+        database = os.getenv("SQL_SERVER_DATABASE")
+        username = os.getenv("SQL_SERVER_USERNAME")
+        password = os.getenv("SQL_SERVER_PASSWORD")
+        password = urllib.parse.quote_plus(password)
+
+        connection_string = (
+            f"mssql+pyodbc://{username}:{password}@{server}/{database}"
+            "?driver=ODBC+Driver+18+for+SQL+Server&TrustServerCertificate=yes"
+        )
 
-            # tries to conect to the server to warm up [for sql azure serverless]
+        engine = create_engine(
+            connection_string,
+            poolclass=QueuePool,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+        )
+
+        # tries to conect to the server to warm up [for sql azure serverless]
+        try:
+            _ = pd.read_sql("SELECT @@servername", engine)
+        except Exception:
             try:
                 _ = pd.read_sql("SELECT @@servername", engine)
-            except Exception:
-                try:
-                    _ = pd.read_sql("SELECT @@servername", engine)
-                except Exception as e:
-                    raise RuntimeError("Error connecting to the SQL database.") from e
+            except Exception as e:
+                raise RuntimeError("Error connecting to the SQL database.") from e
 
         return engine
+
+    def _get_duckdb_cursor(self, db_path):
+        """
+        Get the cursor of the current thread for the DuckDB database,
+        opening the database once per process.
+
+        Args:
+            db_path (str): Path to the DuckDB database file
+
+        Returns:
+            duckdb.DuckDBPyConnection: Cursor owned by the current thread
+        """
+        cursors = getattr(self._thread_local, "duckdb_cursors", None)
+        if cursors is None:
+            cursors = self._thread_local.duckdb_cursors = {}
+
+        if db_path not in cursors:
+            with self._lock:
+                if db_path not in self._duckdb_connections:
+                    self._duckdb_connections[db_path] = duckdb.connect(db_path, read_only=self.duckdb_read_only)
+                cursors[db_path] = self._duckdb_connections[db_path].cursor()
+
+        return cursors[db_path]
@@ -0,0 +1,62 @@
+import os
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """
+    Durations of the last successful calls of each (provider, model), to tell when a call
+    is slower than usual: a call still running after a high quantile of these durations
+    (p95 by default) is hedged with a duplicate request.
+    """
+
+    def __init__(self, window: int = None, min_samples: int = None, quantile: float = None):
+        """
+        Args:
+            window (int): Durations kept per key. Defaults to LLM_HEDGE_WINDOW or 100.
+            min_samples (int): Durations needed before a key has a hedge delay.
+                Defaults to LLM_HEDGE_MIN_SAMPLES or 10.
+            quantile (float): Quantile of the durations used as hedge delay.
+                Defaults to LLM_HEDGE_QUANTILE or 0.95.
+        """
+        if window is None:
+            window = int(os.getenv("LLM_HEDGE_WINDOW", 100))
+        if min_samples is None:
+            min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 10))
+        if quantile is None:
+            quantile = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+
+        self.window = window
+        self.min_samples = min_samples
+        self.quantile = quantile
+
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, duration: float):
+        """
+        Record the duration of a successful call.
+
+        Args:
+            key (tuple): (provider id, model name)
+            duration (float): Seconds of the call.
+        """
+        with self._lock:
+            self._durations.setdefault(key, deque(maxlen=self.window)).append(duration)
+
+    def hedge_delay(self, key):
+        """
+        Seconds after which a call of the key is slower than usual.
+
+        Args:
+            key (tuple): (provider id, model name)
+
+        Returns:
+            float: Quantile of the recorded durations, None with fewer than min_samples durations.
+        """
+        with self._lock:
+            durations = sorted(self._durations.get(key, ()))
+
+        if len(durations) < max(self.min_samples, 1):
+            return None
+        return durations[min(int(self.quantile * len(durations)), len(durations) - 1)]
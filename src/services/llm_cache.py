@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class LLMResponseCache:
+    """
+    On-disk cache of LLM responses, in front of LLMService.generate_sql_query.
+
+    Entries are keyed by a hash of (platform, model, rendered system message,
+    user prompt, temperature, max_tokens) and store the SQL query plus the
+    tokens metadata of the original call. Each entry is a JSON file, so the
+    cache survives between runs. Entries older than max_age_days are removed,
+    and the least recently used entries are removed when the cache is larger
+    than max_size_mb.
+
+    Modes:
+        - off: the cache is not used.
+        - read: cached responses are used, new responses are not stored.
+        - readwrite: cached responses are used and new responses are stored.
+        - refresh: cached responses are ignored and new responses are stored.
+    """
+
+    MODES = ("off", "read", "readwrite", "refresh")
+
+    def __init__(
+        self,
+        cache_dir: str = None,
+        mode: str = "readwrite",
+        max_size_mb: float = None,
+        max_age_days: float = None,
+    ):
+        """
+        Args:
+            cache_dir (str): Directory of the cache. Defaults to LLM_CACHE_DIR or ./.cache/llm_responses.
+            mode (str): One of off, read, readwrite, refresh.
+            max_size_mb (float): Maximum size of the cache. Defaults to LLM_CACHE_MAX_SIZE_MB or 500.
+            max_age_days (float): Maximum age of an entry. Defaults to LLM_CACHE_MAX_AGE_DAYS or 30.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported cache mode: {mode}. Use one of {', '.join(self.MODES)}.")
+
+        if cache_dir is None:
+            cache_dir = os.getenv("LLM_CACHE_DIR", "./.cache/llm_responses")
+        if max_size_mb is None:
+            max_size_mb = float(os.getenv("LLM_CACHE_MAX_SIZE_MB", 500))
+        if max_age_days is None:
+            max_age_days = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", 30))
+
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_size_mb = max_size_mb
+        self.max_age_days = max_age_days
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.mode != "off":
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.evict()
+
+    @property
+    def can_read(self) -> bool:
+        """True if cached responses are used in the current mode."""
+        return self.mode in ("read", "readwrite")
+
+    @property
+    def can_write(self) -> bool:
+        """True if new responses are stored in the current mode."""
+        return self.mode in ("readwrite", "refresh")
+
+    @staticmethod
+    def make_key(platform, model, system_message, user_prompt, temperature, max_tokens) -> str:
+        """
+        Build the cache key of a request.
+
+        Returns:
+            str: sha256 hex digest of the request parameters.
+        """
+        payload = json.dumps(
+            [platform, model, system_message, user_prompt, temperature, max_tokens],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Get a cached response.
+
+        Args:
+            key (str): Cache key built with make_key.
+
+        Returns:
+            tuple: (sql_query, metadata) or None if the entry is not cached,
+                expired, or the cache cannot be read in the current mode.
+        """
+        if not self.can_read:
+            return None
+
+        file_path = self._entry_path(key)
+
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self._is_expired(entry.get("created_at", 0)):
+            self._remove(file_path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # touch the entry, the modification time is the last access time for the eviction
+        try:
+            os.utime(file_path, None)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+
+        return entry["sql_query"], entry.get("metadata", {})
+
+    def put(self, key: str, sql_query: str, metadata: dict, platform: str = None, model: str = None):
+        """
+        Store a response. Empty responses (failed calls) are not stored.
+
+        Args:
+            key (str): Cache key built with make_key.
+            sql_query (str): Response of the LLM.
+            metadata (dict): Tokens usage and duration of the call.
+            platform (str): Platform of the call, stored for troubleshooting.
+            model (str): Model of the call, stored for troubleshooting.
+        """
+        if not self.can_write or not sql_query:
+            return
+
+        entry = {
+            "created_at": time.time(),
+            "platform": platform,
+            "model": model,
+            "sql_query": sql_query,
+            "metadata": metadata,
+        }
+
+        file_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # write to a temporary file first, so concurrent readers never see a partial entry
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+
+    def evict(self):
+        """
+        Remove the expired entries, and the least recently used entries
+        while the cache is larger than max_size_mb.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        entries = []
+
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                file_path = os.path.join(root, file)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+
+        removed = 0
+        max_age_seconds = self.max_age_days * 24 * 3600
+        now = time.time()
+
+        live_entries = []
+        for mtime, size, file_path in entries:
+            # the modification time is refreshed on reads, so created_at is checked on get()
+            if max_age_seconds and now - mtime > max_age_seconds:
+                self._remove(file_path)
+                removed += 1
+            else:
+                live_entries.append((mtime, size, file_path))
+
+        total_size = sum(size for _, size, _ in live_entries)
+        max_size = self.max_size_mb * 1024 * 1024
+
+        for mtime, size, file_path in sorted(live_entries):
+            if total_size <= max_size:
+                break
+            self._remove(file_path)
+            total_size -= size
+            removed += 1
+
+        return removed
+
+    def _entry_path(self, key: str) -> str:
+        """Entries are sharded in sub-directories by the first two characters of the key."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _is_expired(self, created_at: float) -> bool:
+        """True if the entry is older than max_age_days."""
+        return bool(self.max_age_days) and time.time() - created_at > self.max_age_days * 24 * 3600
+
+    @staticmethod
+    def _remove(file_path: str):
+        """Remove an entry, ignoring entries already removed by another process."""
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
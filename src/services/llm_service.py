@@ -1,14 +1,136 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import anthropic
+import httpx
+import openai
+import requests
 from langfuse import get_client, observe
+from langfuse.openai import AsyncAzureOpenAI, AzureOpenAI
+from requests.adapters import HTTPAdapter
 
-from utils.llm_utils import get_chat_completion_from_platform
+from services.latency_tracker import LatencyTracker
+from services.rate_limiter import RateLimiter
+from utils.llm_utils import (
+    aget_chat_completion_from_platform,
+    estimate_tokens,
+    get_chat_completion_from_platform,
+    rate_limit_error,
+    resolve_client_settings,
+    transient_error,
+)
 
 
 class LLMService:
     """
     Service class for LLM interactions.
     Extracted from LLMsEvaluator.__get_sql_query_from_LLM()
+
+    The service owns a registry of provider clients keyed by
+    (platform, endpoint, api_version, api_key). Clients are created lazily
+    and reused for the whole run, so the TLS handshake and the HTTP
+    connection pool are paid once per provider instead of once per question.
+
+    The calls to each provider go through its RateLimiter, keyed by the provider id,
+    with the rpm, tpm and max_concurrency of the provider in the models file. A call
+    refused with 429 lowers the concurrency of the provider and is sent again after
+    the Retry-After, up to rate_limit_retries times, instead of failing the question.
+
+    Other transient errors (timeouts, connection errors, 5xx) are retried up to
+    max_retries times after a jittered exponential backoff, each request failing after
+    request_timeout seconds. For a provider with a hedge in the models file, a call
+    still running after the p95 latency of its model (see LatencyTracker) is duplicated
+    to the hedge provider, and the first answer is used. The metadata of each call
+    records its attempts, hedges and wasted tokens.
     """
 
+    def __init__(
+        self,
+        max_connections: int = None,
+        max_keepalive_connections: int = None,
+        keepalive_expiry: float = None,
+        cache=None,
+        stream: bool = None,
+        rate_limit_retries: int = None,
+        completion_tokens_estimate: int = None,
+        max_retries: int = None,
+        retry_backoff: float = None,
+        retry_backoff_max: float = None,
+        request_timeout: float = None,
+        latency_tracker: LatencyTracker = None,
+    ):
+        """
+        Args:
+            max_connections (int): Maximum number of connections of each client pool.
+                Defaults to LLM_POOL_MAX_CONNECTIONS or 20.
+            max_keepalive_connections (int): Maximum number of idle connections kept alive
+                in each client pool. Defaults to LLM_POOL_MAX_KEEPALIVE or 10.
+            keepalive_expiry (float): Seconds an idle connection is kept alive.
+                Defaults to LLM_POOL_KEEPALIVE_EXPIRY or 60.
+            cache (LLMResponseCache): Optional on-disk cache of the LLM responses.
+            stream (bool): Stream the completions and stop them once the SQL block is complete,
+                recording time_to_first_token and time_to_sql. Defaults to LLM_STREAM or False.
+            rate_limit_retries (int): Times a call refused with 429 is sent again.
+                Defaults to LLM_RATE_LIMIT_RETRIES or 3.
+            completion_tokens_estimate (int): Completion tokens reserved per call in the tpm budget,
+                along with the estimated prompt tokens (at most max_tokens), until the provider
+                reports the actual usage. Defaults to LLM_RATE_LIMIT_COMPLETION_TOKENS or 500.
+            max_retries (int): Times a call failed with another transient error is sent again.
+                Defaults to LLM_MAX_RETRIES or 2.
+            retry_backoff (float): Seconds of the first backoff, doubled on each retry, the actual
+                wait being random between 0 and the backoff. Defaults to LLM_RETRY_BACKOFF or 1.
+            retry_backoff_max (float): Seconds of backoff at most. Defaults to LLM_RETRY_BACKOFF_MAX or 30.
+            request_timeout (float): Seconds after which a request fails with a (transient) timeout,
+                0 for the timeout of the clients. Defaults to LLM_REQUEST_TIMEOUT or 0.
+            latency_tracker (LatencyTracker): Durations of the calls, for the hedge delays.
+        """
+        if max_connections is None:
+            max_connections = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", 20))
+        if max_keepalive_connections is None:
+            max_keepalive_connections = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", 10))
+        if keepalive_expiry is None:
+            keepalive_expiry = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", 60))
+        if stream is None:
+            stream = os.getenv("LLM_STREAM", "false").lower() in ("1", "true", "yes")
+        if rate_limit_retries is None:
+            rate_limit_retries = int(os.getenv("LLM_RATE_LIMIT_RETRIES", 3))
+        if completion_tokens_estimate is None:
+            completion_tokens_estimate = int(os.getenv("LLM_RATE_LIMIT_COMPLETION_TOKENS", 500))
+        if max_retries is None:
+            max_retries = int(os.getenv("LLM_MAX_RETRIES", 2))
+        if retry_backoff is None:
+            retry_backoff = float(os.getenv("LLM_RETRY_BACKOFF", 1))
+        if retry_backoff_max is None:
+            retry_backoff_max = float(os.getenv("LLM_RETRY_BACKOFF_MAX", 30))
+        if request_timeout is None:
+            request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", 0))
+        if latency_tracker is None:
+            latency_tracker = LatencyTracker()
+
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.cache = cache
+        self.stream = stream
+        self.rate_limit_retries = rate_limit_retries
+        self.completion_tokens_estimate = completion_tokens_estimate
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.request_timeout = request_timeout
+        self.latency_tracker = latency_tracker
+
+        self._clients = {}
+        self._rate_limiters = {}
+        self._hedge_executor = None
+        self._stats_lock = threading.Lock()
+        self._async_clients = {}
+        self._clients_lock = threading.Lock()
+
     @observe(capture_input=False, capture_output=True)
     def generate_sql_query(
         self,
@@ -40,43 +162,644 @@ class LLMService:
             tokens used and LLM call duration.
         """
 
-        # copy the system_message to a new variable that is local to the execution of this function
-        system_message_local = system_message
+        system_message_local, user_prompt_formatted = self._render_prompts(
+            system_message, user_prompt, database_tables_context, semantic_rules
+        )
 
-        system_message_local = system_message_local.replace("{{database_tables_context}}", database_tables_context)
-        system_message_local = system_message_local.replace("{{semantic_rules}}", semantic_rules)
+        cache_key, cached = self._cache_lookup(
+            platform, model["name"], system_message_local, user_prompt_formatted, temperature, max_tokens
+        )
+        if cached is not None:
+            self._update_langfuse(question_number)
+            return cached
 
-        user_prompt_formatted = f"""
-            {user_prompt}
+        sql_query = ""
+        metadata_json = {}
+        duration = 0
+
+        stats = self._new_stats()
+
+        try:
+            request = {
+                "platform": platform,
+                "system_message": system_message_local,
+                "user_prompt": user_prompt_formatted,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "question_number": question_number,
+                "tokens": self._estimate_request_tokens(system_message_local, user_prompt_formatted, max_tokens),
+            }
+
+            # Call the LLM to get the SQL query
+            sql_query, metadata_json = self._complete(request, model["name"], model_config, stats)
+
+        except Exception as e:
+            print(f"Error: {e}")
+            sql_query = ""
+            duration = 0
+            print(f"Error: {e}")
+            print(f"Duration: {duration} seconds")
+            print(f"SQL to execute: {sql_query}")
+
+        metadata_json.update(self._round_stats(stats))
+        self._cache_store(cache_key, sql_query, metadata_json, platform, model["name"])
+
+        self._update_langfuse(question_number)
+
+        return sql_query, metadata_json
+
+    @observe(capture_input=False, capture_output=True)
+    async def agenerate_sql_query(
+        self,
+        platform: str,
+        model: dict,
+        question_number: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: int,
+        database_tables_context: str,
+        system_message: str,
+        semantic_rules: str,
+        **model_config,
+    ):
         """
+        Async version of generate_sql_query, to run many LLM calls
+        concurrently on a single event loop.
+
+        :param platform: Platform to use for generating chat completions.
+        :param model: Model dictionary with model information.
+        :param question_number: Question number.
+        :param user_prompt: User prompt.
+        :param temperature: Temperature for the LLM.
+        :param max_tokens: Maximum tokens for the LLM.
+        :param database_tables_context: Database tables context.
+        :param system_message: System message template.
+        :param semantic_rules: Semantic rules content.
+        :param model_config: Model configuration [id, endpoint, api_key].
+        :return: SQL query to execute, and metadata in json that includes
+            tokens used and LLM call duration.
+        """
+
+        system_message_local, user_prompt_formatted = self._render_prompts(
+            system_message, user_prompt, database_tables_context, semantic_rules
+        )
+
+        cache_key, cached = self._cache_lookup(
+            platform, model["name"], system_message_local, user_prompt_formatted, temperature, max_tokens
+        )
+        if cached is not None:
+            self._update_langfuse(question_number)
+            return cached
 
         sql_query = ""
         metadata_json = {}
         duration = 0
 
+        stats = self._new_stats()
+
         try:
-            params = {"question_number": question_number, **model_config}
+            request = {
+                "platform": platform,
+                "system_message": system_message_local,
+                "user_prompt": user_prompt_formatted,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "question_number": question_number,
+                "tokens": self._estimate_request_tokens(system_message_local, user_prompt_formatted, max_tokens),
+            }
 
             # Call the LLM to get the SQL query
-            sql_query, metadata_json = get_chat_completion_from_platform(
-                platform,
-                model["name"],
-                system_message_local,
-                user_prompt_formatted,
-                temperature,
-                max_tokens,
-                True,
-                **params,
-            )
+            sql_query, metadata_json = await self._acomplete(request, model["name"], model_config, stats)
 
         except Exception as e:
-            print(f"Error: {e}")
             sql_query = ""
             duration = 0
             print(f"Error: {e}")
             print(f"Duration: {duration} seconds")
             print(f"SQL to execute: {sql_query}")
 
+        metadata_json.update(self._round_stats(stats))
+        self._cache_store(cache_key, sql_query, metadata_json, platform, model["name"])
+
+        self._update_langfuse(question_number)
+
+        return sql_query, metadata_json
+
+    def get_client(self, platform: str, model_name: str, model_config: dict):
+        """
+        Get the long-lived client used to call a model, creating it on first use.
+
+        :param platform: Platform configured for the model.
+        :param model_name: Model name.
+        :param model_config: Model configuration [id, endpoint, api_key].
+        :return: AzureOpenAI, anthropic.Anthropic or requests.Session (ollama) client,
+            or None for unsupported platforms.
+        """
+        key = resolve_client_settings(platform, model_name, model_config)
+
+        with self._clients_lock:
+            if key not in self._clients:
+                self._clients[key] = self._create_client(*key)
+            return self._clients[key]
+
+    def get_async_client(self, platform: str, model_name: str, model_config: dict):
+        """
+        Get the long-lived async client used to call a model from the running
+        event loop, creating it on first use. Async clients are bound to the
+        event loop where they are used, so they are kept per event loop.
+
+        :param platform: Platform configured for the model.
+        :param model_name: Model name.
+        :param model_config: Model configuration [id, endpoint, api_key].
+        :return: AsyncAzureOpenAI, anthropic.AsyncAnthropic or httpx.AsyncClient (ollama)
+            client, or None for unsupported platforms.
+        """
+        key = (id(asyncio.get_running_loop()),) + resolve_client_settings(platform, model_name, model_config)
+
+        with self._clients_lock:
+            if key not in self._async_clients:
+                self._async_clients[key] = self._create_async_client(*key[1:])
+            return self._async_clients[key]
+
+    def get_rate_limiter(self, model_config: dict):
+        """
+        Get the rate limiter of a provider, creating it on first use.
+
+        :param model_config: Provider configuration [id, rpm, tpm, max_concurrency].
+        :return: RateLimiter shared by all the models of the provider.
+        """
+        provider_id = model_config.get("id", "")
+
+        with self._clients_lock:
+            if provider_id not in self._rate_limiters:
+                self._rate_limiters[provider_id] = RateLimiter(
+                    provider_id,
+                    rpm=model_config.get("rpm"),
+                    tpm=model_config.get("tpm"),
+                    max_concurrency=model_config.get("max_concurrency"),
+                )
+            return self._rate_limiters[provider_id]
+
+    def close(self):
+        """
+        Close the sync clients and their connection pools, and the threads of the hedged requests.
+        """
+        with self._clients_lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            hedge_executor, self._hedge_executor = self._hedge_executor, None
+
+        if hedge_executor is not None:
+            hedge_executor.shutdown(wait=False)
+
+        for client in clients:
+            if client is not None:
+                client.close()
+
+    async def aclose(self):
+        """
+        Close the async clients created from the running event loop.
+        """
+        loop_id = id(asyncio.get_running_loop())
+
+        with self._clients_lock:
+            keys = [key for key in self._async_clients if key[0] == loop_id]
+            clients = [self._async_clients.pop(key) for key in keys]
+
+        for client in clients:
+            if client is None:
+                continue
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                await client.close()
+
+    def _limits(self):
+        """
+        Connection pool limits shared by all the httpx based clients.
+        """
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _create_client(self, platform, endpoint, api_key, api_version):
+        """
+        Create a sync client with a keep-alive connection pool. The retries of the SDKs are
+        off: the failed requests are sent again by _complete, within the rate limits.
+        """
+        if platform == "azure_openai":
+            return AzureOpenAI(
+                azure_endpoint=endpoint,
+                api_key=api_key,
+                api_version=api_version,
+                http_client=openai.DefaultHttpxClient(limits=self._limits()),
+                max_retries=0,
+            )
+
+        if platform == "anthropic":
+            return anthropic.Anthropic(
+                api_key=api_key,
+                http_client=anthropic.DefaultHttpxClient(limits=self._limits()),
+                max_retries=0,
+            )
+
+        if platform == "ollama":
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            return session
+
+        return None
+
+    def _create_async_client(self, platform, endpoint, api_key, api_version):
+        """
+        Create an async client with a keep-alive connection pool.
+        """
+        if platform == "azure_openai":
+            return AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_key=api_key,
+                api_version=api_version,
+                http_client=openai.DefaultAsyncHttpxClient(limits=self._limits()),
+                max_retries=0,
+            )
+
+        if platform == "anthropic":
+            return anthropic.AsyncAnthropic(
+                api_key=api_key,
+                http_client=anthropic.DefaultAsyncHttpxClient(limits=self._limits()),
+                max_retries=0,
+            )
+
+        if platform == "ollama":
+            return httpx.AsyncClient(timeout=300, limits=self._limits())  # 5 minutes timeout
+
+        return None
+
+    def _estimate_request_tokens(self, system_message, user_prompt, max_tokens):
+        """
+        Tokens of a request reserved in the tpm budget of its provider: the estimated prompt
+        tokens and the expected completion tokens.
+        """
+        return estimate_tokens(system_message + user_prompt) + min(max_tokens, self.completion_tokens_estimate)
+
+    def _complete(self, request, model_name, model_config, stats):
+        """
+        Call the LLM, sending the request again on transient errors and hedging the slow calls.
+
+        :return: output text and metadata of the call.
+        """
+        hedge = self._hedge_config(model_name, model_config)
+        retries = 0
+
+        while True:
+            hedge_delay = self.latency_tracker.hedge_delay((model_config.get("id", ""), model_name)) if hedge else None
+            try:
+                if hedge_delay is None:
+                    return self._attempt(request, model_name, model_config, stats)
+                return self._hedged_attempt(request, model_name, model_config, hedge, hedge_delay, stats)
+            except Exception as e:
+                delay = self._retry_delay(e, model_config, retries, stats)
+                if delay is None:
+                    raise
+                if not rate_limit_error(e)[0]:
+                    retries += 1
+                time.sleep(delay)
+
+    async def _acomplete(self, request, model_name, model_config, stats):
+        """
+        Async version of _complete.
+        """
+        hedge = self._hedge_config(model_name, model_config)
+        retries = 0
+
+        while True:
+            hedge_delay = self.latency_tracker.hedge_delay((model_config.get("id", ""), model_name)) if hedge else None
+            try:
+                if hedge_delay is None:
+                    return await self._aattempt(request, model_name, model_config, stats)
+                return await self._ahedged_attempt(request, model_name, model_config, hedge, hedge_delay, stats)
+            except Exception as e:
+                delay = self._retry_delay(e, model_config, retries, stats)
+                if delay is None:
+                    raise
+                if not rate_limit_error(e)[0]:
+                    retries += 1
+                await asyncio.sleep(delay)
+
+    def _attempt(self, request, model_name, model_config, stats):
+        """
+        Send a request to a provider, within its rate limits.
+        """
+        rate_limiter = self.get_rate_limiter(model_config)
+        waited = rate_limiter.acquire(request["tokens"])
+        self._count(stats, attempts=1, rate_limit_wait=waited)
+        start = time.time()
+
+        try:
+            output, metadata_json = get_chat_completion_from_platform(
+                request["platform"],
+                model_name,
+                request["system_message"],
+                request["user_prompt"],
+                request["temperature"],
+                request["max_tokens"],
+                True,
+                client=self.get_client(request["platform"], model_name, model_config),
+                stream=self.stream,
+                request_timeout=self.request_timeout,
+                question_number=request["question_number"],
+                **model_config,
+            )
+        except BaseException as e:
+            self._release(rate_limiter, request["tokens"], e)
+            raise
+
+        rate_limiter.release(request["tokens"], metadata_json.get("total_tokens"))
+        self.latency_tracker.record((model_config.get("id", ""), model_name), time.time() - start)
+        return output, metadata_json
+
+    async def _aattempt(self, request, model_name, model_config, stats):
+        """
+        Async version of _attempt.
+        """
+        rate_limiter = self.get_rate_limiter(model_config)
+        waited = await rate_limiter.aacquire(request["tokens"])
+        self._count(stats, attempts=1, rate_limit_wait=waited)
+        start = time.time()
+
+        try:
+            output, metadata_json = await aget_chat_completion_from_platform(
+                request["platform"],
+                model_name,
+                request["system_message"],
+                request["user_prompt"],
+                request["temperature"],
+                request["max_tokens"],
+                True,
+                client=self.get_async_client(request["platform"], model_name, model_config),
+                stream=self.stream,
+                request_timeout=self.request_timeout,
+                question_number=request["question_number"],
+                **model_config,
+            )
+        except BaseException as e:
+            # also on cancellation, when the hedge of the request answered first
+            self._release(rate_limiter, request["tokens"], e)
+            raise
+
+        rate_limiter.release(request["tokens"], metadata_json.get("total_tokens"))
+        self.latency_tracker.record((model_config.get("id", ""), model_name), time.time() - start)
+        return output, metadata_json
+
+    def _hedged_attempt(self, request, model_name, model_config, hedge, hedge_delay, stats):
+        """
+        Send a request, and its duplicate to the hedge provider if it is still running after
+        hedge_delay seconds, returning the first answer. The other request cannot be stopped
+        and runs to its end in the background: its tokens are counted as wasted, estimated as
+        the tokens of the answer when it is not done yet.
+        """
+        hedge_model_name, hedge_config = hedge
+        executor = self._get_hedge_executor()
+
+        primary = executor.submit(self._attempt, request, model_name, model_config, stats)
+        futures = [primary]
+        if not wait(futures, timeout=hedge_delay).done:
+            self._count(stats, hedges=1)
+            futures.append(executor.submit(self._attempt, request, hedge_model_name, hedge_config, stats))
+
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    output, metadata_json = future.result()
+                    for other in futures:
+                        if other is not future:
+                            self._count_wasted(stats, other, metadata_json, cancelled=False)
+                    return output, metadata_json
+
+        raise primary.exception()
+
+    async def _ahedged_attempt(self, request, model_name, model_config, hedge, hedge_delay, stats):
+        """
+        Async version of _hedged_attempt. The other request is cancelled, so only its prompt
+        tokens are counted as wasted (estimated as the prompt tokens of the answer).
+        """
+        hedge_model_name, hedge_config = hedge
+
+        primary = asyncio.ensure_future(self._aattempt(request, model_name, model_config, stats))
+        tasks = [primary]
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done:
+            self._count(stats, hedges=1)
+            tasks.append(asyncio.ensure_future(self._aattempt(request, hedge_model_name, hedge_config, stats)))
+
+        pending = tasks
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        output, metadata_json = task.result()
+                        for other in tasks:
+                            if other is not task:
+                                self._count_wasted(stats, other, metadata_json, cancelled=not other.done())
+                        return output, metadata_json
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise primary.exception()
+
+    def _hedge_config(self, model_name, model_config):
+        """
+        Model name and provider configuration of the hedge requests of a provider.
+
+        :return: (model name, provider configuration), or None if the provider has no hedge.
+        """
+        hedge = model_config.get("hedge")
+        if not hedge:
+            return None
+
+        hedge_config = {**model_config, **hedge}
+        hedge_config.pop("hedge")
+        hedge_model_name = hedge_config.pop("model", None) or model_name
+        return hedge_model_name, hedge_config
+
+    def _retry_delay(self, error, model_config, retries, stats):
+        """
+        Seconds to wait before sending a failed request again.
+
+        :return: 0 after a 429 (the rate limiter waits for the Retry-After), a jittered
+            exponential backoff after another transient error, or None if the request is not
+            sent again (not transient, or out of retries).
+        """
+        provider_id = model_config.get("id", "")
+        rate_limited, retry_after = rate_limit_error(error)
+        if rate_limited:
+            if stats["rate_limited"] >= self.rate_limit_retries:
+                return None
+            self._count(stats, rate_limited=1)
+            rate_limiter = self.get_rate_limiter(model_config)
+            wait_time = retry_after if retry_after is not None else rate_limiter.backoff
+            print(
+                f"[WARNING] Provider {provider_id} rate limited (429), concurrency lowered to "
+                f"{int(rate_limiter.limit)}, retrying in {wait_time:.1f} sec(s)."
+            )
+            return 0
+
+        if not transient_error(error) or retries >= self.max_retries:
+            return None
+
+        delay = random.uniform(0, min(self.retry_backoff * 2**retries, self.retry_backoff_max))
+        print(
+            f"[WARNING] Provider {provider_id}: {error}. "
+            f"Retry {retries + 1} of {self.max_retries} in {delay:.1f} sec(s)."
+        )
+        return delay
+
+    @staticmethod
+    def _release(rate_limiter, tokens, error):
+        """
+        Release the slot of a failed request, telling the rate limiter about a 429.
+        """
+        rate_limited, retry_after = rate_limit_error(error)
+        rate_limiter.release(tokens, 0 if rate_limited else None, rate_limited=rate_limited, retry_after=retry_after)
+
+    def _count_wasted(self, stats, other, metadata_json, cancelled):
+        """
+        Count the tokens of the request that did not answer first: its own usage if it is
+        done, else estimated from the answer (its prompt only if it was cancelled).
+        """
+        if other.done() and not other.cancelled():
+            if other.exception() is not None:
+                return
+            _, metadata_json = other.result()
+            cancelled = False
+
+        self._count(
+            stats,
+            wasted_prompt_tokens=metadata_json.get("prompt_tokens") or 0,
+            wasted_completion_tokens=0 if cancelled else metadata_json.get("completion_tokens") or 0,
+        )
+
+    def _count(self, stats, **counts):
+        """
+        Add to the counters of a call, updated by its hedge requests from other threads.
+        """
+        with self._stats_lock:
+            for name, value in counts.items():
+                stats[name] += value
+
+    @staticmethod
+    def _new_stats():
+        """
+        Counters of a call: requests sent, hedge requests, 429 answers, seconds waited
+        for the rate limits and tokens of the requests whose answer was not used.
+        """
+        return {
+            "attempts": 0,
+            "hedges": 0,
+            "rate_limited": 0,
+            "rate_limit_wait": 0.0,
+            "wasted_prompt_tokens": 0,
+            "wasted_completion_tokens": 0,
+        }
+
+    def _round_stats(self, stats):
+        """
+        Copy of the counters of a call for its metadata.
+        """
+        with self._stats_lock:
+            return {**stats, "rate_limit_wait": round(stats["rate_limit_wait"], 2)}
+
+    def _get_hedge_executor(self):
+        """
+        Threads running the hedged requests, created on first use.
+        """
+        with self._clients_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections, thread_name_prefix="llm-hedge"
+                )
+            return self._hedge_executor
+
+    def _cache_lookup(self, platform, model_name, system_message, user_prompt, temperature, max_tokens):
+        """
+        Look up a response in the cache.
+        A cache hit keeps the tokens metadata of the original call, reports a duration
+        (and streaming timings) of 0 with the original one in cached_duration, and is
+        flagged with cache_hit, so the latency statistics can leave it out. It sends no
+        request, so its attempts, hedges and wasted tokens are 0.
+
+        :return: (cache key or None if the cache is off, (sql_query, metadata) or None on a miss).
+        """
+        if self.cache is None or self.cache.mode == "off":
+            return None, None
+
+        cache_key = self.cache.make_key(platform, model_name, system_message, user_prompt, temperature, max_tokens)
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return cache_key, None
+
+        sql_query, metadata_json = cached
+        metadata_json = {
+            **metadata_json,
+            "duration": 0,
+            "cached_duration": metadata_json.get("duration", 0),
+            "cache_hit": True,
+        }
+        for timing in ("time_to_first_token", "time_to_last_token", "time_to_sql"):
+            if metadata_json.get(timing) is not None:
+                metadata_json[timing] = 0
+        for counter in ("attempts", "hedges", "wasted_prompt_tokens", "wasted_completion_tokens"):
+            if counter in metadata_json:
+                metadata_json[counter] = 0
+
+        return cache_key, (sql_query, metadata_json)
+
+    def _cache_store(self, cache_key, sql_query, metadata_json, platform, model_name):
+        """
+        Store a response in the cache, if the cache is enabled for writing.
+        """
+        if cache_key is None:
+            return
+
+        metadata_json["cache_hit"] = False
+        self.cache.put(cache_key, sql_query, metadata_json, platform=platform, model=model_name)
+
+    @staticmethod
+    def _render_prompts(system_message, user_prompt, database_tables_context, semantic_rules):
+        """
+        Render the system message template and format the user prompt.
+
+        :param system_message: System message template.
+        :param user_prompt: User prompt.
+        :param database_tables_context: Database tables context.
+        :param semantic_rules: Semantic rules content.
+        :return: rendered system message and formatted user prompt.
+        """
+        # copy the system_message to a new variable that is local to the execution of this function
+        system_message_local = system_message
+
+        system_message_local = system_message_local.replace("{{database_tables_context}}", database_tables_context)
+        system_message_local = system_message_local.replace("{{semantic_rules}}", semantic_rules)
+
+        user_prompt_formatted = f"""
+            {user_prompt}
+        """
+
+        return system_message_local, user_prompt_formatted
+
+    @staticmethod
+    def _update_langfuse(question_number):
+        """
+        Tag the current trace and log the question number in the current span.
+        """
         langfuse = get_client()
 
         langfuse.update_current_trace(tags=["qa"])
@@ -86,5 +809,3 @@ class LLMService:
                 "question_number": question_number,
             }
         )
-
-        return sql_query, metadata_json
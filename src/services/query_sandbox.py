@@ -0,0 +1,268 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import duckdb
+
+try:
+    import pyarrow as pa
+except ImportError:  # the sandbox returns the results as Arrow IPC streams
+    pa = None
+
+# seconds between two checks of the deadline and of the memory of a busy worker
+_POLL_INTERVAL = 0.05
+
+
+class QuerySandbox:
+    """
+    Pool of worker processes executing DuckDB queries, so a query exhausting the memory
+    only takes down its worker instead of the evaluator, and queries run in parallel
+    outside the GIL of the evaluator.
+
+    Each worker opens the DuckDB file read-only with its own memory_limit and threads
+    settings, runs one query at a time and sends the result back as an Arrow IPC stream
+    over its pipe. While a query runs the parent watches the resident memory of the
+    worker (Linux /proc) and its deadline: a worker over max_memory_mb or past the
+    timeout is killed and replaced, and the query fails on its own. Workers are started
+    ahead of the queries (start, and right after a worker is killed), and the duration of
+    a query only runs from the moment its worker is ready, so the startup of a process is
+    not measured as part of a query.
+    """
+
+    def __init__(
+        self,
+        duckdb_path: str,
+        max_workers: int = None,
+        memory_limit: str = None,
+        threads: int = None,
+        max_memory_mb: float = None,
+    ):
+        """
+        Args:
+            duckdb_path (str): DuckDB database file, opened read-only by every worker.
+            max_workers (int): Worker processes at most. Defaults to SQL_SANDBOX_WORKERS or 4.
+            memory_limit (str): DuckDB memory_limit of the workers. Defaults to
+                SQL_SANDBOX_DUCKDB_MEMORY_LIMIT or 2GB.
+            threads (int): DuckDB threads of the workers. Defaults to SQL_SANDBOX_DUCKDB_THREADS or 2.
+            max_memory_mb (float): Resident memory at which a worker is killed, 0 for no limit.
+                Defaults to SQL_SANDBOX_MAX_MEMORY_MB or 4096.
+        """
+        if pa is None:
+            raise RuntimeError("The query sandbox requires pyarrow.")
+
+        if max_workers is None:
+            max_workers = int(os.getenv("SQL_SANDBOX_WORKERS", 4))
+        if memory_limit is None:
+            memory_limit = os.getenv("SQL_SANDBOX_DUCKDB_MEMORY_LIMIT", "2GB")
+        if threads is None:
+            threads = int(os.getenv("SQL_SANDBOX_DUCKDB_THREADS", 2))
+        if max_memory_mb is None:
+            max_memory_mb = float(os.getenv("SQL_SANDBOX_MAX_MEMORY_MB", 4096))
+
+        self.duckdb_path = duckdb_path
+        self.max_workers = max_workers
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.max_memory_mb = max_memory_mb
+
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.Semaphore(max_workers)
+        self._idle = []
+        self._started = 0
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def execute(self, sql_query: str, timeout: float = None):
+        """
+        Execute a query in a worker process.
+
+        Args:
+            sql_query (str): SQL query to execute
+            timeout (float): Seconds after which the worker is killed, no timeout if None or 0
+
+        Returns:
+            tuple: (table, duration_sql), the pyarrow.Table of the result and the seconds from
+                the query sent to the worker to its result received
+
+        Raises:
+            TimeoutError: If the query was cancelled after timeout seconds
+            RuntimeError: If the query failed, or its worker ran out of memory or died
+        """
+        with self._slots:
+            worker = self._get_worker()
+            healthy = False
+            try:
+                process, connection = worker
+                if process.pid not in self._ready:
+                    # ("ready", None) once the worker has opened the database
+                    self._receive(worker, connection.recv)
+                    self._ready.add(process.pid)
+                t = time.time()
+                connection.send(sql_query)
+                self._wait(worker, timeout)
+                status, payload = self._receive(worker, connection.recv)
+                if status == "ok":
+                    payload = self._receive(worker, connection.recv_bytes)
+                duration_sql = time.time() - t
+                healthy = True
+            finally:
+                if not healthy:
+                    self._ready.discard(process.pid)
+                    self._stop(worker)
+                    worker = self._start_worker()
+                with self._lock:
+                    self._idle.append(worker)
+
+        if status == "error":
+            raise RuntimeError(payload)
+        return pa.ipc.open_stream(payload).read_all(), duration_sql
+
+    def start(self):
+        """
+        Start the workers that are not running yet, up to max_workers.
+        """
+        with self._lock:
+            missing = self.max_workers - self._started
+            self._started += missing
+
+        workers = [self._start_worker() for _ in range(missing)]
+        with self._lock:
+            self._idle.extend(workers)
+
+    def close(self):
+        """
+        Stop the idle workers.
+        """
+        with self._lock:
+            workers = list(self._idle)
+            self._idle.clear()
+            self._started -= len(workers)
+
+        for process, connection in workers:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            process.join(timeout=5)
+            self._stop((process, connection))
+            self._ready.discard(process.pid)
+
+    def _get_worker(self):
+        """
+        Take an idle worker, or start a new one.
+
+        Returns:
+            tuple: (process, connection)
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+
+        return self._start_worker()
+
+    def _start_worker(self):
+        """
+        Start a worker process.
+
+        Returns:
+            tuple: (process, connection)
+        """
+        connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_connection, self.duckdb_path, self.memory_limit, self.threads),
+            daemon=True,
+        )
+        process.start()
+        child_connection.close()
+        return process, connection
+
+    def _wait(self, worker, timeout):
+        """
+        Wait for the reply of a worker, within the timeout and the memory limit.
+        """
+        process, connection = worker
+        started = time.time()
+        while not connection.poll(_POLL_INTERVAL):
+            if timeout and time.time() - started > timeout:
+                raise TimeoutError(f"Query cancelled after {timeout} sec(s).")
+            memory_mb = _resident_memory_mb(process.pid)
+            if self.max_memory_mb and memory_mb > self.max_memory_mb:
+                raise RuntimeError(
+                    f"Out of memory: sandbox worker stopped at {memory_mb:,.0f} MB "
+                    f"(SQL_SANDBOX_MAX_MEMORY_MB {self.max_memory_mb:,.0f})."
+                )
+
+    @staticmethod
+    def _receive(worker, receive):
+        """
+        Receive from a worker, reporting a worker that died instead of a broken pipe.
+        """
+        process, _ = worker
+        try:
+            return receive()
+        except (EOFError, OSError) as e:
+            process.join(timeout=5)
+            raise RuntimeError(f"Sandbox worker died with exit code {process.exitcode} (out of memory?).") from e
+
+    @staticmethod
+    def _stop(worker):
+        """
+        Kill a worker and release its pipe.
+        """
+        process, connection = worker
+        if process.is_alive():
+            process.kill()
+        process.join()
+        connection.close()
+
+
+def _resident_memory_mb(pid):
+    """
+    Resident memory of a process in MB, 0 where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            resident_pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _worker_main(connection, duckdb_path, memory_limit, threads):
+    """
+    Worker process: open the database and reply ("ready", None), then execute the
+    queries received on the connection until None or the end of the pipe, replying
+    ("ok", size) and the Arrow IPC stream of the result, or ("error", message).
+    """
+    database = duckdb.connect(duckdb_path, read_only=True, config={"memory_limit": memory_limit, "threads": threads})
+    connection.send(("ready", None))
+
+    while True:
+        try:
+            sql_query = connection.recv()
+        except EOFError:
+            break
+        if sql_query is None:
+            break
+
+        try:
+            result = database.execute(sql_query)
+            # to_arrow_table replaces fetch_arrow_table in recent DuckDB versions
+            table = (getattr(result, "to_arrow_table", None) or result.fetch_arrow_table)()
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            buffer = sink.getvalue()
+            del result, table
+        except Exception as e:
+            connection.send(("error", str(e)))
+            continue
+
+        connection.send(("ok", buffer.size))
+        connection.send_bytes(buffer)
+        del buffer
+
+    database.close()
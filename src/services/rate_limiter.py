@@ -0,0 +1,158 @@
+import asyncio
+import os
+import threading
+import time
+
+# seconds between two checks of a free slot by the async callers
+_POLL_INTERVAL = 0.01
+
+
+class RateLimiter:
+    """
+    Rate limits of the requests to one provider (the id of an entry in models_configs).
+
+    The requests per minute (rpm) and tokens per minute (tpm) budgets are token buckets
+    holding one minute of budget, refilled continuously. Each request reserves one request
+    and its estimated tokens before it is sent, waiting while a bucket is in debt; once the
+    call is done the estimate is corrected with the tokens reported by the provider.
+
+    The requests in flight are bounded by an adaptive limit (AIMD): it grows by one every
+    `limit` successful calls, up to max_concurrency, and is halved when the provider
+    answers 429, after which every request waits for the Retry-After of the provider.
+    """
+
+    def __init__(self, provider_id: str, rpm: int = None, tpm: int = None, max_concurrency: int = None, backoff=None):
+        """
+        Args:
+            provider_id (str): Id of the provider in the models file.
+            rpm (int): Requests per minute of the provider, no limit if None or 0.
+            tpm (int): Tokens per minute of the provider, no limit if None or 0.
+            max_concurrency (int): Requests in flight at most; without it there is no limit
+                until the first 429.
+            backoff (float): Seconds to wait after a 429 without Retry-After.
+                Defaults to LLM_RATE_LIMIT_BACKOFF or 2.
+        """
+        if backoff is None:
+            backoff = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", 2))
+
+        self.provider_id = provider_id
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.backoff = backoff
+
+        self.limit = float(max_concurrency) if max_concurrency else None
+        self.in_flight = 0
+        self.rate_limited = 0
+
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Wait for a slot and for the budget of a request.
+
+        Args:
+            tokens (int): Estimated tokens of the request.
+
+        Returns:
+            float: Seconds waited.
+        """
+        start = time.monotonic()
+        with self._condition:
+            while not self._has_slot():
+                self._condition.wait()
+            wait = self._reserve(tokens)
+
+        if wait > 0:
+            time.sleep(wait)
+        return time.monotonic() - start
+
+    async def aacquire(self, tokens: int) -> float:
+        """
+        Async version of acquire, polling for a free slot without blocking the event loop.
+        """
+        start = time.monotonic()
+        while True:
+            with self._condition:
+                if self._has_slot():
+                    wait = self._reserve(tokens)
+                    break
+            await asyncio.sleep(_POLL_INTERVAL)
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return time.monotonic() - start
+
+    def release(self, tokens: int, used_tokens: int = None, rate_limited: bool = False, retry_after: float = None):
+        """
+        Release the slot of a request.
+
+        Args:
+            tokens (int): Tokens reserved by acquire.
+            used_tokens (int): Tokens reported by the provider, the difference with the reserved
+                ones goes back to the tpm bucket; unknown if None.
+            rate_limited (bool): Whether the provider answered 429.
+            retry_after (float): Seconds asked by the provider before the next request, backoff if None.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if rate_limited:
+                self.rate_limited += 1
+                # a single decrease per 429 burst: the requests in flight when the first
+                # one was refused are refused as well, during the pause
+                if now >= self._paused_until:
+                    current = self.limit if self.limit is not None else self.in_flight + 1
+                    self.limit = max(1.0, current / 2)
+                pause = retry_after if retry_after is not None else self.backoff
+                self._paused_until = max(self._paused_until, now + pause)
+            elif self.limit is not None:
+                self.limit += 1 / self.limit
+                if self.max_concurrency:
+                    self.limit = min(self.limit, float(self.max_concurrency))
+
+            if self.tpm and used_tokens is not None:
+                self._refill(now)
+                self._tokens = min(self._tokens + tokens - used_tokens, float(self.tpm))
+
+            self._condition.notify_all()
+
+    def _has_slot(self):
+        """
+        Whether a request can be sent without exceeding the concurrency limit.
+        """
+        return self.limit is None or self.in_flight < max(1, int(self.limit))
+
+    def _refill(self, now):
+        """
+        Refill the buckets with the budget of the time elapsed since the last refill.
+        """
+        elapsed = now - self._refilled
+        self._refilled = now
+        if self.rpm:
+            self._requests = min(self._requests + elapsed * self.rpm / 60, float(self.rpm))
+        if self.tpm:
+            self._tokens = min(self._tokens + elapsed * self.tpm / 60, float(self.tpm))
+
+    def _reserve(self, tokens):
+        """
+        Take a slot and the budget of a request, returning the seconds to wait before
+        sending it: until the buckets are out of debt, and until the end of a pause.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.in_flight += 1
+
+        wait = self._paused_until - now
+        if self.rpm:
+            self._requests -= 1
+            wait = max(wait, -self._requests * 60 / self.rpm)
+        if self.tpm:
+            self._tokens -= tokens
+            wait = max(wait, -self._tokens * 60 / self.tpm)
+        return wait
@@ -0,0 +1,258 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # spilling to disk is optional
+    pa = None
+    feather = None
+
+from utils.sql_utils import canonicalize_sql
+
+
+class SQLResultCache:
+    """
+    In-memory cache of SQL results, in front of DatabaseService.execute_sql_query.
+
+    Entries are keyed by the data source and the canonical form of the query
+    (see utils.sql_utils.canonicalize_sql), so queries that only differ in
+    whitespace, comments, case or alias names are executed once. Each entry
+    keeps the DataFrame and the duration of the original execution.
+
+    The least recently used entries are dropped when the DataFrames take more
+    than max_memory_mb. When a spill directory is set and pyarrow is installed,
+    they are written to Arrow files instead and read back on the next hit.
+    """
+
+    def __init__(self, max_memory_mb: float = None, spill_dir: str = None):
+        """
+        Args:
+            max_memory_mb (float): Memory budget of the cached DataFrames.
+                Defaults to SQL_RESULT_CACHE_MAX_MB or 512.
+            spill_dir (str): Directory of the Arrow files of the entries dropped from memory.
+                Defaults to SQL_RESULT_CACHE_SPILL_DIR, no spilling if empty.
+        """
+        if max_memory_mb is None:
+            max_memory_mb = float(os.getenv("SQL_RESULT_CACHE_MAX_MB", 512))
+        if spill_dir is None:
+            spill_dir = os.getenv("SQL_RESULT_CACHE_SPILL_DIR", "")
+
+        if spill_dir and pa is None:
+            print("[WARNING] pyarrow is not installed, SQL results dropped from the cache are not spilled to disk.")
+            spill_dir = ""
+
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.spill_dir = spill_dir
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._spilled = {}
+        # entries dropped from memory while their Arrow file is written
+        self._spilling = {}
+        self._memory_bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(source: str, sql_query: str):
+        """
+        Build the cache key of a query.
+
+        Args:
+            source (str): Data source of the query, including the database file for DuckDB.
+            sql_query (str): SQL query.
+
+        Returns:
+            tuple: (key, aliases declared in the query, in order).
+        """
+        canonical, aliases = canonicalize_sql(sql_query)
+        key = hashlib.sha256(f"{source}\n{canonical}".encode("utf-8")).hexdigest()
+        return key, aliases
+
+    def get_or_execute(self, source: str, sql_query: str, execute):
+        """
+        Get the result of a query from the cache, or execute it and cache it.
+        Concurrent calls with the same key wait for the first execution instead
+        of running the query again.
+
+        Args:
+            source (str): Data source of the query, including the database file for DuckDB.
+            sql_query (str): SQL query.
+            execute (callable): Function executing the query, returning (df, duration_sql).
+                Exceptions are not cached.
+
+        Returns:
+            tuple: (df, duration_sql, cache_hit). The DataFrame is a copy, with the
+                alias columns renamed to the aliases of sql_query.
+        """
+        key, aliases = self.make_key(source, sql_query)
+
+        spilled = None
+        while True:
+            with self._lock:
+                entry = self._get_entry(key)
+                if entry is not None:
+                    self.hits += 1
+                    break
+
+                event = self._in_flight.get(key)
+                if event is None:
+                    # this thread reads the spilled entry back, or executes the query
+                    self._in_flight[key] = threading.Event()
+                    spilled = self._spilled.pop(key, None)
+                    break
+
+            # another thread is executing the same query
+            event.wait()
+
+        if entry is not None:
+            return self._rename_aliases(entry["df"], entry["aliases"], aliases), entry["duration_sql"], True
+
+        try:
+            entry = self._read_spilled(key, spilled) if spilled is not None else None
+            with self._lock:
+                if entry is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if entry is not None:
+                return self._rename_aliases(entry["df"], entry["aliases"], aliases), entry["duration_sql"], True
+
+            df, duration_sql = execute()
+            if df is not None:
+                self._put(key, df.copy(), duration_sql, aliases)
+            return df, duration_sql, False
+        finally:
+            with self._lock:
+                self._in_flight.pop(key).set()
+
+    def clear(self):
+        """
+        Remove all the entries, including the spilled ones.
+        """
+        with self._lock:
+            spilled = list(self._spilled.values())
+            self._entries.clear()
+            self._spilled.clear()
+            self._spilling.clear()
+            self._memory_bytes = 0
+
+        for entry in spilled:
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def _get_entry(self, key):
+        """
+        Get an entry in memory and mark it as the most recently used, or an entry
+        being written to its Arrow file. Must be called with the lock held.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        return self._spilling.get(key)
+
+    def _read_spilled(self, key, spilled):
+        """
+        Read a spilled entry back from its Arrow file and add it to memory.
+        Called without the lock, by the thread marked in flight for the key.
+        """
+        try:
+            df = feather.read_feather(spilled["path"])
+            os.remove(spilled["path"])
+        except (OSError, pa.ArrowException):
+            return None
+
+        entry = {"df": df, "duration_sql": spilled["duration_sql"], "aliases": spilled["aliases"]}
+        self._add(key, entry)
+        return entry
+
+    def _put(self, key, df, duration_sql, aliases):
+        """
+        Store the result of a query.
+        """
+        self._add(key, {"df": df, "duration_sql": duration_sql, "aliases": aliases})
+
+    def _add(self, key, entry):
+        """
+        Add an entry, then spill the entries dropped from memory. The size of the
+        DataFrame is computed and the Arrow files are written without the lock.
+        """
+        entry["size"] = int(entry["df"].memory_usage(deep=True).sum())
+        with self._lock:
+            dropped = self._add_entry(key, entry)
+        for old_key, old_entry in dropped:
+            self._spill(old_key, old_entry)
+
+    def _add_entry(self, key, entry):
+        """
+        Add an entry as the most recently used, and drop the least recently used
+        ones over the memory budget. Must be called with the lock held.
+
+        Returns:
+            list: (key, entry) of the entries to spill, readable until they are written.
+        """
+        if entry["size"] > self.max_memory_bytes:
+            return []
+
+        self._entries[key] = entry
+        self._memory_bytes += entry["size"]
+
+        dropped = []
+        while self._memory_bytes > self.max_memory_bytes:
+            old_key, old_entry = self._entries.popitem(last=False)
+            self._memory_bytes -= old_entry["size"]
+            if self.spill_dir:
+                self._spilling[old_key] = old_entry
+                dropped.append((old_key, old_entry))
+        return dropped
+
+    def _spill(self, key, entry):
+        """
+        Write an entry dropped from memory to an Arrow file, without the lock,
+        then register it unless the cache was cleared meanwhile.
+        """
+        path = os.path.join(self.spill_dir, f"{key}.arrow")
+        try:
+            feather.write_feather(entry["df"].reset_index(drop=True), path)
+        except (OSError, ValueError, pa.ArrowException) as e:
+            print(f"[WARNING] SQL result could not be spilled to disk: {e}")
+            path = None
+
+        with self._lock:
+            registered = path is not None and self._spilling.get(key) is entry and key not in self._entries
+            if self._spilling.get(key) is entry:
+                del self._spilling[key]
+            if registered:
+                self._spilled[key] = {
+                    "path": path,
+                    "duration_sql": entry["duration_sql"],
+                    "aliases": entry["aliases"],
+                }
+
+        if path is not None and not registered:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _rename_aliases(df, cached_aliases, aliases):
+        """
+        Copy a cached DataFrame, renaming the columns named after the aliases
+        of the cached query to the aliases of the current query.
+        """
+        df = df.copy()
+        mapping = {old: new for old, new in zip(cached_aliases, aliases) if old != new}
+        if mapping:
+            df.columns = [mapping.get(column, column) for column in df.columns]
+        return df
@@ -1,8 +1,18 @@
 import os
+from functools import partial
 
+import numpy as np
 import pandas as pd
 
-from utils.dataframe_utils import align_columns_by_first_row, normalize_numeric_columns
+from data.baseline_store import BaselineDataset, BaselineIndex, BaselineStore
+from utils.dataframe_utils import (
+    align_columns_by_signature,
+    as_dataframe,
+    prepare_baseline,
+    round_columns,
+    row_fingerprints,
+    shared_precisions,
+)
 
 
 class DataUtils:
@@ -12,40 +22,75 @@ class DataUtils:
     """
 
     @staticmethod
-    def compare_dataframes(baseline_df, llm_df, question_number):
+    def compare_dataframes(baseline_df, llm_df, question_number, baseline_profile=None, baseline_prepared=None):
         """
         Compares the baseline resultset with the one generated by the LLM,
         ignoring column names and order, but considering the internal
         order of values in each row.
 
-        :param baseline_df: Baseline DataFrame.
-        :param llm_df: DataFrame generated by the LLM.
+        Columns are matched by their signatures (see align_columns_by_signature).
+        Rows are compared by their uint64 fingerprints (see row_fingerprints),
+        matched with sorted unique arrays, so no Python tuple is built per row.
+        The signatures and fingerprints of the baseline (see prepare_baseline) can be
+        cached with it, so each comparison only processes the LLM result.
+        Results fetched as Arrow tables are accepted as they are (see as_dataframe).
+
+        :param baseline_df: Baseline DataFrame or pyarrow Table.
+        :param llm_df: DataFrame or pyarrow Table generated by the LLM.
         :param question_number: Question number.
+        :param baseline_profile: Precision profile of the baseline (see precision_profile),
+            computed if not given.
+        :param baseline_prepared: Function returning the prepared baseline for the decimal
+            places of its rounded columns (e.g. BaselineDataset.prepared), prepare_baseline if not given.
         :return:
             - percent_rows_equality: ratio of number of rows (size-based)
             - percent_columns_equality: ratio of number of columns (size-based)
             - percent_datasets_equality: how much of baseline data is covered
-                in LLM result
+                in LLM result (distinct rows)
+            - percent_multiset_equality: how much of baseline data is covered
+                in LLM result, counting duplicated rows
         """
+        baseline_df = as_dataframe(baseline_df)
+        llm_df = as_dataframe(llm_df)
         if baseline_df is None or llm_df is None or baseline_df.empty:
-            return 0.00, 0.00, 0.00
+            return 0.00, 0.00, 0.00, 0.00
 
         try:
             # Normalize numeric columns to avoid float/decimal mismatches
-            baseline_df, llm_df = normalize_numeric_columns(baseline_df, llm_df)
-
-            # Align columns based on values in the first row (not column names)
-            baseline_df, llm_df = align_columns_by_first_row(baseline_df, llm_df)
-
-            # Convert rows to sets of tuples for set comparison
-            baseline_set = set(map(tuple, baseline_df.to_numpy()))
-            llm_set = set(map(tuple, llm_df.to_numpy()))
-
-            # Calculate intersection
-            intersection = baseline_set.intersection(llm_set)
+            precisions = shared_precisions(baseline_df, llm_df, baseline_profile)
+            if baseline_prepared is not None:
+                baseline = baseline_prepared(precisions)
+            else:
+                baseline = prepare_baseline(baseline_df, precisions)
+            baseline_df = baseline["df"]
+            llm_df = round_columns(llm_df, precisions)
+
+            # Align columns based on their signatures (values, not column names)
+            baseline_df, llm_df = align_columns_by_signature(baseline_df, llm_df, baseline["signatures"])
+
+            # Fingerprint the rows; rows with NaN numeric values never match
+            baseline_keys = baseline["keys"]
+            baseline_counts = baseline["counts"]
+            baseline_distinct = baseline["distinct"]
+
+            if baseline_df.shape[1] == llm_df.shape[1]:
+                llm_fingerprints, llm_matchable = row_fingerprints(llm_df)
+                llm_keys, llm_counts = np.unique(llm_fingerprints[llm_matchable], return_counts=True)
+                _, baseline_index, llm_index = np.intersect1d(
+                    baseline_keys, llm_keys, assume_unique=True, return_indices=True
+                )
+                distinct_intersection = len(baseline_index)
+                multiset_intersection = int(np.minimum(baseline_counts[baseline_index], llm_counts[llm_index]).sum())
+            else:
+                # rows with a different number of values are never equal
+                distinct_intersection = 0
+                multiset_intersection = 0
 
             # Coverage percentages
-            percent_datasets_equality = round(len(intersection) / len(baseline_set), 2) if baseline_set else 0.0
+            percent_datasets_equality = (
+                round(distinct_intersection / baseline_distinct, 2) if baseline_distinct else 0.0
+            )
+            percent_multiset_equality = round(multiset_intersection / len(baseline_df), 2)
 
             # Pure size comparison (not content-aware)
             percent_rows_equality = round(len(llm_df) / len(baseline_df), 2) if len(llm_df) <= len(baseline_df) else 0.0
@@ -59,27 +104,34 @@ class DataUtils:
                 percent_rows_equality,
                 percent_columns_equality,
                 percent_datasets_equality,
+                percent_multiset_equality,
             )
 
         except Exception as e:
             print(f"[ERROR] Question #{question_number}: comparison failed: {e}")
-            return 0.0, 0.0, 0.0
+            return 0.0, 0.0, 0.0, 0.0
 
     @staticmethod
     def load_baseline_datasets(baseline_path: str):
         """
         Loads baseline datasets from the specified directory path.
 
-        This method searches for CSV files in the given directory whose
-        filenames start with "question_" and end with ".csv".
-        Each matching file is read into a pandas DataFrame, and the question number is
-        extracted from the filename.
+        This method searches for CSV files in the given directory whose filenames start
+        with "question_" and end with ".csv", and the question number is extracted from
+        the filename. When the directory has a baseline manifest (see
+        data.baseline_store.BaselineStore), the resultsets of the manifest are read from
+        the memory-mapped Arrow files (when pyarrow is installed) or the Parquet files
+        exported by DuckDB instead, with their original types.
+
+        The entries are loaded lazily: each DataFrame is read, and its precision profile
+        computed, the first time a question needs it, and reused by every comparison.
 
         Args:
-            baseline_path (str): The path to the directory containing baseline dataset CSV files.
+            baseline_path (str): The path to the directory containing baseline dataset files.
 
         Returns:
-            list: List of dictionaries with question_number and df keys
+            BaselineIndex: Baselines keyed by question number, mappings with question_number,
+                df and precision_profile keys
 
         Raises:
             FileNotFoundError: If the specified baseline_path does not exist.
@@ -92,15 +144,24 @@ class DataUtils:
                 raise NotADirectoryError(f"Baseline path {baseline_path} is not a directory.")
         except Exception as e:
             print(f"Error loading baseline datasets: {e}")
-            return []
+            return BaselineIndex()
 
-        baseline_datasets = []
+        baseline_datasets = {}
 
         for file in os.listdir(baseline_path):
             file_path = os.path.join(baseline_path, file)
             if os.path.isfile(file_path) and file.startswith("question_") and file.endswith(".csv"):
-                df = pd.read_csv(file_path, sep="\t", encoding="utf-8")
                 question_number = int(file.split("_")[1].split(".")[0])
-                baseline_datasets.append({"question_number": question_number, "df": df})
-
-        return baseline_datasets
+                baseline_datasets[question_number] = BaselineDataset(
+                    question_number, partial(pd.read_csv, file_path, sep="\t", encoding="utf-8")
+                )
+
+        # the Arrow and Parquet files of the manifest replace the CSV files
+        store = BaselineStore(baseline_path)
+        if store.load_manifest():
+            for question_number in store.question_numbers(typed_only=True):
+                baseline_datasets[question_number] = BaselineDataset(
+                    question_number, partial(store.read, question_number)
+                )
+
+        return BaselineIndex(baseline_datasets.values())
@@ -1,32 +1,532 @@
-from typing import Tuple
+import numbers
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Arrow results are optional, see arrow_to_dataframe
+    pa = None
+    pc = None
 
-def normalize_numeric_columns(df1: pd.DataFrame, df2: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+
+def arrow_to_dataframe(table) -> pd.DataFrame:
+    """
+    Converts an Arrow table (e.g. a DuckDB result fetched with to_arrow_table) to a
+    DataFrame with the types of DuckDB's df(), so baselines and LLM results fetched
+    either way have the same precision profiles and fingerprints: decimals become
+    float64, dates datetime64, and integer or boolean columns with nulls use the
+    nullable pandas types. Strings stay in Arrow memory (pandas str dtype).
+
+    :param table: pyarrow.Table.
+    :return: DataFrame with the columns of the table, duplicated names renamed as df() does (a, a_1).
+    """
+    columns = []
+    for column in table.columns:
+        if pa.types.is_decimal(column.type):
+            column = _decimal_to_float64(column)
+        elif pa.types.is_date(column.type):
+            column = pc.cast(column, pa.timestamp("us"))
+
+        if column.null_count and (pa.types.is_integer(column.type) or pa.types.is_boolean(column.type)):
+            columns.append(column.to_pandas(types_mapper=_NULLABLE_DTYPES.get))
+            continue
+
+        values = column.to_pandas()
+        if column.null_count and values.dtype == object:
+            # df() returns NA for the nulls of object columns (e.g. TIME), to_pandas returns None
+            values = values.where(values.notna(), pd.NA)
+        columns.append(values)
+
+    names = []
+    for name in table.column_names:
+        unique_name, suffix = name, 0
+        while unique_name in names:
+            suffix += 1
+            unique_name = f"{name}_{suffix}"
+        names.append(unique_name)
+
+    df = pd.DataFrame(dict(enumerate(columns)), index=pd.RangeIndex(table.num_rows))
+    df.columns = names
+    return df
+
+
+def _decimal_to_float64(column):
+    """
+    Converts a decimal128 column to float64 as DuckDB does (unscaled integer divided by
+    10^scale), which can differ in the last bit from the cast of pyarrow.
+    """
+    scale = 10.0**column.type.scale
+    chunks = []
+    for chunk in column.chunks:
+        start, stop = 2 * chunk.offset, 2 * (chunk.offset + len(chunk))
+        words = np.frombuffer(chunk.buffers()[1], dtype=np.int64)[start:stop]
+        if column.type.precision <= 18:
+            # stored as a 64-bit integer by DuckDB
+            values = words[0::2].astype(np.float64) / scale
+        else:
+            upper, lower = words[1::2], words[0::2].view(np.uint64)
+            values = upper.astype(np.float64) * 2.0**64 + lower.astype(np.float64)
+            # small negative numbers (upper -1) from their magnitude, as DuckDB does, else 2^64 - lower is rounded
+            negative = upper == -1
+            values[negative] = -(~lower[negative]).astype(np.float64) - 1
+            values /= scale
+        if chunk.null_count:
+            values[chunk.is_null().to_numpy(zero_copy_only=False)] = np.nan
+        chunks.append(pa.array(values, type=pa.float64()))
+    return pa.chunked_array(chunks, type=pa.float64())
+
+
+def as_dataframe(data) -> pd.DataFrame:
+    """
+    :param data: DataFrame, or pyarrow Table or RecordBatch (see arrow_to_dataframe).
+    :return: DataFrame, data itself if it is not an Arrow object.
+    """
+    if pa is not None and isinstance(data, pa.RecordBatch):
+        data = pa.Table.from_batches([data])
+    if pa is not None and isinstance(data, pa.Table):
+        return arrow_to_dataframe(data)
+    return data
+
+
+_NULLABLE_DTYPES = (
+    {
+        pa.int8(): pd.Int8Dtype(),
+        pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(),
+        pa.int64(): pd.Int64Dtype(),
+        pa.uint8(): pd.UInt8Dtype(),
+        pa.uint16(): pd.UInt16Dtype(),
+        pa.uint32(): pd.UInt32Dtype(),
+        pa.uint64(): pd.UInt64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    if pa is not None
+    else {}
+)
+
+
+def min_decimal_places(values) -> int:
+    """
+    Smallest number of decimal places of the values, as written by str(value):
+    floats always have at least one decimal ("3.0"), integers have none.
+
+    The decimal places of a float are the smallest d for which the value
+    round-trips through d decimals, so the values are tested in bulk with
+    numpy for d = 0, 1, 2, ... until one of them round-trips. Values that
+    str() writes in scientific notation, or too large to be scaled exactly,
+    are measured on their string.
+
+    :param values: Array-like of numeric values, without nulls.
+    :return: Smallest decimal places, or None if there are no values.
+    """
+    values = np.asarray(values)
+
+    if not len(values):
+        return None
+
+    if values.dtype.kind in "iub":
+        return 0
+
+    if values.dtype.kind != "f":
+        return min(_str_decimal_places(x) for x in values)
+
+    # str() is applied to the float64 value, as done by Series.apply
+    values = values.astype(np.float64, copy=False)
+
+    if not np.isfinite(values).all():
+        # inf is printed without decimals
+        return 0
+
+    magnitude = np.abs(values)
+
+    # str() uses the scientific notation for these
+    scientific = (magnitude != 0) & ((magnitude < 1e-4) | (magnitude >= 1e16))
+    min_places = min((_str_decimal_places(x) for x in values[scientific]), default=None)
+    if scientific.any():
+        values = values[~scientific]
+        magnitude = magnitude[~scientific]
+        if not len(values):
+            return min_places
+
+    # rint(x * 10^d) is exact below 2^53, larger values are measured on their string
+    exact_limit = float(2**53)
+    for d in range(18):
+        scale = float(10**d)
+        rounded = np.rint(values * scale)
+        if ((rounded / scale == values) & (np.abs(rounded) < exact_limit)).any():
+            # values not tested exactly at a smaller d may have fewer decimals
+            inexact = magnitude * (scale / 10) >= exact_limit if d else np.zeros(len(values), dtype=bool)
+            places = min([max(d, 1)] + [_str_decimal_places(x) for x in values[inexact]])
+            return places if min_places is None else min(places, min_places)
+
+    places = min(_str_decimal_places(x) for x in values)
+    return places if min_places is None else min(places, min_places)
+
+
+def _str_decimal_places(value) -> int:
+    """Decimal places of a value as written by str(value)."""
+    text = str(value)
+    return len(text.split(".")[1]) if "." in text else 0
+
+
+def precision_profile(df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Smallest decimal precision of each numeric column of a DataFrame.
+    The profile of a baseline is computed once and reused for every comparison.
+
+    :param df: DataFrame to profile.
+    :return: Dictionary of column name to smallest decimal precision.
+        Columns without values are left out.
+    """
+    profile = {}
+    for col in df.select_dtypes(include=[np.number]).columns:
+        places = min_decimal_places(df[col].dropna().to_numpy())
+        if places is not None:
+            profile[col] = places
+    return profile
+
+
+def normalize_numeric_columns(
+    df1: pd.DataFrame, df2: pd.DataFrame, df1_profile: Dict[str, int] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     Normalizes numeric columns in both DataFrames to the smallest shared decimal precision.
+    The input DataFrames are not modified, the rounded columns are set on copies.
 
     :param df1: First DataFrame.
     :param df2: Second DataFrame.
+    :param df1_profile: Precision profile of df1 (see precision_profile), computed if not given.
     :return: Tuple containing (normalized df1, normalized df2).
     """
+    precisions = shared_precisions(df1, df2, df1_profile)
+    return round_columns(df1, precisions), round_columns(df2, precisions)
+
+
+def shared_precisions(df1: pd.DataFrame, df2: pd.DataFrame, df1_profile: Dict[str, int] = None) -> Dict[str, int]:
+    """
+    Smallest shared decimal precision of the numeric columns of both DataFrames,
+    matched by name. Columns without values in either DataFrame are not included.
+
+    :param df1: First DataFrame.
+    :param df2: Second DataFrame.
+    :param df1_profile: Precision profile of df1 (see precision_profile), computed if not given.
+    :return: Dictionary of column name to decimal places.
+    """
     # Identify numeric columns in both DataFrames
     numeric_columns = df1.select_dtypes(include=[np.number]).columns.intersection(
         df2.select_dtypes(include=[np.number]).columns
     )
+    if numeric_columns.empty:
+        return {}
+
+    if df1_profile is None:
+        df1_profile = precision_profile(df1[numeric_columns])
+    df2_profile = precision_profile(df2[numeric_columns])
+
+    return {
+        col: min(df1_profile[col], df2_profile[col])
+        for col in numeric_columns
+        if col in df1_profile and col in df2_profile
+    }
+
+
+def round_columns(df: pd.DataFrame, precisions: Dict[str, int]) -> pd.DataFrame:
+    """
+    Rounds columns to the given decimal places, on a shallow copy of the DataFrame.
+
+    :param df: DataFrame.
+    :param precisions: Dictionary of column name to decimal places.
+    :return: DataFrame with the rounded columns (df itself if there is nothing to round).
+    """
+    if not precisions:
+        return df
+
+    # shallow copy, setting a column replaces it without touching the input
+    df = df.copy(deep=False)
+    for col, decimals in precisions.items():
+        df[col] = df[col].round(decimals)
+
+    return df
+
+
+def prepare_baseline(df: pd.DataFrame, precisions: Dict[str, int] = None) -> Dict:
+    """
+    Derives everything a comparison needs from the baseline alone, once its numeric
+    columns are rounded, so it can be computed once and reused for every LLM result.
+
+    :param df: Baseline DataFrame.
+    :param precisions: Decimal places of the rounded columns (see shared_precisions).
+    :return: Dictionary with:
+        - df: rounded DataFrame
+        - signatures: column signatures (see column_signatures)
+        - keys, counts: distinct fingerprints of the matchable rows (see row_fingerprints)
+            and their number of occurrences
+        - distinct: number of distinct rows, each unmatchable row counting as one
+    """
+    df = round_columns(df, precisions)
+    fingerprints, matchable = row_fingerprints(df)
+    keys, counts = np.unique(fingerprints[matchable], return_counts=True)
+
+    return {
+        "df": df,
+        "signatures": column_signatures(df),
+        "keys": keys,
+        "counts": counts,
+        "distinct": len(keys) + int((~matchable).sum()),
+    }
+
 
-    for col in numeric_columns:
-        # Determine the smallest decimal precision for the column in both DataFrames
-        df1_precisions = df1[col].dropna().apply(lambda x: len(str(x).split(".")[1]) if "." in str(x) else 0)
-        df2_precisions = df2[col].dropna().apply(lambda x: len(str(x).split(".")[1]) if "." in str(x) else 0)
+def row_fingerprints(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes each row of a DataFrame into a uint64 fingerprint, column by column,
+    so equal rows (same values in the same column order) share a fingerprint.
+
+    Values are hashed with the equality of Python tuples: numeric values are
+    hashed as float64 (5 == 5.0 == Decimal("5")), strings as strings, and
+    other objects with hash(). Rows with a NaN in a numeric column never
+    compare equal, as NaN != NaN, so they are flagged as not matchable.
+
+    :param df: DataFrame to fingerprint.
+    :return: Tuple containing (uint64 fingerprint per row, bool matchable flag per row).
+    """
+    fingerprints = np.full(len(df), 0x345678, dtype=np.uint64)
+    matchable = np.ones(len(df), dtype=bool)
+    multiplier = np.uint64(1000003)
+
+    for i in range(df.shape[1]):
+        hashes, column_matchable = _column_hashes(df.iloc[:, i])
+        fingerprints = (fingerprints ^ hashes) * multiplier
+        multiplier = np.uint64(multiplier + np.uint64(82520 + 2 * (df.shape[1] - i)))
+        matchable &= column_matchable
+
+    return fingerprints, matchable
+
+
+def _column_hashes(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes the values of a column, see row_fingerprints.
+
+    :param column: Column to hash.
+    :return: Tuple containing (uint64 hash per value, bool matchable flag per value).
+    """
+    if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_complex_dtype(column.dtype):
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        return _float_hashes(values), ~np.isnan(values)
+
+    # factorize merges the values equal in Python (5 == 5.0), so only the distinct values
+    # are hashed one by one; nulls keep Python's semantics (NaN objects are equal only to
+    # themselves) and are hashed from the objects of the column
+    codes, uniques = pd.factorize(column)
+    unique_hashes = _object_hashes(np.asarray(uniques, dtype=object))
+    hashes = unique_hashes[codes] if len(unique_hashes) else np.zeros(len(codes), dtype=np.uint64)
+
+    nulls = np.flatnonzero(codes < 0)
+    if len(nulls):
+        hashes[nulls] = _object_hashes(column.iloc[nulls].to_numpy(dtype=object))
+
+    return hashes, np.ones(len(codes), dtype=bool)
+
+
+def _object_hashes(values: np.ndarray) -> np.ndarray:
+    """
+    Hashes Python objects: strings as strings, numbers equal to their float64 value
+    like the numeric columns, and anything else (None, dates, NaN objects, inexact
+    decimals) with Python's hash().
+    """
+    hashes = np.empty(len(values), dtype=np.uint64)
+
+    is_string = np.fromiter((type(value) is str for value in values), dtype=bool, count=len(values))
+    if is_string.any():
+        hashes[is_string] = pd.util.hash_array(values[is_string])
+
+    others = np.flatnonzero(~is_string)
+    floats = np.empty(len(others), dtype=np.float64)
+    is_float = np.zeros(len(others), dtype=bool)
+    python_hashes = np.zeros(len(others), dtype=np.int64)
+    for j, value in enumerate(values[others]):
+        if isinstance(value, numbers.Number) and not isinstance(value, complex):
+            try:
+                number = float(value)
+            except (TypeError, ValueError, OverflowError):
+                number = None
+            if number is not None and number == value:
+                floats[j] = number
+                is_float[j] = True
+                continue
+        python_hashes[j] = hash(value)
+
+    hashes[others[is_float]] = _float_hashes(floats[is_float])
+    hashes[others[~is_float]] = pd.util.hash_array(python_hashes[~is_float])
+
+    return hashes
+
+
+def _float_hashes(values: np.ndarray) -> np.ndarray:
+    """Hashes float64 values, with -0.0 hashed as 0.0."""
+    return pd.util.hash_array(values + 0.0)
+
+
+# Number of smallest distinct value hashes kept per column to estimate the overlap of two columns
+SIGNATURE_SKETCH_SIZE = 32
+
+_KIND_NUMBER = 0
+_KIND_STRING = 1
+_KIND_OTHER = 2
+
+
+def column_signatures(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Computes a signature per column, used to match the columns of two result sets.
+    The signatures of a baseline can be computed once and reused for every comparison.
+
+    The signature of a column is made of its kind (number, string or other), its
+    min and max (numbers only), its null count, the hash of its first value, the
+    sum of the hashes of its values (equal for columns with the same values in any
+    order) and a sketch of its values: the SIGNATURE_SKETCH_SIZE smallest hashes of
+    its distinct values, padded with 0 and flagged in "sketch_mask".
+
+    :param df: DataFrame to profile.
+    :return: Dictionary of arrays with one entry per column (one row per column for "sketch").
+    """
+    columns = df.shape[1]
+    signatures = {
+        "kind": np.full(columns, _KIND_OTHER, dtype=np.int8),
+        "min": np.full(columns, np.nan),
+        "max": np.full(columns, np.nan),
+        "nulls": np.zeros(columns, dtype=np.int64),
+        "first": np.zeros(columns, dtype=np.uint64),
+        "first_matchable": np.zeros(columns, dtype=bool),
+        "multiset": np.zeros(columns, dtype=np.uint64),
+        "sketch": np.zeros((columns, SIGNATURE_SKETCH_SIZE), dtype=np.uint64),
+        "sketch_mask": np.zeros((columns, SIGNATURE_SKETCH_SIZE), dtype=bool),
+    }
+
+    for i in range(columns):
+        column = df.iloc[:, i]
+        hashes, matchable = _column_hashes(column)
+        nulls = column.isna().to_numpy()
+
+        if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_complex_dtype(column.dtype):
+            signatures["kind"][i] = _KIND_NUMBER
+            values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            if (~nulls).any():
+                signatures["min"][i] = np.nanmin(values)
+                signatures["max"][i] = np.nanmax(values)
+        else:
+            inferred = pd.api.types.infer_dtype(column, skipna=True)
+            if inferred in ("string", "empty"):
+                signatures["kind"][i] = _KIND_STRING
+            elif inferred in ("integer", "floating", "decimal", "mixed-integer-float", "boolean"):
+                signatures["kind"][i] = _KIND_NUMBER
+
+        signatures["nulls"][i] = int(nulls.sum())
+        if len(hashes):
+            signatures["first"][i] = hashes[0]
+            signatures["first_matchable"][i] = matchable[0]
+
+        # the sum of the hashes identifies the multiset of values, whatever their order
+        signatures["multiset"][i] = np.add.reduce(hashes[matchable], dtype=np.uint64)
+
+        sketch = _smallest_distinct(hashes[matchable], SIGNATURE_SKETCH_SIZE)
+        signatures["sketch"][i, : len(sketch)] = sketch
+        signatures["sketch_mask"][i, : len(sketch)] = True
+
+    return signatures
+
+
+def _smallest_distinct(values: np.ndarray, k: int) -> np.ndarray:
+    """Sorted k smallest distinct values of an array, partitioning instead of sorting it all."""
+    size = 4 * k
+    while size < len(values):
+        smallest = np.unique(np.partition(values, size)[:size])
+        if len(smallest) >= k:
+            return smallest[:k]
+        size *= 4
+    return np.unique(values)[:k]
+
+
+def match_column_signatures(signatures1: Dict[str, np.ndarray], signatures2: Dict[str, np.ndarray]) -> Dict[int, int]:
+    """
+    Matches the columns of two result sets by their signatures (see column_signatures).
+
+    Every pair of columns is scored at once: the overlap of their value sketches, the
+    same values, an equal first value, equal min/max and equal null counts add to the
+    score, and columns of different kinds never match. The pairs are then assigned one
+    to one, best score first, so two columns sharing a value cannot be matched to the
+    same column.
+
+    :param signatures1: Signatures of the reference result set (baseline).
+    :param signatures2: Signatures of the result set to match (LLM generated).
+    :return: Dictionary of column position in the first result set to matched column
+        position in the second one. Columns without a match are left out.
+    """
+    s1, s2 = signatures1, signatures2
+    columns1, columns2 = len(s1["kind"]), len(s2["kind"])
+    pair = (slice(None), None)
+
+    # overlap of the sketches, as intersection over union of the sketched distinct values
+    equal_hashes = (s1["sketch"][:, None, :, None] == s2["sketch"][None, :, None, :]) & (
+        s1["sketch_mask"][:, None, :, None] & s2["sketch_mask"][None, :, None, :]
+    )
+    intersection = equal_hashes.any(axis=3).sum(axis=2)
+    union = s1["sketch_mask"].sum(axis=1)[pair] + s2["sketch_mask"].sum(axis=1)[None, :] - intersection
+    overlap = np.divide(intersection, union, out=np.zeros(intersection.shape), where=union > 0)
+
+    same_kind = s1["kind"][pair] == s2["kind"][None, :]
+    same_first = (
+        (s1["first"][pair] == s2["first"][None, :]) & s1["first_matchable"][pair] & s2["first_matchable"][None, :]
+    )
+    same_range = (s1["min"][pair] == s2["min"][None, :]) & (s1["max"][pair] == s2["max"][None, :])
+    same_nulls = s1["nulls"][pair] == s2["nulls"][None, :]
+    same_values = s1["multiset"][pair] == s2["multiset"][None, :]
+
+    score = 4.0 * overlap + 4.0 * same_values + 2.0 * same_first + 1.0 * same_range + 0.5 * same_nulls
+    # prefer the same relative position between equally scored columns
+    positions1 = np.arange(columns1) / max(columns1, 1)
+    positions2 = np.arange(columns2) / max(columns2, 1)
+    score -= 1e-3 * np.abs(positions1[pair] - positions2[None, :])
+    score[~(same_kind & ((overlap > 0) | same_values | same_first | same_range))] = -np.inf
+
+    # one to one assignment, best score first
+    assignment = {}
+    used = set()
+    for index in np.argsort(-score, axis=None, kind="stable"):
+        i, j = divmod(int(index), columns2)
+        if score[i, j] == -np.inf or len(assignment) == min(columns1, columns2):
+            break
+        if i in assignment or j in used:
+            continue
+        assignment[i] = j
+        used.add(j)
+
+    return assignment
+
+
+def align_columns_by_signature(
+    df1: pd.DataFrame, df2: pd.DataFrame, df1_signatures: Dict[str, np.ndarray] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Aligns the columns of df2 to match the order of df1 based on the column signatures
+    (see column_signatures and match_column_signatures), not on the column names.
+    Columns of df2 without a match are dropped.
+
+    :param df1: Reference DataFrame (baseline).
+    :param df2: DataFrame to reorder (LLM generated).
+    :param df1_signatures: Signatures of df1, computed if not given.
+    :return: Tuple containing (df1, df2 with reordered columns).
+    """
+    if df1.empty or df2.empty:
+        return df1, df2
 
-        min_precision = min(df1_precisions.min(), df2_precisions.min())
+    if df1_signatures is None:
+        df1_signatures = column_signatures(df1)
+    assignment = match_column_signatures(df1_signatures, column_signatures(df2))
 
-        # Round both DataFrames to the smallest shared precision
-        df1[col] = df1[col].round(min_precision)
-        df2[col] = df2[col].round(min_precision)
+    # Reorder df2 columns to match the order of df1
+    df2 = df2.iloc[:, [assignment[i] for i in range(df1.shape[1]) if i in assignment]]
 
     return df1, df2
 
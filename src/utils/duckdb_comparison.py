@@ -0,0 +1,326 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.dataframe_utils import SIGNATURE_SKETCH_SIZE, match_column_signatures, precision_profile
+
+_NUMERIC_TYPES = (
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "UHUGEINT",
+    "FLOAT",
+    "DOUBLE",
+    "DECIMAL",
+)
+_INTEGER_TYPES = _NUMERIC_TYPES[:10]
+# fetched by pandas as datetime64, so a DATE matches the same TIMESTAMP
+_TIMESTAMP_TYPES = ("DATE", "TIMESTAMP", "TIMESTAMP_S", "TIMESTAMP_MS", "TIMESTAMP_NS")
+
+_KIND_NUMBER = 0
+_KIND_STRING = 1
+_KIND_OTHER = 2
+
+
+def compare_in_duckdb(
+    conn,
+    baseline_relation: str,
+    baseline_df: pd.DataFrame,
+    llm_relation: str,
+    question_number,
+    baseline_profile: Dict[str, int] = None,
+) -> Tuple[float, float, float, float]:
+    """
+    Compares the baseline resultset with the one generated by the LLM inside DuckDB,
+    with the same metrics as DataUtils.compare_dataframes, without pulling the LLM
+    result into pandas.
+
+    Numeric columns shared by name are rounded to the smallest shared precision
+    (as numpy), the columns are matched by signatures computed with SQL
+    aggregates (see match_column_signatures), and the distinct rows of both sides are
+    joined with their counts. Rows with a NULL numeric value never match.
+
+    :param conn: DuckDB connection (or cursor) where both relations are visible.
+    :param baseline_relation: Name of the relation with the baseline (e.g. a registered DataFrame).
+    :param baseline_df: Baseline DataFrame, used for its dtypes and precision profile.
+    :param llm_relation: Name of the relation with the LLM result.
+    :param question_number: Question number.
+    :param baseline_profile: Precision profile of the baseline (see precision_profile),
+        computed if not given.
+    :return:
+        - percent_rows_equality: ratio of number of rows (size-based)
+        - percent_columns_equality: ratio of number of columns (size-based)
+        - percent_datasets_equality: how much of baseline data is covered
+            in LLM result (distinct rows)
+        - percent_multiset_equality: how much of baseline data is covered
+            in LLM result, counting duplicated rows
+    """
+    baseline_columns = _describe(conn, baseline_relation)
+    llm_columns = _describe(conn, llm_relation)
+
+    baseline_rows = conn.execute(f"SELECT COUNT(*) FROM {baseline_relation}").fetchone()[0]
+    llm_rows = conn.execute(f"SELECT COUNT(*) FROM {llm_relation}").fetchone()[0]
+
+    if baseline_rows == 0:
+        return 0.00, 0.00, 0.00, 0.00
+
+    # Normalize numeric columns to the smallest shared precision, as normalize_numeric_columns
+    if baseline_profile is None:
+        baseline_profile = precision_profile(baseline_df)
+    baseline_numeric = set(baseline_df.select_dtypes(include=[np.number]).columns)
+    llm_numeric = [name for name, data_type in llm_columns if _is_rounded_type(data_type)]
+    shared = [name for name in llm_numeric if name in baseline_numeric and name in baseline_profile]
+    llm_profile = _llm_precision_profile(conn, llm_relation, llm_columns, shared)
+
+    precisions = {}
+    for name in shared:
+        if llm_profile.get(name) is not None:
+            precisions[name] = min(baseline_profile[name], llm_profile[name])
+
+    baseline_kinds = [_kind(data_type) for _, data_type in baseline_columns]
+    llm_kinds = [_kind(data_type) for _, data_type in llm_columns]
+
+    # The normalized columns (c0..cn) are computed once, in temporary tables
+    baseline_normalized = f"{baseline_relation}_normalized"
+    llm_normalized = f"{llm_relation}_normalized"
+    try:
+        _create_normalized(conn, baseline_normalized, baseline_relation, baseline_columns, precisions)
+        _create_normalized(conn, llm_normalized, llm_relation, llm_columns, precisions)
+
+        # Align columns based on their signatures (values, not column names)
+        if llm_rows:
+            assignment = match_column_signatures(
+                _signatures(conn, baseline_normalized, baseline_kinds),
+                _signatures(conn, llm_normalized, llm_kinds),
+            )
+            aligned_columns = len(assignment)
+        else:
+            assignment = {}
+            aligned_columns = len(llm_columns)
+
+        # Rows are grouped with their counts on each side and joined, which gives the
+        # distinct and the multiset intersections in a single pass.
+        # Rows with NULL numeric values never match, each one counts as a distinct baseline row.
+        baseline_matchable = _matchable(range(len(baseline_kinds)), baseline_kinds)
+        baseline_groups = _grouped_rows(baseline_normalized, range(len(baseline_kinds)), baseline_matchable)
+        baseline_distinct = (
+            f"(SELECT COUNT(*) FROM baseline_groups) "
+            f"+ (SELECT COUNT(*) FROM {baseline_normalized} WHERE NOT ({baseline_matchable}))"
+        )
+
+        aligned = [assignment.get(i) for i in range(len(baseline_columns))]
+        if (
+            llm_rows
+            and None not in aligned
+            and all(
+                _comparable_type(baseline_columns[i][1]) == _comparable_type(llm_columns[j][1])
+                for i, j in enumerate(aligned)
+            )
+        ):
+            llm_groups = _grouped_rows(llm_normalized, aligned, _matchable(aligned, llm_kinds))
+            join = " AND ".join(f"b.c{i} IS NOT DISTINCT FROM l.c{i}" for i in range(len(aligned)))
+            baseline_distinct, distinct_intersection, multiset_intersection = conn.execute(
+                f"WITH baseline_groups AS ({baseline_groups}), llm_groups AS ({llm_groups}) "
+                f"SELECT {baseline_distinct}, COUNT(*), COALESCE(SUM(LEAST(b.row_count, l.row_count)), 0) "
+                f"FROM baseline_groups AS b JOIN llm_groups AS l ON {join}"
+            ).fetchone()
+        else:
+            distinct_intersection = 0
+            multiset_intersection = 0
+            baseline_distinct = conn.execute(
+                f"WITH baseline_groups AS ({baseline_groups}) SELECT {baseline_distinct}"
+            ).fetchone()[0]
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {baseline_normalized}")
+        conn.execute(f"DROP TABLE IF EXISTS {llm_normalized}")
+
+    # Coverage percentages
+    percent_datasets_equality = round(distinct_intersection / baseline_distinct, 2) if baseline_distinct else 0.0
+    percent_multiset_equality = round(multiset_intersection / baseline_rows, 2)
+
+    # Pure size comparison (not content-aware)
+    percent_rows_equality = round(llm_rows / baseline_rows, 2) if llm_rows <= baseline_rows else 0.0
+    percent_columns_equality = (
+        round(aligned_columns / len(baseline_columns), 2) if aligned_columns <= len(baseline_columns) else 0.0
+    )
+
+    return (
+        percent_rows_equality,
+        percent_columns_equality,
+        percent_datasets_equality,
+        percent_multiset_equality,
+    )
+
+
+def _describe(conn, relation: str) -> List[Tuple[str, str]]:
+    """Names and types of the columns of a relation."""
+    return [(row[0], row[1]) for row in conn.execute(f"DESCRIBE {relation}").fetchall()]
+
+
+def _quote(name: str) -> str:
+    """Quotes a column name."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _is_rounded_type(data_type: str) -> bool:
+    """True for the numeric types rounded by normalize_numeric_columns (booleans are not)."""
+    return data_type.startswith(_NUMERIC_TYPES)
+
+
+def _kind(data_type: str) -> int:
+    """Kind of a column for the signatures: number (including booleans), string or other."""
+    if data_type.startswith(_NUMERIC_TYPES) or data_type == "BOOLEAN":
+        return _KIND_NUMBER
+    if data_type == "VARCHAR":
+        return _KIND_STRING
+    return _KIND_OTHER
+
+
+def _normalized(name: str, data_type: str, precisions: Dict[str, int]) -> str:
+    """
+    SQL expression of a normalized column: numbers as DOUBLE (5 == 5.0, -0.0 == 0.0),
+    rounded to the shared precision of the column if any, and dates as TIMESTAMP.
+    """
+    column = _quote(name)
+    if data_type in _TIMESTAMP_TYPES:
+        return f"CAST({column} AS TIMESTAMP)"
+    if _kind(data_type) != _KIND_NUMBER:
+        return column
+    if name in precisions:
+        return f"({_round_half_even(f'CAST({column} AS DOUBLE)', precisions[name])} + 0.0)"
+    return f"(CAST({column} AS DOUBLE) + 0.0)"
+
+
+def _comparable_type(data_type: str) -> str:
+    """Type of a normalized column, only columns of the same type are compared."""
+    if _kind(data_type) == _KIND_NUMBER:
+        return "DOUBLE"
+    if data_type in _TIMESTAMP_TYPES:
+        return "TIMESTAMP"
+    return data_type
+
+
+def _grouped_rows(relation: str, columns, condition: str) -> str:
+    """SQL query of the distinct rows of normalized columns (renamed c0..cn), with their counts."""
+    selected = ", ".join(f"c{column} AS c{i}" for i, column in enumerate(columns))
+    return f"SELECT {selected}, COUNT(*) AS row_count FROM {relation} WHERE {condition} GROUP BY ALL"
+
+
+def _round_half_even(expression: str, decimals: int) -> str:
+    """
+    SQL expression rounding a DOUBLE as numpy (and pandas) do, rint(x * 10^d) / 10^d.
+    round_even(x, d) differs when x * 10^d is not exact (273.85 -> 273.9), and
+    round_even(y, 0) is not exact for large values, so rint is computed by adding
+    and subtracting 2^52, which rounds half to even with IEEE arithmetic.
+    """
+    scale = f"CAST(1e{decimals} AS DOUBLE)"
+    scaled = f"({expression} * {scale})"
+    shift = "CAST(4503599627370496 AS DOUBLE)"
+    rint = (
+        f"CASE WHEN abs({scaled}) >= {shift} THEN {scaled} "
+        f"WHEN {scaled} >= 0 THEN ({scaled} + {shift}) - {shift} "
+        f"ELSE ({scaled} - {shift}) + {shift} END"
+    )
+    return f"(({rint}) / {scale})"
+
+
+def _matchable(columns, kinds: List[int]) -> str:
+    """
+    SQL condition of the rows without NULL numbers in the given normalized columns,
+    kinds being the kinds of all the columns of the relation, by position.
+    """
+    conditions = [f"c{i} IS NOT NULL" for i in columns if kinds[i] == _KIND_NUMBER]
+    return " AND ".join(conditions) if conditions else "TRUE"
+
+
+def _create_normalized(conn, name: str, relation: str, columns: List[Tuple[str, str]], precisions: Dict[str, int]):
+    """Creates a temporary table with the normalized columns (c0..cn) of a relation."""
+    expressions = ", ".join(
+        f"{_normalized(column, data_type, precisions)} AS c{i}" for i, (column, data_type) in enumerate(columns)
+    )
+    conn.execute(f"CREATE TEMP TABLE {name} AS SELECT {expressions} FROM {relation}")
+
+
+def _llm_precision_profile(conn, relation: str, columns: List[Tuple[str, str]], names: List[str]) -> Dict[str, int]:
+    """
+    Smallest decimal precision of numeric columns, computed with SQL as min_decimal_places:
+    integers have none, other numbers at least one, and the decimal places of a value are
+    the smallest d for which it round-trips through d decimals.
+    """
+    types = dict(columns)
+    expressions = []
+    for name in names:
+        if types[name].startswith(_INTEGER_TYPES):
+            expressions.append(f"CASE WHEN COUNT({_quote(name)}) > 0 THEN 0 END")
+            continue
+        value = f"CAST({_quote(name)} AS DOUBLE)"
+        cases = " ".join(f"WHEN {_round_half_even(value, d)} = {value} THEN {d}" for d in range(17))
+        expressions.append(f"GREATEST(MIN(CASE {cases} ELSE 17 END), 1)")
+
+    if not expressions:
+        return {}
+
+    values = conn.execute(f"SELECT {', '.join(expressions)} FROM {relation}").fetchone()
+    return {name: value for name, value in zip(names, values)}
+
+
+def _signatures(conn, relation: str, kinds: List[int]) -> Dict[str, np.ndarray]:
+    """
+    Column signatures of normalized columns as column_signatures, computed with SQL aggregates.
+    Hashes are DuckDB hashes, comparable only with other signatures computed here.
+    """
+    columns = len(kinds)
+    signatures = {
+        "kind": np.array(kinds, dtype=np.int8),
+        "min": np.full(columns, np.nan),
+        "max": np.full(columns, np.nan),
+        "nulls": np.zeros(columns, dtype=np.int64),
+        "first": np.zeros(columns, dtype=np.uint64),
+        "first_matchable": np.zeros(columns, dtype=bool),
+        "multiset": np.zeros(columns, dtype=np.uint64),
+        "sketch": np.zeros((columns, SIGNATURE_SKETCH_SIZE), dtype=np.uint64),
+        "sketch_mask": np.zeros((columns, SIGNATURE_SKETCH_SIZE), dtype=bool),
+    }
+
+    aggregates = []
+    first_values = []
+    for i, kind in enumerate(kinds):
+        expression = f"c{i}"
+        # NULL numbers never match, other NULL values do
+        matchable = f" FILTER (WHERE {expression} IS NOT NULL)" if kind == _KIND_NUMBER else ""
+        if kind == _KIND_NUMBER:
+            aggregates += [f"MIN({expression})", f"MAX({expression})"]
+        else:
+            aggregates += ["NULL", "NULL"]
+        aggregates += [
+            f"COUNT(*) - COUNT({expression})",
+            f"CAST(SUM(hash({expression})){matchable} % 18446744073709551616 AS UBIGINT)",
+            f"MIN(DISTINCT hash({expression}), {SIGNATURE_SKETCH_SIZE}){matchable}",
+        ]
+        first_values += [f"hash({expression})", f"{expression} IS NOT NULL" if kind == _KIND_NUMBER else "TRUE"]
+
+    values = conn.execute(f"SELECT {', '.join(aggregates)} FROM {relation}").fetchone()
+    first = conn.execute(f"SELECT {', '.join(first_values)} FROM {relation} LIMIT 1").fetchone()
+
+    # five aggregates per column
+    for i, (minimum, maximum, nulls, multiset, sketch) in enumerate(zip(*[iter(values)] * 5)):
+        if minimum is not None:
+            signatures["min"][i] = minimum
+            signatures["max"][i] = maximum
+        signatures["nulls"][i] = nulls
+        signatures["multiset"][i] = multiset or 0
+        sketch = sorted(sketch or [])[:SIGNATURE_SKETCH_SIZE]
+        signatures["sketch"][i, : len(sketch)] = sketch
+        signatures["sketch_mask"][i, : len(sketch)] = True
+        if first is not None:
+            signatures["first"][i] = first[2 * i]
+            signatures["first_matchable"][i] = first[2 * i + 1]
+
+    return signatures
@@ -1,5 +1,7 @@
 import os
 
+from data.baseline_store import MANIFEST_FILE_NAME
+
 
 class FileUtils:
     """
@@ -37,10 +39,20 @@ class FileUtils:
             return 0
         for file in os.listdir(results_to_path):
             file_path = os.path.join(results_to_path, file)
-            if os.path.isfile(file_path) and file.startswith("question_") and file.endswith(".csv"):
+            if (
+                os.path.isfile(file_path)
+                and file.startswith("question_")
+                and file.endswith((".csv", ".arrow", ".parquet"))
+            ):
                 print(f"Removing baseline dataset {file_path}")
                 os.remove(file_path)
 
+        # remove the manifest of the baseline files if it exists
+        manifest_path = os.path.join(results_to_path, MANIFEST_FILE_NAME)
+        if os.path.exists(manifest_path):
+            print(f"Removing baseline manifest {manifest_path}")
+            os.remove(manifest_path)
+
         # remove the summary file if it exists
         summary_file_path = os.path.join(results_to_path, "questions_baseline_summary.csv")
         summary_file_path = summary_file_path.replace("//", "/")
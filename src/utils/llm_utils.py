@@ -1,16 +1,23 @@
+import json
 import os
 import time
 import requests
-import traceback
+from contextlib import asynccontextmanager
 
 # anthropic
 import anthropic
+import openai
+
+# async http client for ollama
+import httpx
 
 # gemini
 
 # from openai import AzureOpenAI -- previous import statement without langfuse
 from langfuse import get_client, observe
-from langfuse.openai import AzureOpenAI
+from langfuse.openai import AsyncAzureOpenAI, AzureOpenAI
+
+from utils.sql_utils import has_complete_sql_block
 
 # pip install langfuse anthropic google-cloud-aiplatform
 
@@ -24,6 +31,9 @@ def get_chat_completion_from_platform(
     temperature,
     tokens,
     langfuse_enabled=True,
+    client=None,
+    stream=False,
+    request_timeout=None,
     **model_config,
 ):
     """
@@ -38,6 +48,12 @@ def get_chat_completion_from_platform(
         temperature (float): The temperature value for generating chat completions.
         tokens (int): The maximum number of tokens for generating chat completions.
         langfuse_enabled (bool): Whether to enable Langfuse integration.
+        client: Optional long-lived client for the platform (AzureOpenAI, anthropic.Anthropic
+            or requests.Session for Ollama). If None, a new client is created for the call.
+        stream (bool): Stream the completion and stop it once a complete fenced SQL block has
+            arrived (see _streamed_output); the metadata then has time_to_first_token and time_to_sql.
+        request_timeout (float): Seconds after which the request fails with a timeout. Defaults to
+            the timeout of the client (300 seconds for Ollama).
         model_config (dict): Additional model configuration parameters (id, endpoint, api_key).
     Returns:
         str: The generated chat completion.
@@ -48,257 +64,786 @@ def get_chat_completion_from_platform(
         RuntimeError: If there is an error retrieving chat completion from the API.
     """
 
-    if model.startswith("claude-") or model.startswith("claude2-") or model.startswith("claude3-"):
-        platform = "anthropic"
+    platform = _resolve_platform(platform, model)
 
     endpoint = None
     api_key = None
-    api_version = "2023-05-15"
-    metadata_json = {}
-
-    # Desanidar si es necesario
-    if "model_config" in model_config and isinstance(model_config["model_config"], dict):
-        model_config = {**model_config, **model_config["model_config"]}
 
-    metadata = {k: v for k, v in model_config.items() if k not in {"id", "endpoint", "api_key"}}
+    model_config = _flatten_model_config(model_config)
+    metadata = _request_metadata(model_config)
 
     if platform == "azure_openai":
 
-        if model_config is None:
-            model_config = {}
+        endpoint, api_key, api_version, model, tokens = _resolve_azure_openai_settings(model, tokens, model_config)
 
-        # Extraer valores con fallback a variables de entorno
-        endpoint = model_config.get("endpoint") or os.getenv("OPENAI_ENDPOINT")
-        api_key = model_config.get("api_key") or os.getenv("OPENAI_KEY")
+        try:
+            if client is None:
+                client = AzureOpenAI(
+                    azure_endpoint=endpoint,
+                    api_key=api_key,
+                    api_version=api_version,
+                )
 
-        if model is None:
-            model = os.getenv("OPENAI_MODEL")
+            start = time.time()
 
-        # from azure openai documentation
-        if model.startswith("gpt-4.1") or model.startswith("gpt-4o") or model == "o3-mini" or model == "o4-mini":
-            api_version = "2024-12-01-preview"
+            if stream:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=_chat_messages(system_message, user_prompt),
+                    **_azure_openai_stream_args(api_version),
+                    **_azure_openai_optional_args(model, tokens, temperature, metadata),
+                    **_timeout_args(request_timeout),
+                )
+                usage = {}
+                deltas = _azure_openai_deltas(response, usage)
+                output, metadata_json = _streamed_output(deltas, start, usage, system_message + user_prompt)
+                output = output.replace("\n\n", "\n").replace("\n\n", "\n")
+            else:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=_chat_messages(system_message, user_prompt),
+                    **_azure_openai_optional_args(model, tokens, temperature, metadata),
+                    **_timeout_args(request_timeout),
+                )
+                output, metadata_json = _azure_openai_output(response, start)
 
-        if model == "DeepSeek-V3-0324" or model.startswith("Phi-") or model.startswith("grok-"):
-            api_version = "2024-05-01-preview"
+            if langfuse_enabled:
+                _update_langfuse(platform, model, metadata_json)
 
-        if model.startswith("Codestral-") or model.startswith("Mistral-") or model.startswith("Ministral-"):
-            api_version = "2024-05-01-preview"
+            return output, metadata_json
 
-        if model.startswith("Llama-"):
-            api_version = "2024-05-01-preview"
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving chat completion from Azure OpenAI API: {str(e)}") from e
 
-        if model.startswith("gpt-oss"):
-            api_version = "2024-05-01-preview"
+    if platform == "anthropic":
 
-        if "-4k-" in model and tokens > 4096:
-            tokens = 4096
-        elif "-8k-" in model and tokens > 8192:
-            tokens = 8192
+        endpoint, api_key, tokens = _resolve_anthropic_settings(model, tokens, model_config)
 
-        if model == "Ministral-3B":
-            tokens = 2048
+        if client is None:
+            client = anthropic.Anthropic(api_key=api_key)
 
         try:
-            client = AzureOpenAI(
-                azure_endpoint=endpoint,
-                api_key=api_key,
-                api_version=api_version,
+
+            start = time.time()
+            response = client.messages.create(
+                model=model,
+                max_tokens=tokens,
+                messages=_anthropic_messages(system_message, user_prompt),
+                stream=stream,
+                **_timeout_args(request_timeout),
             )
 
+            if stream:
+                usage = {}
+                deltas = _anthropic_deltas(response, usage)
+                output, metadata_json = _streamed_output(deltas, start, usage, system_message + user_prompt)
+            else:
+                output, metadata_json = _anthropic_output(response, start)
+
+            if langfuse_enabled:
+                _update_langfuse(platform, model, metadata_json)
+
+            return output, metadata_json
+
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving chat completion from Anthropic API: {str(e)}") from e
+
+    if platform == "ollama":
+
+        endpoint = _resolve_ollama_endpoint(model_config)
+
+        try:
             start = time.time()
 
-            # Use 'max_completion_tokens' for 'o3-mini' and 'o4-mini', otherwise use 'max_tokens'
-            completion_param = (
-                {"max_completion_tokens": tokens} if model in ["o3-mini", "o4-mini"] else {"max_tokens": tokens}
+            http = client if client is not None else requests
+
+            response = http.post(
+                f"{endpoint}/api/chat",
+                json=_ollama_payload(model, system_message, user_prompt, temperature, tokens, stream),
+                timeout=request_timeout or 300,  # 5 minutes timeout
+                stream=stream,
             )
+            response.raise_for_status()
 
-            optional_args = {"metadata": metadata, **completion_param}
-            if model not in ["o3-mini", "o4-mini"]:
-                optional_args["temperature"] = temperature
+            if stream:
+                usage = {}
+                deltas = _ollama_deltas(response, usage)
+                output, metadata_json = _streamed_output(deltas, start, usage, system_message + user_prompt)
+            else:
+                output, metadata_json = _ollama_output(response.json(), start)
 
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_prompt},
-                ],
-                **optional_args,
-            )
+            if langfuse_enabled:
+                _update_langfuse(platform, model, metadata_json)
 
-            output = response.choices[0].message.content
-            output = output.replace("\n\n", "\n").replace("\n\n", "\n")
+            return output, metadata_json
 
-            total_tokens = response.usage.total_tokens
-            prompt_tokens = response.usage.prompt_tokens
-            completion_tokens = response.usage.completion_tokens
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving chat completion from Ollama API: {str(e)}") from e
 
-            duration = time.time() - start
-            duration = round(duration, 2)
+    if endpoint is None or api_key is None or model is None:
+        raise ValueError("Please set the relevant platform environment variables.")
 
-            # put the metadata in a json object
-            metadata_json = {
-                "total_tokens": total_tokens,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "duration": duration,
-            }
 
-            if langfuse_enabled:
+@observe(capture_input=False, capture_output=True)
+async def aget_chat_completion_from_platform(
+    platform,
+    model,
+    system_message,
+    user_prompt,
+    temperature,
+    tokens,
+    langfuse_enabled=True,
+    client=None,
+    stream=False,
+    request_timeout=None,
+    **model_config,
+):
+    """
+    Async version of get_chat_completion_from_platform.
+    Uses AsyncAzureOpenAI, anthropic.AsyncAnthropic and an httpx.AsyncClient
+    for Ollama, so many requests can be in flight on a single event loop.
 
-                langfuse = get_client()
-                langfuse.update_current_trace(tags=["azure_openai_call", "qa"])
-                langfuse.update_current_span(
-                    metadata={
-                        "platform": platform,
-                        "model": model,
-                        "duration": duration,
-                        "total_tokens": total_tokens,
-                        "prompt_tokens": prompt_tokens,
-                        "completion_tokens": completion_tokens,
-                    }
-                )
+    Args:
+        platform (str): The platform to use for generating chat completions.
+            Either "azure_openai", "anthropic", or "ollama".
+        model (str): The model to use for generating chat completions.
+        system_message (str): The system message.
+        user_prompt (str): The user prompt.
+        temperature (float): The temperature value for generating chat completions.
+        tokens (int): The maximum number of tokens for generating chat completions.
+        langfuse_enabled (bool): Whether to enable Langfuse integration.
+        client: Optional long-lived async client for the platform (AsyncAzureOpenAI,
+            anthropic.AsyncAnthropic or httpx.AsyncClient for Ollama). If None, a new
+            client is created and closed for the call.
+        stream (bool): Stream the completion and stop it once a complete fenced SQL block has arrived.
+        request_timeout (float): Seconds after which the request fails with a timeout.
+        model_config (dict): Additional model configuration parameters (id, endpoint, api_key).
+    Returns:
+        str: The generated chat completion.
+        metadata_json (dict): The same tokens usage and duration metadata as the sync version.
+    Raises:
+        ValueError: If the platform is not supported or if required environment variables are not set.
+        RuntimeError: If there is an error retrieving chat completion from the API.
+    """
 
-            return output, metadata_json
+    platform = _resolve_platform(platform, model)
+
+    model_config = _flatten_model_config(model_config)
+    metadata = _request_metadata(model_config)
+
+    if platform == "azure_openai":
+
+        endpoint, api_key, api_version, model, tokens = _resolve_azure_openai_settings(model, tokens, model_config)
+
+        try:
+            async with _client_scope(
+                client, AsyncAzureOpenAI, azure_endpoint=endpoint, api_key=api_key, api_version=api_version
+            ) as client:
+                start = time.time()
+
+                if stream:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=_chat_messages(system_message, user_prompt),
+                        **_azure_openai_stream_args(api_version),
+                        **_azure_openai_optional_args(model, tokens, temperature, metadata),
+                        **_timeout_args(request_timeout),
+                    )
+                    usage = {}
+                    deltas = _aazure_openai_deltas(response, usage)
+                    output, metadata_json = await _astreamed_output(deltas, start, usage, system_message + user_prompt)
+                    output = output.replace("\n\n", "\n").replace("\n\n", "\n")
+                else:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=_chat_messages(system_message, user_prompt),
+                        **_azure_openai_optional_args(model, tokens, temperature, metadata),
+                        **_timeout_args(request_timeout),
+                    )
+                    output, metadata_json = _azure_openai_output(response, start)
 
         except Exception as e:
             raise RuntimeError(f"Error retrieving chat completion from Azure OpenAI API: {str(e)}") from e
 
-    if platform == "anthropic":
+    elif platform == "anthropic":
 
-        # Extraer valores con fallback a variables de entorno
-        endpoint = model_config.get("endpoint")
-        api_key = model_config.get("api_key")
+        endpoint, api_key, tokens = _resolve_anthropic_settings(model, tokens, model_config)
 
-        client = anthropic.Anthropic(api_key=api_key)
+        try:
+            async with _client_scope(client, anthropic.AsyncAnthropic, api_key=api_key) as client:
+                start = time.time()
+
+                response = await client.messages.create(
+                    model=model,
+                    max_tokens=tokens,
+                    messages=_anthropic_messages(system_message, user_prompt),
+                    stream=stream,
+                    **_timeout_args(request_timeout),
+                )
 
-        if "claude-3-5" in model and tokens > 8192:
-            tokens = 8192
+                if stream:
+                    usage = {}
+                    deltas = _aanthropic_deltas(response, usage)
+                    output, metadata_json = await _astreamed_output(deltas, start, usage, system_message + user_prompt)
+                else:
+                    output, metadata_json = _anthropic_output(response, start)
+
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving chat completion from Anthropic API: {str(e)}") from e
+
+    elif platform == "ollama":
+
+        endpoint = _resolve_ollama_endpoint(model_config)
 
         try:
+            async with _client_scope(client, httpx.AsyncClient, timeout=300) as client:  # 5 minutes timeout
+                start = time.time()
+
+                request = client.build_request(
+                    "POST",
+                    f"{endpoint}/api/chat",
+                    json=_ollama_payload(model, system_message, user_prompt, temperature, tokens, stream),
+                    **_timeout_args(request_timeout),
+                )
+                response = await client.send(request, stream=stream)
+                if stream:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    usage = {}
+                    deltas = _aollama_deltas(response, usage)
+                    output, metadata_json = await _astreamed_output(deltas, start, usage, system_message + user_prompt)
+                else:
+                    response.raise_for_status()
+                    output, metadata_json = _ollama_output(response.json(), start)
 
-            prompt = f"{system_message.strip()}\n\n{user_prompt.strip()}\n\n"
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving chat completion from Ollama API: {str(e)}") from e
 
-            start = time.time()
-            response = client.messages.create(
-                model=model,
-                max_tokens=tokens,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            output = response.content[0].text
+    else:
+        raise ValueError(f"Unsupported platform: {platform}")
 
-            prompt_tokens = 0
-            completion_tokens = 0
-            total_tokens = 0
+    if langfuse_enabled:
+        _update_langfuse(platform, model, metadata_json)
 
-            usage = getattr(response, "usage", None)
-            if usage:
-                prompt_tokens = usage.input_tokens
-                completion_tokens = usage.output_tokens
-                total_tokens = prompt_tokens + completion_tokens
-            else:
-                prompt_tokens = completion_tokens = total_tokens = None
+    return output, metadata_json
 
-            duration = round(time.time() - start, 2)
 
-            metadata_json = {
-                "total_tokens": total_tokens,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "duration": duration,
-            }
+def latency_metrics(metadata_json, wall_time):
+    """
+    Split the latency of an LLM call into time to first token, generation throughput and overhead.
 
-            if langfuse_enabled:
-                langfuse = get_client()
-                langfuse.update_current_trace(tags=["anthropic_call", "qa"])
-                langfuse.update_current_span(
-                    metadata={
-                        "platform": platform,
-                        "model": model,
-                        "duration": duration,
-                        "total_tokens": total_tokens,
-                        "prompt_tokens": prompt_tokens,
-                        "completion_tokens": completion_tokens,
-                    }
-                )
+    Args:
+        metadata_json (dict): Metadata of the call (duration, completion_tokens, and for streamed
+            completions time_to_first_token and time_to_last_token).
+        wall_time (float): Seconds the caller waited for the call, queueing and client setup included.
+    Returns:
+        tuple: (time_to_first_token, tokens_per_sec, overhead). time_to_first_token is None when the
+            completion was not streamed; tokens_per_sec is measured between the first and the last token
+            of a streamed completion, over the whole call otherwise, and is None for a cache hit or a
+            call without tokens; overhead is the waiting time outside the provider call.
+    """
+    duration = metadata_json.get("duration") or 0
+    time_to_first_token = metadata_json.get("time_to_first_token")
 
-            return output, metadata_json
+    generation_time = duration
+    if time_to_first_token is not None and metadata_json.get("time_to_last_token") is not None:
+        generation_time = metadata_json["time_to_last_token"] - time_to_first_token
 
-        except Exception as e:
-            tb = traceback.format_exc()
-            return f"Error retrieving chat completion from Anthropic API: {str(e)}\n{tb}"
+    tokens_per_sec = None
+    completion_tokens = metadata_json.get("completion_tokens") or 0
+    if completion_tokens and generation_time > 0 and not metadata_json.get("cache_hit"):
+        tokens_per_sec = round(completion_tokens / generation_time, 2)
+
+    overhead = round(max(wall_time - duration, 0), 2)
+
+    return time_to_first_token, tokens_per_sec, overhead
+
+
+# HTTP status codes of the errors worth sending the request again for
+_TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# connection errors and timeouts of the clients
+_TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+    httpx.TransportError,
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def transient_error(error):
+    """
+    Tell whether a failed call may succeed if sent again: timeouts, connection errors,
+    rate limits (429), overloaded providers (529) and server errors (5xx), looking through
+    the exceptions chained to the error.
+
+    Args:
+        error (Exception): Error raised by get_chat_completion_from_platform.
+    Returns:
+        bool: True if the error is transient.
+    """
+    while error is not None:
+        if isinstance(error, _TRANSIENT_ERRORS):
+            return True
+        response = getattr(error, "response", None)
+        status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        if status_code in _TRANSIENT_STATUS_CODES:
+            return True
+        error = error.__cause__ or error.__context__
+
+    return False
+
+
+def rate_limit_error(error):
+    """
+    Tell whether a failed call was refused by the provider for its rate limits (HTTP 429),
+    looking through the exceptions chained to the error.
+
+    Args:
+        error (Exception): Error raised by get_chat_completion_from_platform.
+    Returns:
+        tuple: (rate_limited, retry_after), retry_after being the seconds asked by the
+            Retry-After (or retry-after-ms) header of the response, or None without it.
+    """
+    while error is not None:
+        response = getattr(error, "response", None)
+        status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        if status_code == 429:
+            headers = getattr(response, "headers", None) or {}
+            try:
+                if headers.get("retry-after-ms"):
+                    return True, float(headers["retry-after-ms"]) / 1000
+                if headers.get("retry-after"):
+                    return True, float(headers["retry-after"])
+            except ValueError:
+                pass  # an HTTP date instead of seconds
+            return True, None
+        error = error.__cause__ or error.__context__
+
+    return False, None
+
+
+def resolve_client_settings(platform, model, model_config):
+    """
+    Resolve the settings that identify the client used to call a model.
+
+    Args:
+        platform (str): The platform configured for the model.
+        model (str): The model name.
+        model_config (dict): Model configuration parameters (id, endpoint, api_key).
+    Returns:
+        tuple: (platform, endpoint, api_key, api_version). api_version is None
+            for the platforms that do not use it.
+    """
+    platform = _resolve_platform(platform, model)
+    model_config = _flatten_model_config(model_config)
+
+    if platform == "azure_openai":
+        endpoint, api_key, api_version, _, _ = _resolve_azure_openai_settings(model, 0, model_config)
+        return platform, endpoint, api_key, api_version
+
+    if platform == "anthropic":
+        endpoint, api_key, _ = _resolve_anthropic_settings(model, 0, model_config)
+        return platform, endpoint, api_key, None
 
     if platform == "ollama":
-        # Extract endpoint from model_config or environment variables
-        # Ollama typically doesn't need API key for local instances
-        endpoint = (
-            model_config.get("endpoint") or
-            os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
-        )
-
-        try:            
-            start = time.time()
-            
-            # Ollama API format
-            payload = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": tokens
-                },
-                "stream": False
-            }
-            
-            response = requests.post(
-                f"{endpoint}/api/chat",
-                json=payload,
-                timeout=300  # 5 minutes timeout
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            output = result["message"]["content"]
-            duration = round(time.time() - start, 2)
-
-            # Ollama doesn't always provide detailed token counts
-            eval_count = result.get("eval_count", 0)
-            prompt_eval_count = result.get("prompt_eval_count", 0)
-            metadata_json = {
-                "total_tokens": eval_count + prompt_eval_count,
-                "prompt_tokens": prompt_eval_count,
-                "completion_tokens": eval_count,
-                "duration": duration,
-            }
+        return platform, _resolve_ollama_endpoint(model_config), model_config.get("api_key"), None
 
-            if langfuse_enabled:
-                langfuse = get_client()
-                langfuse.update_current_trace(tags=["ollama_call", "qa"])
-                langfuse.update_current_span(
-                    metadata={
-                        "platform": platform,
-                        "model": model,
-                        "duration": duration,
-                        "total_tokens": metadata_json["total_tokens"],
-                        "prompt_tokens": metadata_json["prompt_tokens"],
-                        "completion_tokens": metadata_json[
-                            "completion_tokens"
-                        ],
-                    }
-                )
+    return platform, model_config.get("endpoint"), model_config.get("api_key"), None
 
-            return output, metadata_json
 
-        except Exception as e:
-            tb = traceback.format_exc()
-            return (
-                f"Error retrieving chat completion from Ollama API: "
-                f"{str(e)}\n{tb}"
-            )
+@asynccontextmanager
+async def _client_scope(client, client_class, **client_args):
+    """
+    Yield the given long-lived client untouched, or a new client that
+    is closed when the call is done.
+    """
+    if client is not None:
+        yield client
+        return
 
-    if endpoint is None or api_key is None or model is None:
-        raise ValueError(
-            "Please set the relevant platform environment variables."
-        )
+    async with client_class(**client_args) as new_client:
+        yield new_client
+
+
+def _resolve_platform(platform, model):
+    """Claude models are always served by the Anthropic API."""
+    if model.startswith("claude-") or model.startswith("claude2-") or model.startswith("claude3-"):
+        return "anthropic"
+    return platform
+
+
+def _flatten_model_config(model_config):
+    """Desanidar model_config si es necesario."""
+    if model_config is None:
+        return {}
+    if "model_config" in model_config and isinstance(model_config["model_config"], dict):
+        model_config = {**model_config, **model_config["model_config"]}
+    return model_config
+
+
+def _request_metadata(model_config):
+    """Metadata sent along with the request, without credentials (nor those of the hedge provider)."""
+    return {k: v for k, v in model_config.items() if k not in {"id", "endpoint", "api_key", "hedge"}}
+
+
+def _resolve_azure_openai_settings(model, tokens, model_config):
+    """
+    Get endpoint, api_key, api_version, model and max tokens for Azure OpenAI.
+    Values not in model_config fall back to environment variables.
+    """
+    # Extraer valores con fallback a variables de entorno
+    endpoint = model_config.get("endpoint") or os.getenv("OPENAI_ENDPOINT")
+    api_key = model_config.get("api_key") or os.getenv("OPENAI_KEY")
+    api_version = "2023-05-15"
+
+    if model is None:
+        model = os.getenv("OPENAI_MODEL")
+
+    # from azure openai documentation
+    if model.startswith("gpt-4.1") or model.startswith("gpt-4o") or model == "o3-mini" or model == "o4-mini":
+        api_version = "2024-12-01-preview"
+
+    if model == "DeepSeek-V3-0324" or model.startswith("Phi-") or model.startswith("grok-"):
+        api_version = "2024-05-01-preview"
+
+    if model.startswith("Codestral-") or model.startswith("Mistral-") or model.startswith("Ministral-"):
+        api_version = "2024-05-01-preview"
+
+    if model.startswith("Llama-"):
+        api_version = "2024-05-01-preview"
+
+    if model.startswith("gpt-oss"):
+        api_version = "2024-05-01-preview"
+
+    if "-4k-" in model and tokens > 4096:
+        tokens = 4096
+    elif "-8k-" in model and tokens > 8192:
+        tokens = 8192
+
+    if model == "Ministral-3B":
+        tokens = 2048
+
+    return endpoint, api_key, api_version, model, tokens
+
+
+def _azure_openai_optional_args(model, tokens, temperature, metadata):
+    """Build the optional arguments of the Azure OpenAI chat completion request."""
+    # Use 'max_completion_tokens' for 'o3-mini' and 'o4-mini', otherwise use 'max_tokens'
+    completion_param = {"max_completion_tokens": tokens} if model in ["o3-mini", "o4-mini"] else {"max_tokens": tokens}
+
+    optional_args = {"metadata": metadata, **completion_param}
+    if model not in ["o3-mini", "o4-mini"]:
+        optional_args["temperature"] = temperature
+
+    return optional_args
+
+
+def _azure_openai_output(response, start):
+    """Extract the output text and the tokens usage metadata of an Azure OpenAI response."""
+    output = response.choices[0].message.content
+    output = output.replace("\n\n", "\n").replace("\n\n", "\n")
+
+    duration = time.time() - start
+    duration = round(duration, 2)
+
+    # put the metadata in a json object
+    metadata_json = {
+        "total_tokens": response.usage.total_tokens,
+        "prompt_tokens": response.usage.prompt_tokens,
+        "completion_tokens": response.usage.completion_tokens,
+        "duration": duration,
+    }
+
+    return output, metadata_json
+
+
+def _resolve_anthropic_settings(model, tokens, model_config):
+    """Get endpoint, api_key and max tokens for the Anthropic API."""
+    endpoint = model_config.get("endpoint")
+    api_key = model_config.get("api_key")
+
+    if "claude-3-5" in model and tokens > 8192:
+        tokens = 8192
+
+    return endpoint, api_key, tokens
+
+
+def _anthropic_messages(system_message, user_prompt):
+    """Anthropic receives the system message and the user prompt as a single user message."""
+    prompt = f"{system_message.strip()}\n\n{user_prompt.strip()}\n\n"
+    return [{"role": "user", "content": prompt}]
+
+
+def _anthropic_output(response, start):
+    """Extract the output text and the tokens usage metadata of an Anthropic response."""
+    output = response.content[0].text
+
+    usage = getattr(response, "usage", None)
+    if usage:
+        prompt_tokens = usage.input_tokens
+        completion_tokens = usage.output_tokens
+        total_tokens = prompt_tokens + completion_tokens
+    else:
+        prompt_tokens = completion_tokens = total_tokens = None
+
+    duration = round(time.time() - start, 2)
+
+    metadata_json = {
+        "total_tokens": total_tokens,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "duration": duration,
+    }
+
+    return output, metadata_json
+
+
+def _resolve_ollama_endpoint(model_config):
+    """
+    Extract endpoint from model_config or environment variables.
+    Ollama typically doesn't need API key for local instances.
+    """
+    return model_config.get("endpoint") or os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
+
+
+def _ollama_payload(model, system_message, user_prompt, temperature, tokens, stream=False):
+    """Ollama API format."""
+    return {
+        "model": model,
+        "messages": _chat_messages(system_message, user_prompt),
+        "options": {"temperature": temperature, "num_predict": tokens},
+        "stream": stream,
+    }
+
+
+def _ollama_output(result, start):
+    """Extract the output text and the tokens usage metadata of an Ollama response."""
+    output = result["message"]["content"]
+    duration = round(time.time() - start, 2)
+
+    # Ollama doesn't always provide detailed token counts
+    eval_count = result.get("eval_count", 0)
+    prompt_eval_count = result.get("prompt_eval_count", 0)
+    metadata_json = {
+        "total_tokens": eval_count + prompt_eval_count,
+        "prompt_tokens": prompt_eval_count,
+        "completion_tokens": eval_count,
+        "duration": duration,
+    }
+
+    return output, metadata_json
+
+
+def _ollama_chunk(line, usage):
+    """Text of a line of a streamed Ollama response; the last line has the tokens usage."""
+    chunk = json.loads(line)
+    if chunk.get("done"):
+        usage["prompt_tokens"] = chunk.get("prompt_eval_count", 0)
+        usage["completion_tokens"] = chunk.get("eval_count", 0)
+    return chunk.get("message", {}).get("content", "")
+
+
+def _ollama_deltas(response, usage):
+    """Text deltas of a streamed Ollama response (requests)."""
+    try:
+        for line in response.iter_lines():
+            if line:
+                yield _ollama_chunk(line, usage)
+    finally:
+        response.close()
+
+
+async def _aollama_deltas(response, usage):
+    """Text deltas of a streamed Ollama response (httpx)."""
+    try:
+        async for line in response.aiter_lines():
+            if line:
+                yield _ollama_chunk(line, usage)
+    finally:
+        await response.aclose()
+
+
+def _azure_openai_stream_args(api_version):
+    """Streaming arguments of an Azure OpenAI request; the usage chunk needs api-version 2024-09-01 or later."""
+    if api_version >= "2024-09-01":
+        return {"stream": True, "stream_options": {"include_usage": True}}
+    return {"stream": True}
+
+
+def _azure_openai_chunk(chunk, usage):
+    """Text of a streamed Azure OpenAI chunk; the last chunk has the tokens usage (include_usage)."""
+    if getattr(chunk, "usage", None):
+        usage["prompt_tokens"] = chunk.usage.prompt_tokens
+        usage["completion_tokens"] = chunk.usage.completion_tokens
+    if chunk.choices and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return ""
+
+
+def _azure_openai_deltas(response, usage):
+    """Text deltas of a streamed Azure OpenAI response."""
+    try:
+        for chunk in response:
+            yield _azure_openai_chunk(chunk, usage)
+    finally:
+        # the Langfuse wrapper of the sync stream has no close of its own, the OpenAI stream it wraps has
+        getattr(response, "response", response).close()
+
+
+async def _aazure_openai_deltas(response, usage):
+    """Text deltas of a streamed Azure OpenAI response (async)."""
+    try:
+        async for chunk in response:
+            yield _azure_openai_chunk(chunk, usage)
+    finally:
+        await response.close()
+
+
+def _anthropic_event(event, usage):
+    """Text of a streamed Anthropic event; the first and last events have the tokens usage."""
+    if event.type == "message_start":
+        usage["prompt_tokens"] = event.message.usage.input_tokens
+    elif event.type == "message_delta":
+        usage["completion_tokens"] = event.usage.output_tokens
+    elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+        return event.delta.text
+    return ""
+
+
+def _anthropic_deltas(response, usage):
+    """Text deltas of a streamed Anthropic response."""
+    try:
+        for event in response:
+            yield _anthropic_event(event, usage)
+    finally:
+        response.close()
+
+
+async def _aanthropic_deltas(response, usage):
+    """Text deltas of a streamed Anthropic response (async)."""
+    try:
+        async for event in response:
+            yield _anthropic_event(event, usage)
+    finally:
+        await response.close()
+
+
+def _streamed_output(deltas, start, usage, prompt):
+    """
+    Read the text deltas of a streamed completion until a complete fenced SQL block has
+    arrived: remove_quotations only keeps that block, so the explanation the model writes
+    after it is not generated (the stream is closed) nor paid for.
+
+    :return: output text received and its metadata (see _stream_metadata).
+    """
+    text, chunks, first_token, last_token, sql_ready = "", 0, None, None, None
+    try:
+        for delta in deltas:
+            if not delta:
+                continue
+            last_token = time.time()
+            if first_token is None:
+                first_token = last_token
+            text += delta
+            chunks += 1
+            if "`" in delta and has_complete_sql_block(text):
+                sql_ready = time.time()
+                break
+    finally:
+        deltas.close()
+
+    return text, _stream_metadata(text, chunks, start, first_token, last_token, sql_ready, usage, prompt)
+
+
+async def _astreamed_output(deltas, start, usage, prompt):
+    """Async version of _streamed_output."""
+    text, chunks, first_token, last_token, sql_ready = "", 0, None, None, None
+    try:
+        async for delta in deltas:
+            if not delta:
+                continue
+            last_token = time.time()
+            if first_token is None:
+                first_token = last_token
+            text += delta
+            chunks += 1
+            if "`" in delta and has_complete_sql_block(text):
+                sql_ready = time.time()
+                break
+    finally:
+        await deltas.aclose()
+
+    return text, _stream_metadata(text, chunks, start, first_token, last_token, sql_ready, usage, prompt)
+
+
+def _stream_metadata(text, chunks, start, first_token, last_token, sql_ready, usage, prompt):
+    """
+    Tokens usage and timings of a streamed completion, in seconds from the request. A stream closed before its end has
+    no usage from the provider: the prompt tokens are then estimated at 4 characters per
+    token, and the completion tokens at one token per chunk or 4 characters per token,
+    whichever is larger.
+    """
+    prompt_tokens = usage.get("prompt_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = max(chunks, estimate_tokens(text))
+
+    return {
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "duration": round(time.time() - start, 2),
+        "time_to_first_token": None if first_token is None else round(first_token - start, 2),
+        "time_to_last_token": None if last_token is None else round(last_token - start, 2),
+        "time_to_sql": None if sql_ready is None else round(sql_ready - start, 2),
+        "stream_stopped": sql_ready is not None,
+        "usage_estimated": "prompt_tokens" not in usage or "completion_tokens" not in usage,
+    }
+
+
+def estimate_tokens(text):
+    """
+    Rough number of tokens of a text, 4 characters per token.
+
+    Args:
+        text (str): Prompt or completion text.
+    Returns:
+        int: Estimated tokens.
+    """
+    return (len(text) + 3) // 4
+
+
+def _timeout_args(request_timeout):
+    """Timeout argument of a request, left to the client default when request_timeout is not set."""
+    return {"timeout": request_timeout} if request_timeout else {}
+
+
+def _chat_messages(system_message, user_prompt):
+    """Chat messages for the OpenAI compatible APIs."""
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _update_langfuse(platform, model, metadata_json):
+    """Tag the current trace with the platform and log the call metadata in the current span."""
+    langfuse = get_client()
+    langfuse.update_current_trace(tags=[f"{platform}_call", "qa"])
+    langfuse.update_current_span(
+        metadata={
+            "platform": platform,
+            "model": model,
+            "duration": metadata_json["duration"],
+            "total_tokens": metadata_json["total_tokens"],
+            "prompt_tokens": metadata_json["prompt_tokens"],
+            "completion_tokens": metadata_json["completion_tokens"],
+        }
+    )
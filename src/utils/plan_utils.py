@@ -0,0 +1,191 @@
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from typing import Dict, Optional
+
+# a plan is rejected when its estimated rows exceed the baseline rows this many times, 0 to disable
+SQL_ADMISSION_MAX_ROWS_FACTOR = float(os.getenv("SQL_ADMISSION_MAX_ROWS_FACTOR", 100))
+
+# plans estimated below this number of rows are cheap enough to always run
+SQL_ADMISSION_MIN_ROWS = int(os.getenv("SQL_ADMISSION_MIN_ROWS", 100_000))
+
+# a plan is rejected when its estimated cost exceeds this cost, 0 to disable
+# (SQL Server estimated subtree cost, sum of the estimated rows of every operator for DuckDB)
+SQL_ADMISSION_MAX_COST = float(os.getenv("SQL_ADMISSION_MAX_COST", 0))
+
+# DuckDB operators joining every row of one side with every row of the other
+_DUCKDB_CROSS_PRODUCTS = {"CROSS_PRODUCT"}
+
+# DuckDB operators whose number of rows is not part of the plan
+_DUCKDB_LIMITS = {"LIMIT", "STREAMING_LIMIT", "LIMIT_PERCENT"}
+
+# DuckDB operators passing the rows of their (first) child through as they come, so a limit
+# above them stops their child early
+_DUCKDB_STREAMING = {"PROJECTION", "CROSS_PRODUCT"}
+
+_SHOWPLAN_NAMESPACE = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+
+def duckdb_plan_summary(plan_json: str) -> Dict:
+    """
+    Summarize a DuckDB plan (EXPLAIN (FORMAT json)).
+
+    DuckDB leaves the cardinality of some operators out, or at 0 (e.g. above an ORDER BY):
+    they take the product of their children for a cross product, the Top of a TOP_N (also
+    when it is joined back to its table by rowid), else the largest child. The rows of a
+    LIMIT are not in the plan, so they are unknown (None), as the rows of the operators
+    above it. A cross product is reported as cartesian only when both of its sides have
+    more than one row, so the scalar subqueries joined with a cross product are not, and
+    when no limit stops it early (e.g. SELECT * FROM a, b LIMIT 10, whose rows are unknown
+    as the rows of the limit).
+
+    :param plan_json: JSON plan, as returned by EXPLAIN (FORMAT json).
+    :return: Plan summary: estimated_rows (of the result, None if unknown), estimated_cost (sum
+        of the estimated rows of every operator), max_estimated_rows (largest operator),
+        cartesian_rows (largest cartesian product, 0 if none), and operators (count of each operator).
+    """
+    operators = Counter()
+    summary = {"estimated_cost": 0.0, "max_estimated_rows": 0, "cartesian_rows": 0}
+
+    def visit(node, limited=False):
+        name = node.get("name", "")
+        # the first child of a streaming operator (the probe side of a cross product) is stopped by a limit above it
+        child_limited = name in _DUCKDB_LIMITS or (limited and name in _DUCKDB_STREAMING)
+        children = [visit(child, child_limited and i == 0) for i, child in enumerate(node.get("children", []))]
+        known = [rows for rows in children if rows is not None]
+        extra_info = node.get("extra_info") or {}
+        operators[name] += 1
+
+        estimate = int(extra_info.get("Estimated Cardinality") or 0)
+        if estimate:
+            rows = estimate
+        elif name in _DUCKDB_LIMITS:
+            rows = None
+        elif name in _DUCKDB_CROSS_PRODUCTS and known and len(known) == len(children):
+            rows = 1
+            for child_rows in known:
+                rows *= child_rows
+        elif len(known) < len(children):
+            rows = None
+        elif _is_late_materialization(name, extra_info):
+            # the rows of a TOP_N joined back to their table by rowid
+            rows = min(known, default=0)
+        else:
+            rows = max(known, default=0)
+
+        if name == "TOP_N" and rows is not None and str(extra_info.get("Top", "")).isdigit():
+            rows = min(rows, int(extra_info["Top"]))
+        if limited and name in _DUCKDB_CROSS_PRODUCTS:
+            # stopped after the rows of the limit
+            rows = None
+
+        if name in _DUCKDB_CROSS_PRODUCTS and len(known) > 1 and min(known) > 1:
+            summary["cartesian_rows"] = max(summary["cartesian_rows"], rows or 0)
+        if rows is not None:
+            summary["estimated_cost"] += rows
+            summary["max_estimated_rows"] = max(summary["max_estimated_rows"], rows)
+        return rows
+
+    roots = [visit(root) for root in json.loads(plan_json)]
+    summary["estimated_rows"] = None if None in roots else sum(roots)
+    summary["operators"] = dict(operators)
+    return summary
+
+
+def _is_late_materialization(name: str, extra_info: Dict) -> bool:
+    """
+    Whether a DuckDB operator is the semi join on rowid that fetches the columns of the rows
+    kept by a TOP_N (e.g. SELECT * ... ORDER BY ... LIMIT 10), whose rows are at most the Top.
+    """
+    conditions = extra_info.get("Conditions", "")
+    if isinstance(conditions, list):
+        conditions = " ".join(conditions)
+    return name == "HASH_JOIN" and extra_info.get("Join Type") == "SEMI" and "rowid = rowid" in conditions
+
+
+def sql_server_plan_summary(plan_xml: str) -> Dict:
+    """
+    Summarize a SQL Server estimated plan (SET SHOWPLAN_XML ON).
+    The cartesian products are the operators SQL Server warns of a join without join predicate.
+
+    :param plan_xml: XML showplan of the query.
+    :return: Plan summary with the keys of duckdb_plan_summary.
+    """
+    root = ElementTree.fromstring(plan_xml)
+    statements = list(root.iter(f"{_SHOWPLAN_NAMESPACE}StmtSimple"))
+    relational_operators = list(root.iter(f"{_SHOWPLAN_NAMESPACE}RelOp"))
+    cartesian_products = [
+        op
+        for op in relational_operators
+        if any(
+            warnings.get("NoJoinPredicate") in ("1", "true")
+            for warnings in op.findall(f"{_SHOWPLAN_NAMESPACE}Warnings")
+        )
+    ]
+
+    return {
+        "estimated_rows": sum(float(s.get("StatementEstRows", 0)) for s in statements),
+        "estimated_cost": sum(float(s.get("StatementSubTreeCost", 0)) for s in statements),
+        "max_estimated_rows": max((float(op.get("EstimateRows", 0)) for op in relational_operators), default=0),
+        "cartesian_rows": max((float(op.get("EstimateRows", 0)) for op in cartesian_products), default=0),
+        "operators": dict(Counter(op.get("PhysicalOp", "") for op in relational_operators)),
+    }
+
+
+def plan_rejection(
+    summary: Dict,
+    baseline_rows: int = None,
+    max_rows_factor: float = None,
+    min_rows: int = None,
+    max_cost: float = None,
+) -> Optional[str]:
+    """
+    Decide whether a plan is worth running: plans with a large cartesian product, with far
+    more estimated rows than the baseline, or above the maximum cost cannot match the
+    baseline in a reasonable time.
+
+    :param summary: Plan summary (see duckdb_plan_summary).
+    :param baseline_rows: Rows of the baseline, the estimated rows are not checked if None.
+    :param max_rows_factor: Estimated rows allowed per baseline row, defaults to SQL_ADMISSION_MAX_ROWS_FACTOR.
+    :param min_rows: Estimated rows always allowed, for the result and the cartesian products,
+        defaults to SQL_ADMISSION_MIN_ROWS.
+    :param max_cost: Estimated cost allowed, defaults to SQL_ADMISSION_MAX_COST.
+    :return: Reason to reject the plan, or None if it is admitted.
+    """
+    if max_rows_factor is None:
+        max_rows_factor = SQL_ADMISSION_MAX_ROWS_FACTOR
+    if min_rows is None:
+        min_rows = SQL_ADMISSION_MIN_ROWS
+    if max_cost is None:
+        max_cost = SQL_ADMISSION_MAX_COST
+
+    estimated_rows = summary["estimated_rows"]
+    if summary["cartesian_rows"] > min_rows:
+        return f"cartesian product of {summary['cartesian_rows']:,.0f} estimated rows"
+    if baseline_rows is not None and estimated_rows is not None and max_rows_factor:
+        if estimated_rows > max(max_rows_factor * max(baseline_rows, 1), min_rows):
+            return f"{estimated_rows:,.0f} estimated rows for a baseline of {baseline_rows:,} row(s)"
+    if max_cost and summary["estimated_cost"] > max_cost:
+        return f"estimated cost {summary['estimated_cost']:,.2f} above {max_cost:,.2f}"
+    return None
+
+
+def format_plan_summary(summary: Dict) -> str:
+    """
+    Format a plan summary on one line, for the logs.
+
+    :param summary: Plan summary (see duckdb_plan_summary).
+    :return: Estimated rows and cost, largest operator and operators of the plan.
+    """
+    operators = ", ".join(
+        f"{name} x{count}" if count > 1 else name for name, count in sorted(summary["operators"].items())
+    )
+    estimated_rows = "unknown" if summary["estimated_rows"] is None else f"{summary['estimated_rows']:,.0f}"
+    cartesian = ""
+    if summary["cartesian_rows"]:
+        cartesian = f", cartesian product of {summary['cartesian_rows']:,.0f} rows"
+    return (
+        f"estimated rows {estimated_rows}, estimated cost {summary['estimated_cost']:,.2f}, "
+        f"largest operator {summary['max_estimated_rows']:,.0f} rows{cartesian}; operators: {operators}"
+    )
@@ -73,6 +73,17 @@ def performance_report(results_path: str, file_name_prefix: str, data_source: st
             "Datasets_equality": "datasets_equality",
             "Cost_input_tokens_EUR": "cost_input_tokens_EUR",
             "Cost_output_tokens_EUR": "cost_output_tokens_EUR",
+            "Cache_hit": "cache_hit",
+            "Timed_out": "timed_out",
+            "Admission": "admission",
+            "Proxy_failed": "proxy_failed",
+            "LLM_TTFT": "llm_ttft",
+            "LLM_tokens_per_sec": "llm_tokens_per_sec",
+            "LLM_overhead": "llm_overhead",
+            "LLM_attempts": "llm_attempts",
+            "LLM_hedges": "llm_hedges",
+            "LLM_wasted_tokens": "llm_wasted_tokens",
+            "Cost_wasted_EUR": "cost_wasted_EUR",
         },
         inplace=True,
     )
@@ -103,6 +114,42 @@ def performance_report(results_path: str, file_name_prefix: str, data_source: st
     # Calculate the total token cost
     all_data["total_cost_tokens_EUR"] = all_data["cost_input_tokens_EUR"] + all_data["cost_output_tokens_EUR"]
 
+    # Responses served by the LLM cache are counted apart and left out of the LLM time statistics.
+    # Files generated before the cache existed have no Cache_hit column.
+    if "cache_hit" not in all_data.columns:
+        all_data["cache_hit"] = False
+    all_data["cache_hit"] = all_data["cache_hit"].fillna(False).astype(bool)
+    all_data["llm_time"] = all_data["llm_time"].where(~all_data["cache_hit"])
+
+    # Files generated before the query timeouts existed have no Timed_out column.
+    if "timed_out" not in all_data.columns:
+        all_data["timed_out"] = False
+    all_data["timed_out"] = all_data["timed_out"].fillna(False).astype(bool)
+
+    # Queries not run because of their estimated plan, files generated before admission control have none.
+    if "admission" not in all_data.columns:
+        all_data["admission"] = ""
+    all_data["rejected"] = all_data["admission"].fillna("").eq("rejected")
+
+    # Queries failed on the proxy database of the tiered execution.
+    if "proxy_failed" not in all_data.columns:
+        all_data["proxy_failed"] = False
+    all_data["proxy_failed"] = all_data["proxy_failed"].fillna(False).astype(bool)
+
+    # Latency profile of the LLM calls, files generated before it existed have none;
+    # the time to first token is only known for streamed completions.
+    for column in ("llm_ttft", "llm_tokens_per_sec", "llm_overhead"):
+        if column not in all_data.columns:
+            all_data[column] = np.nan
+        all_data[column] = pd.to_numeric(all_data[column], errors="coerce").where(~all_data["cache_hit"])
+
+    # Requests sent per LLM call (retries and hedges) and tokens of the answers not used,
+    # files generated before the retries existed have none.
+    for column in ("llm_attempts", "llm_hedges", "llm_wasted_tokens", "cost_wasted_EUR"):
+        if column not in all_data.columns:
+            all_data[column] = np.nan
+        all_data[column] = pd.to_numeric(all_data[column], errors="coerce")
+
     # Create log file path
     log_file_name = f"performance_report_{data_source}.txt" if data_source else "performance_report.txt"
     log_file_path = os.path.join(results_path, log_file_name)
@@ -117,6 +164,8 @@ def performance_report(results_path: str, file_name_prefix: str, data_source: st
     # Generate performance reports
     _generate_model_performance_report(all_data, log_file_path)
     _generate_query_performance_report(all_data, log_file_path)
+    _generate_latency_report(all_data, log_file_path)
+    _generate_resilience_report(all_data, log_file_path)
     _generate_ranking_reports(all_data, log_file_path)
     
     print(f"\nPerformance report saved to: {log_file_path}")
@@ -128,6 +177,10 @@ def _generate_model_performance_report(all_data: pd.DataFrame, log_file_path: st
         all_data.groupby("model")
         .agg(
             queries_executed=("question", "count"),
+            cache_hits=("cache_hit", "sum"),
+            timeouts=("timed_out", "sum"),
+            rejections=("rejected", "sum"),
+            proxy_failures=("proxy_failed", "sum"),
             mean_sql_time=("sql_time", "mean"),
             mean_llm_time=("llm_time", "mean"),
             stdev_llm_time=("llm_time", "std"),
@@ -182,6 +235,77 @@ def _generate_query_performance_report(all_data: pd.DataFrame, log_file_path: st
     _print_and_log(table_output, log_file_path)
 
 
+def _generate_latency_report(all_data: pd.DataFrame, log_file_path: str) -> None:
+    """Generate the latency profile of the LLM calls per model: time to first token, throughput and overhead."""
+    if all_data[["llm_ttft", "llm_tokens_per_sec", "llm_overhead"]].isna().all().all():
+        return
+
+    agg = (
+        all_data.groupby("model")
+        .agg(
+            mean_llm_time=("llm_time", "mean"),
+            mean_ttft=("llm_ttft", "mean"),
+            p50_ttft=("llm_ttft", "median"),
+            p95_ttft=("llm_ttft", lambda ttft: ttft.quantile(0.95)),
+            mean_tokens_per_sec=("llm_tokens_per_sec", "mean"),
+            mean_overhead=("llm_overhead", "mean"),
+            max_overhead=("llm_overhead", "max"),
+        )
+        .reset_index()
+    )
+
+    cols_to_round = [col for col in agg.columns if col != "model"]
+    agg[cols_to_round] = agg[cols_to_round].round(2)
+
+    _print_and_log("\nLatency profile of the LLM calls per model (seconds, tokens/sec):\n", log_file_path)
+    table_output = tabulate.tabulate(agg, headers="keys", tablefmt="pipe", showindex=False)
+    _print_and_log(table_output, log_file_path)
+
+    # Best models by time to first token, for the interactive use
+    best_ttft_models = agg.dropna(subset=["p50_ttft"]).sort_values(by="p50_ttft")
+    if not best_ttft_models.empty:
+        _print_and_log("\nBest models based on median time to first token:\n", log_file_path)
+        table_output = tabulate.tabulate(
+            best_ttft_models[["model", "p50_ttft", "p95_ttft"]],
+            headers="keys",
+            tablefmt="pipe",
+            showindex=False,
+        )
+        _print_and_log(table_output, log_file_path)
+
+
+def _generate_resilience_report(all_data: pd.DataFrame, log_file_path: str) -> None:
+    """Generate the retries and hedges of the LLM calls per model, and the cost of their wasted tokens."""
+    calls = all_data[~all_data["cache_hit"] & all_data["llm_attempts"].notna()]
+    if calls.empty or not ((calls["llm_attempts"] > 1) | (calls["llm_hedges"] > 0)).any():
+        return
+
+    agg = (
+        calls.assign(retried=calls["llm_attempts"] - calls["llm_hedges"] > 1, hedged=calls["llm_hedges"] > 0)
+        .groupby("model")
+        .agg(
+            calls=("llm_attempts", "size"),
+            mean_attempts=("llm_attempts", "mean"),
+            retried_calls=("retried", "sum"),
+            hedged_calls=("hedged", "sum"),
+            wasted_tokens=("llm_wasted_tokens", "sum"),
+            wasted_cost_EUR=("cost_wasted_EUR", "sum"),
+            total_cost_EUR=("total_cost_tokens_EUR", "sum"),
+        )
+        .reset_index()
+    )
+    # share of the spend on the requests whose answer was not used
+    agg["wasted_cost_pct"] = (
+        100 * agg["wasted_cost_EUR"] / (agg["total_cost_EUR"] + agg["wasted_cost_EUR"]).replace(0, np.nan)
+    ).round(2)
+    agg["mean_attempts"] = agg["mean_attempts"].round(2)
+    agg[["wasted_cost_EUR", "total_cost_EUR"]] = agg[["wasted_cost_EUR", "total_cost_EUR"]].round(6)
+
+    _print_and_log("\nRetries and hedges of the LLM calls per model:\n", log_file_path)
+    table_output = tabulate.tabulate(agg, headers="keys", tablefmt="pipe", showindex=False)
+    _print_and_log(table_output, log_file_path)
+
+
 def _generate_ranking_reports(all_data: pd.DataFrame, log_file_path: str) -> None:
     """Generate ranking reports for different metrics."""
     agg = (
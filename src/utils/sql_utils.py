@@ -1,5 +1,5 @@
 import re
-from typing import Tuple
+from typing import List, Tuple
 
 
 def remove_quotations(sql_query: str) -> Tuple[str, bool]:
@@ -29,3 +29,158 @@ def remove_quotations(sql_query: str) -> Tuple[str, bool]:
                 break
 
     return sql_query, changed
+
+
+# fenced block extracted first by remove_quotations
+_FENCED_SQL_PATTERN = re.compile(r"```(?:sql|code)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+
+
+def has_complete_sql_block(text: str) -> bool:
+    """
+    Check whether the beginning of an LLM response already holds the ```sql ... ``` block
+    that remove_quotations extracts from the whole response, so the rest of a streamed
+    response can be dropped.
+
+    :param text: Response received so far.
+    :return: True if a fenced block with content is complete.
+    """
+    match = _FENCED_SQL_PATTERN.search(text)
+    return bool(match and match.group(1).strip())
+
+
+# Tokens of a SQL query, in order of precedence: comments, string literals,
+# quoted identifiers, words, numbers, whitespace and single characters.
+_SQL_TOKEN_PATTERN = re.compile(
+    r"(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<string>N?'(?:[^']|'')*')"
+    r"|(?P<quoted>\"(?:[^\"]|\"\")*\"|\[[^\]]*\]|`[^`]*`)"
+    r"|(?P<word>[^\W\d]\w*)"
+    r"|(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.DOTALL,
+)
+
+# Functions whose AS keyword is followed by a data type, not by an alias
+_SQL_TYPE_FUNCTIONS = {"cast", "try_cast", "convert", "try_convert"}
+
+# Words before a parenthesis opening a subquery, whose ORDER BY sorts the rows of a query
+_SQL_SUBQUERY_WORDS = {"from", "join", "in", "exists", "as", "any", "all", "some", "lateral"}
+
+# Words ending the ORDER BY clause of a query
+_SQL_CLAUSE_WORDS = {
+    "select",
+    "from",
+    "where",
+    "group",
+    "having",
+    "window",
+    "qualify",
+    "limit",
+    "offset",
+    "fetch",
+    "union",
+    "except",
+    "intersect",
+}
+
+
+def canonicalize_sql(sql_query: str) -> Tuple[str, List[str]]:
+    """
+    Build a canonical form of a SQL query, so queries that only differ in
+    whitespace, comments, keywords/identifiers case, trailing semicolons or
+    the names of their aliases share the same text.
+
+    Unquoted words are lowercased, string literals are kept as they are, and
+    the aliases declared with AS (columns, tables and subqueries) are renamed
+    to positional placeholders. An alias is only renamed when its declaration
+    is the first occurrence of the name (e.g. "c_name AS c_name" is kept) and
+    every other occurrence can only refer to the alias: a qualifier ("o.col")
+    or a name in the ORDER BY of a query. An alias whose name may also be a
+    table or column elsewhere (e.g. "COUNT(*) AS orders FROM orders") is kept,
+    so queries over different tables or columns never share the same text.
+
+    :param sql_query: SQL query to canonicalize.
+    :return: Tuple containing (canonical SQL query, renamed aliases in order).
+        The aliases are returned as written (without quotes), so the output
+        columns of an equivalent query can be renamed positionally.
+    """
+    tokens = []
+    for match in _SQL_TOKEN_PATTERN.finditer(sql_query or ""):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        tokens.append((kind, match.group()))
+
+    while tokens and tokens[-1] == ("other", ";"):
+        tokens.pop()
+
+    def _name(token):
+        kind, text = token
+        if kind == "word":
+            return text.lower()
+        if kind == "quoted":
+            return text[1:-1].lower()
+        return None
+
+    def _word(i):
+        return tokens[i][1].lower() if 0 <= i < len(tokens) and tokens[i][0] == "word" else None
+
+    # find the aliases declared with AS, skipping the data types of CAST(x AS type),
+    # and the tokens in the ORDER BY of a query (not of a window or an aggregate)
+    candidates = {}
+    seen = set()
+    in_order_by = []
+    # (word before the parenthesis, in the ORDER BY clause) per parenthesis level
+    scopes = [(None, False)]
+    for i, token in enumerate(tokens):
+        kind, text = token
+        word = _word(i)
+        if token == ("other", "("):
+            scopes.append((_word(i - 1), False))
+        elif token == ("other", ")"):
+            if len(scopes) > 1:
+                scopes.pop()
+        elif word == "by" and _word(i - 1) == "order":
+            opener = scopes[-1][0]
+            scopes[-1] = (opener, opener is None or opener in _SQL_SUBQUERY_WORDS)
+        elif word in _SQL_CLAUSE_WORDS:
+            scopes[-1] = (scopes[-1][0], False)
+        elif word == "as" and i + 1 < len(tokens):
+            in_type_function = scopes[-1][0] in _SQL_TYPE_FUNCTIONS
+            name = _name(tokens[i + 1])
+            if not in_type_function and name is not None and name not in seen and name not in candidates:
+                candidates[name] = i + 1
+        in_order_by.append(scopes[-1][1])
+
+        name = _name(token)
+        if name is not None and name not in candidates:
+            seen.add(name)
+
+    # keep the aliases with an occurrence that may be a table or a column
+    for i, token in enumerate(tokens):
+        name = _name(token)
+        if name not in candidates or candidates[name] == i:
+            continue
+        qualifier = i + 1 < len(tokens) and tokens[i + 1] == ("other", ".") and _word(i - 1) not in ("from", "join")
+        if not qualifier and not in_order_by[i]:
+            del candidates[name]
+
+    aliases = {}
+    declared = []
+    for name, i in sorted(candidates.items(), key=lambda item: item[1]):
+        aliases[name] = f"__alias_{len(aliases) + 1}"
+        declared.append(tokens[i][1] if tokens[i][0] == "word" else tokens[i][1][1:-1])
+
+    canonical = []
+    for token in tokens:
+        kind, text = token
+        name = _name(token)
+        if name is not None and name in aliases:
+            canonical.append(aliases[name])
+        elif kind == "word":
+            canonical.append(name)
+        else:
+            canonical.append(text)
+
+    return " ".join(canonical), declared
@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.data_utils import DataUtils
+from utils.dataframe_utils import (
+    as_dataframe,
+    column_signatures,
+    match_column_signatures,
+    prepare_baseline,
+    round_columns,
+    row_fingerprints,
+    shared_precisions,
+)
+
+# rows of an LLM result kept in memory and compared as a whole, larger results are compared chunk by chunk
+STREAMING_BUFFER_ROWS = int(os.getenv("STREAMING_BUFFER_ROWS", 1_000_000))
+
+# rows read at most from an LLM result, 0 for no limit
+STREAMING_MAX_ROWS = int(os.getenv("STREAMING_MAX_ROWS", 0))
+
+
+class StreamingComparator:
+    """
+    Compares an LLM result with its baseline chunk by chunk, as the result is fetched,
+    with the metrics of DataUtils.compare_dataframes.
+
+    Results up to buffer_rows, and no larger than the baseline, are kept and compared
+    as a whole, so their metrics are the same as compare_dataframes. Larger results are
+    compared incrementally (from the first chunk over the baseline rows): the
+    decimal places and the column alignment are decided on the buffered rows, then
+    each chunk is rounded, aligned and fingerprinted, and only the number of
+    occurrences of each distinct baseline row is kept, so memory is bounded by the
+    baseline (and one chunk), not by the result.
+
+    Once the result has more rows than the baseline its rows equality is 0, and when
+    every baseline row is already covered (or the columns cannot match) no other row
+    can change the metrics: update returns False and the rest of the result is not read.
+    """
+
+    def __init__(
+        self,
+        baseline_df,
+        question_number,
+        baseline_profile: dict = None,
+        baseline_prepared=None,
+        buffer_rows: int = None,
+        max_rows: int = None,
+    ):
+        """
+        :param baseline_df: Baseline DataFrame, or None.
+        :param question_number: Question number.
+        :param baseline_profile: Precision profile of the baseline (see precision_profile).
+        :param baseline_prepared: Function returning the prepared baseline for the decimal places
+            of its rounded columns (e.g. BaselineDataset.prepared), prepare_baseline if not given.
+        :param buffer_rows: Rows compared as a whole, defaults to STREAMING_BUFFER_ROWS.
+        :param max_rows: Rows read at most, defaults to STREAMING_MAX_ROWS (0 for no limit).
+        """
+        self.baseline_df = as_dataframe(baseline_df)
+        self.question_number = question_number
+        self.baseline_profile = baseline_profile
+        self.baseline_prepared = baseline_prepared
+        self.buffer_rows = STREAMING_BUFFER_ROWS if buffer_rows is None else buffer_rows
+        self.max_rows = STREAMING_MAX_ROWS if max_rows is None else max_rows
+
+        self.rows = 0
+        self.columns = 0
+        self.stopped = False
+        self.sample = None
+
+        self._buffer = []
+        # above the baseline rows the rows equality is 0, and the early stop is checked on each chunk
+        self._baseline_rows = 0 if self.baseline_df is None else len(self.baseline_df)
+        self._incremental = False
+        self._precisions = None
+        self._positions = None
+        self._baseline = None
+        self._llm_counts = None
+
+    def update(self, chunk) -> bool:
+        """
+        Add a chunk of the LLM result.
+
+        :param chunk: DataFrame, or pyarrow Table or RecordBatch, with the next rows of the result.
+        :return: False when the metrics cannot change anymore (or max_rows was read),
+            and the rest of the result does not need to be read.
+        """
+        chunk = as_dataframe(chunk)
+        if self.sample is None:
+            self.sample = chunk.head()
+            self.columns = chunk.shape[1]
+        self.rows += len(chunk)
+
+        if not self._incremental:
+            self._buffer.append(chunk)
+            if self.rows > self.buffer_rows or self.rows > self._baseline_rows:
+                self._start_incremental()
+        else:
+            self._add(chunk)
+
+        if self.max_rows and self.rows >= self.max_rows:
+            print(
+                f"[WARNING] Question #{self.question_number}: LLM result stopped after {self.rows} rows "
+                f"(STREAMING_MAX_ROWS), its coverage of the baseline is a lower bound."
+            )
+            self.stopped = True
+        elif self._incremental and self._final():
+            self.stopped = True
+
+        return not self.stopped
+
+    def result(self):
+        """
+        :return: (rows_equality, columns_equality, datasets_equality, datasets_multiset_equality),
+            as DataUtils.compare_dataframes.
+        """
+        if not self._incremental:
+            llm_df = None
+            if self._buffer:
+                llm_df = self._buffer[0] if len(self._buffer) == 1 else pd.concat(self._buffer, ignore_index=True)
+            return DataUtils.compare_dataframes(
+                self.baseline_df, llm_df, self.question_number, self.baseline_profile, self.baseline_prepared
+            )
+
+        baseline = self._baseline
+        if baseline is None:
+            return 0.00, 0.00, 0.00, 0.00
+
+        baseline_rows = len(baseline["df"])
+        baseline_columns = baseline["df"].shape[1]
+        distinct_intersection = int((self._llm_counts > 0).sum())
+        multiset_intersection = int(np.minimum(baseline["counts"], self._llm_counts).sum())
+
+        percent_datasets_equality = (
+            round(distinct_intersection / baseline["distinct"], 2) if baseline["distinct"] else 0.0
+        )
+        percent_multiset_equality = round(multiset_intersection / baseline_rows, 2)
+        percent_rows_equality = round(self.rows / baseline_rows, 2) if self.rows <= baseline_rows else 0.0
+        percent_columns_equality = (
+            round(len(self._positions) / baseline_columns, 2) if len(self._positions) <= baseline_columns else 0.0
+        )
+
+        return (
+            percent_rows_equality,
+            percent_columns_equality,
+            percent_datasets_equality,
+            percent_multiset_equality,
+        )
+
+    def _start_incremental(self):
+        """
+        Decide the rounding and the column alignment on the buffered rows, then compare them.
+        """
+        llm_df = pd.concat(self._buffer, ignore_index=True)
+        self._buffer = []
+        self._incremental = True
+
+        if self.baseline_df is None or self.baseline_df.empty:
+            # nothing to compare with
+            return
+
+        try:
+            self._precisions = shared_precisions(self.baseline_df, llm_df, self.baseline_profile)
+            if self.baseline_prepared is not None:
+                self._baseline = self.baseline_prepared(self._precisions)
+            else:
+                self._baseline = prepare_baseline(self.baseline_df, self._precisions)
+
+            llm_df = round_columns(llm_df, self._precisions)
+            assignment = match_column_signatures(self._baseline["signatures"], column_signatures(llm_df))
+            self._positions = [assignment[i] for i in range(self._baseline["df"].shape[1]) if i in assignment]
+            self._llm_counts = np.zeros(len(self._baseline["keys"]), dtype=np.int64)
+            self._add(llm_df, rounded=True)
+        except Exception as e:
+            print(f"[ERROR] Question #{self.question_number}: comparison failed: {e}")
+            self._baseline = None
+
+    def _add(self, chunk: pd.DataFrame, rounded: bool = False):
+        """
+        Count the occurrences of the baseline rows in a chunk.
+        """
+        baseline = self._baseline
+        if baseline is None or len(self._positions) != baseline["df"].shape[1] or chunk.empty:
+            # rows with a different number of values are never equal
+            return
+
+        if not rounded:
+            chunk = round_columns(chunk, self._precisions)
+        fingerprints, matchable = row_fingerprints(chunk.iloc[:, self._positions])
+        keys, counts = np.unique(fingerprints[matchable], return_counts=True)
+
+        index = np.searchsorted(baseline["keys"], keys)
+        found = index < len(baseline["keys"])
+        found[found] = baseline["keys"][index[found]] == keys[found]
+        self._llm_counts[index[found]] += counts[found]
+
+    def _final(self) -> bool:
+        """
+        :return: True if no other row can change the metrics.
+        """
+        baseline = self._baseline
+        if baseline is None:
+            return True
+        if self.rows <= len(baseline["df"]):
+            # the rows equality still depends on the number of rows
+            return False
+        if len(self._positions) != baseline["df"].shape[1]:
+            return True
+        # every distinct baseline row is covered as many times as in the baseline
+        return bool((self._llm_counts >= baseline["counts"]).all())
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# the packages of the project live in src (see pyproject.toml)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# the services are traced with Langfuse, which is not reachable from the tests
+os.environ.setdefault("LANGFUSE_PUBLIC_KEY", "pk-test")
+os.environ.setdefault("LANGFUSE_SECRET_KEY", "sk-test")
+os.environ.setdefault("LANGFUSE_HOST", "http://127.0.0.1:9")
+os.environ.setdefault("LANGFUSE_TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
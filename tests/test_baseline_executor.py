@@ -0,0 +1,24 @@
+import os
+
+import duckdb
+
+from core.baseline_executor import BaselineExecutor
+from services.database_service import DatabaseService
+
+
+def test_execute_queries_creates_the_baseline_folder(tmp_path):
+    database_path = str(tmp_path / "tpch.db")
+    with duckdb.connect(database_path) as connection:
+        connection.execute("CREATE TABLE nation AS SELECT range AS n_nationkey FROM range(25)")
+
+    db_service = DatabaseService(duckdb_path=database_path, sandbox=False)
+    # e.g. results/smoke/baseline_dataset_duckdb with --tier smoke
+    baseline_path = str(tmp_path / "smoke" / "baseline_dataset_duckdb")
+    questions = [{"question_number": 1, "sql_query": "SELECT COUNT(*) AS nations FROM nation"}]
+
+    BaselineExecutor(db_service).execute_queries(
+        questions, "sql_query", "summary.txt", baseline_path, database_source="duckdb"
+    )
+
+    assert os.path.isfile(os.path.join(baseline_path, "question_01.csv"))
+    assert os.path.isfile(os.path.join(baseline_path, "summary.txt"))
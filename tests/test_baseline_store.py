@@ -0,0 +1,152 @@
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from core.baseline_executor import BaselineExecutor
+from data.baseline_store import MAX_PREPARED_BASELINES, BaselineDataset, BaselineStore
+from services.database_service import DatabaseService
+from utils.data_utils import DataUtils
+
+
+def _database(tmp_path):
+    database_path = str(tmp_path / "tpch.db")
+    with duckdb.connect(database_path) as connection:
+        connection.execute(
+            "CREATE TABLE orders AS SELECT range AS o_orderkey, CAST(range * 1.25 AS DECIMAL(15, 2)) AS o_totalprice, "
+            "DATE '1996-01-01' + CAST(range AS INTEGER) AS o_orderdate FROM range(10)"
+        )
+    return DatabaseService(duckdb_path=database_path, sandbox=False, result_cache=None)
+
+
+def test_arrow_baseline_keeps_the_types_of_the_database(tmp_path):
+    db_service = _database(tmp_path)
+    baseline_path = str(tmp_path / "baseline")
+    sql_query = "SELECT o_orderkey, o_totalprice, o_orderdate FROM orders ORDER BY o_orderkey"
+
+    BaselineExecutor(db_service).execute_queries(
+        [{"question_number": 1, "sql_query": sql_query}],
+        "sql_query",
+        "summary.txt",
+        baseline_path,
+        database_source="duckdb",
+    )
+
+    store = BaselineStore(baseline_path)
+    store.load_manifest()
+    schema = dict(store.entry(1)["schema"])
+    assert schema["o_totalprice"] == str(pa.decimal128(15, 2))
+    assert schema["o_orderdate"] == str(pa.date32())
+
+    # read back as the fetched result
+    fetched_df = db_service.execute_sql_query(sql_query, "duckdb")[0]
+    pd.testing.assert_frame_equal(store.read(1), fetched_df)
+
+
+def test_baseline_index_loads_the_arrow_baselines(tmp_path):
+    db_service = _database(tmp_path)
+    baseline_path = str(tmp_path / "baseline")
+    questions = [
+        {"question_number": 1, "sql_query": "SELECT COUNT(*) AS orders FROM orders"},
+        {"question_number": 2, "sql_query": "SELECT o_totalprice FROM orders WHERE o_orderkey < 3"},
+    ]
+
+    BaselineExecutor(db_service).execute_queries(
+        questions, "sql_query", "summary.txt", baseline_path, database_source="duckdb"
+    )
+    baselines = DataUtils.load_baseline_datasets(baseline_path)
+
+    assert baselines.get(1)["df"].iloc[0, 0] == 10
+    assert baselines.get(2)["df"]["o_totalprice"].tolist() == [0.0, 1.25, 2.5]
+
+
+def test_unchanged_baselines_are_not_executed_again(tmp_path, capsys):
+    db_service = _database(tmp_path)
+    baseline_path = str(tmp_path / "baseline")
+    questions = [{"question_number": 1, "sql_query": "SELECT COUNT(*) AS orders FROM orders"}]
+    executor = BaselineExecutor(db_service)
+
+    executor.execute_queries(questions, "sql_query", "summary.txt", baseline_path, database_source="duckdb")
+    executor.execute_queries(questions, "sql_query", "summary.txt", baseline_path, database_source="duckdb")
+
+    assert "0 baseline queries executed, 1 unchanged." in capsys.readouterr().out
+
+
+def test_only_the_changed_baselines_are_executed_again(tmp_path, capsys):
+    db_service = _database(tmp_path)
+    baseline_path = str(tmp_path / "baseline")
+    executed_queries = []
+    fetch_arrow_sql_query = db_service.fetch_arrow_sql_query
+
+    def fetch_and_record(sql_query, source):
+        executed_queries.append(sql_query)
+        return fetch_arrow_sql_query(sql_query, source)
+
+    db_service.fetch_arrow_sql_query = fetch_and_record
+    executor = BaselineExecutor(db_service)
+    questions = [
+        {"question_number": 1, "sql_query": "SELECT COUNT(*) AS orders FROM orders"},
+        {"question_number": 2, "sql_query": "SELECT o_orderkey FROM orders WHERE o_orderkey < 3"},
+    ]
+
+    def execute(force=False):
+        executed_queries.clear()
+        capsys.readouterr()
+        executor.execute_queries(
+            questions, "sql_query", "summary.txt", baseline_path, database_source="duckdb", force=force
+        )
+        return list(executed_queries), capsys.readouterr().out
+
+    assert execute()[0] == [questions[0]["sql_query"], questions[1]["sql_query"]]
+
+    queries, out = execute()
+    assert queries == []
+    assert "0 baseline queries executed, 2 unchanged." in out
+
+    questions[1]["sql_query"] = "SELECT o_orderkey FROM orders WHERE o_orderkey < 5"
+    queries, out = execute()
+    assert queries == [questions[1]["sql_query"]]
+    assert "1 baseline queries executed, 1 unchanged." in out
+    store = BaselineStore(baseline_path)
+    store.load_manifest()
+    assert store.read(2)["o_orderkey"].tolist() == [0, 1, 2, 3, 4]
+
+    queries, out = execute(force=True)
+    assert sorted(queries) == sorted(question["sql_query"] for question in questions)
+    assert "2 baseline queries executed, 0 unchanged." in out
+
+
+def test_exported_baselines_are_loaded_from_the_parquet_files(tmp_path):
+    db_service = _database(tmp_path)
+    baseline_path = str(tmp_path / "baseline")
+    sql_query = "SELECT o_orderkey, o_totalprice, o_orderdate FROM orders WHERE o_orderkey < 4 ORDER BY o_orderkey"
+
+    BaselineExecutor(db_service).execute_queries(
+        [{"question_number": 1, "sql_query": sql_query}],
+        "sql_query",
+        "summary.txt",
+        baseline_path,
+        database_source="duckdb",
+        direct_export=True,
+    )
+    store = BaselineStore(baseline_path)
+    store.load_manifest()
+    baselines = DataUtils.load_baseline_datasets(baseline_path)
+
+    assert (store.entry(1)["rows"], store.entry(1)["columns"]) == (4, 3)
+    assert store.entry(1)["file"].endswith(".parquet")
+    assert baselines.get(1)["df"]["o_totalprice"].tolist() == [0.0, 1.25, 2.5, 3.75]
+    # the CSV copy is written by DuckDB, with the text of the DECIMAL values
+    with open(store.file_path(1, "csv"), encoding="utf-8") as file:
+        assert file.read().splitlines()[1] == "0\t0.00\t1996-01-01"
+
+
+def test_prepared_baselines_are_bounded():
+    df = pd.DataFrame({"o_totalprice": [1.23456, 2.34567, 3.45678]})
+    baseline = BaselineDataset(1, lambda: df)
+    baseline.load()
+
+    for decimals in range(MAX_PREPARED_BASELINES + 3):
+        prepared = baseline.prepared({"o_totalprice": decimals})
+        assert prepared["df"]["o_totalprice"].tolist() == df["o_totalprice"].round(decimals).tolist()
+
+    assert len(baseline._prepared) == MAX_PREPARED_BASELINES
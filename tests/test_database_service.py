@@ -0,0 +1,163 @@
+import time
+
+import duckdb
+import pandas as pd
+import pytest
+
+from core.question_processor import QuestionProcessor
+from services.database_service import DatabaseService, QueryTimeoutError
+from services.sql_result_cache import SQLResultCache
+
+# fails on the 5,000,001st row, after DuckDB has returned from execute
+RUNTIME_ERROR_QUERY = (
+    "SELECT CAST(CASE WHEN i = 5000000 THEN 'x' ELSE '1' END AS INTEGER) AS v FROM range(10000000) t(i)"
+)
+
+# runs for more than a minute
+SLOW_QUERY = "SELECT SUM(a.range * b.range) AS total FROM range(10000000) a, range(1000) b"
+
+
+@pytest.fixture
+def db_service(tmp_path):
+    database_path = str(tmp_path / "tpch.db")
+    with duckdb.connect(database_path) as connection:
+        connection.execute(
+            "CREATE TABLE nation AS SELECT range AS n_nationkey, 'NATION ' || range AS n_name FROM range(25)"
+        )
+    db_service = DatabaseService(duckdb_path=database_path, sandbox=False, result_cache=None)
+    yield db_service
+    db_service.close()
+
+
+def test_check_reports_the_errors_raised_while_the_rows_are_read(db_service):
+    executed, _, timed_out = db_service.check_sql_query(RUNTIME_ERROR_QUERY, "duckdb", timeout=60)
+
+    assert (executed, timed_out) == (False, False)
+
+
+def test_check_passes_the_queries_that_run(db_service):
+    executed, _, timed_out = db_service.check_sql_query("SELECT * FROM nation, range(100000)", "duckdb", timeout=60)
+
+    assert (executed, timed_out) == (True, False)
+
+
+def test_a_query_over_the_timeout_is_interrupted(db_service):
+    df, executed, _, _, duration_sql, timed_out = db_service.execute_sql_query(SLOW_QUERY, "duckdb", timeout=0.5)
+
+    assert (df, executed, timed_out) == (None, False, True)
+    assert 0.5 <= duration_sql < 30
+
+
+def test_the_cursor_runs_the_next_queries_after_a_timeout(db_service):
+    cursor = db_service.get_connection("duckdb")
+    db_service.execute_sql_query(SLOW_QUERY, "duckdb", timeout=0.5)
+
+    df, executed, rows, _, _, timed_out = db_service.execute_sql_query("SELECT * FROM nation", "duckdb", timeout=0.5)
+    # the timer of the fast query is cancelled, it does not interrupt the queries after it
+    time.sleep(0.6)
+    later_df, *_ = db_service.execute_sql_query("SELECT * FROM nation WHERE n_nationkey < 5", "duckdb")
+
+    assert db_service.get_connection("duckdb") is cursor
+    assert (executed, rows, timed_out) == (True, 25, False)
+    assert len(later_df) == 5
+
+
+def test_the_timeout_is_raised_as_a_query_timeout_error(db_service):
+    with pytest.raises(QueryTimeoutError):
+        db_service.get_dynamic_sql("duckdb", SLOW_QUERY, as_data_frame=True, timeout=0.5)
+    with pytest.raises(RuntimeError) as error:
+        db_service.get_dynamic_sql("duckdb", "SELECT * FROM missing_table", as_data_frame=True, timeout=0.5)
+
+    assert not isinstance(error.value, QueryTimeoutError)
+
+
+def test_a_cached_result_slower_than_the_timeout_is_reported_as_timed_out(tmp_path):
+    database_path = str(tmp_path / "tpch.db")
+    db_service = DatabaseService(duckdb_path=database_path, sandbox=False, result_cache=SQLResultCache())
+    # the first execution of the query took 5 seconds
+    db_service.result_cache.get_or_execute(
+        db_service._result_cache_source("duckdb"), "SELECT 42 AS answer", lambda: (pd.DataFrame({"answer": [42]}), 5.0)
+    )
+    try:
+        timed_out_result = db_service.execute_sql_query("SELECT 42 AS answer", "duckdb", timeout=1)
+        cached_result = db_service.execute_sql_query("SELECT 42 AS answer", "duckdb", timeout=10)
+    finally:
+        db_service.close()
+
+    df, executed, _, _, duration_sql, timed_out = timed_out_result
+    assert (df, executed, duration_sql, timed_out) == (None, False, 1, True)
+    df, executed, rows, _, duration_sql, timed_out = cached_result
+    assert (executed, rows, duration_sql, timed_out) == (True, 1, 5.0, False)
+
+
+@pytest.mark.parametrize("comparison", ["compare_with_baseline", "compare_streaming"])
+def test_the_comparisons_report_the_timeout(db_service, comparison):
+    baseline_df = pd.DataFrame({"total": [1]})
+
+    compare = getattr(db_service, comparison)
+    sample_df, executed, rows, _, duration_sql, metrics, timed_out = compare(
+        SLOW_QUERY, "duckdb", baseline_df, 1, timeout=0.5
+    )
+
+    assert (sample_df, executed, rows, timed_out) == (None, False, 0, True)
+    assert 0.5 <= duration_sql < 30
+    assert metrics == (0.00, 0.00, 0.00, 0.00)
+    temporary_tables = db_service.get_connection("duckdb").execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE temporary"
+    )
+    assert temporary_tables.fetchone()[0] == 0
+
+
+class _LLMService:
+    def generate_sql_query(self, **kwargs):
+        return SLOW_QUERY, {"duration": 0.1}
+
+
+class _DatabaseSchema:
+    def get_table_script(self, table):
+        return ""
+
+
+def test_the_timeout_of_a_question_overrides_the_global_one(db_service):
+    processor = QuestionProcessor(_LLMService(), db_service, _DatabaseSchema(), query_timeout=60, admission="off")
+    question = {"question_number": 1, "user_question": "Total?", "tables_used": [], "query_timeout": 0.5}
+
+    processor.process_question(
+        question=question,
+        baseline_datasets={},
+        model={"name": "model"},
+        model_config={"models": []},
+        system_message="",
+        semantic_rules="",
+        temperature=0,
+        max_tokens=100,
+        iteration=1,
+        data_source="duckdb",
+    )
+
+    assert (question["executed"], question["timed_out"]) == (False, True)
+    assert 0.5 <= question["duration_sql"] < 30
+
+
+def test_export_reads_the_rows_and_columns_from_the_parquet_file(db_service, tmp_path):
+    file_path = str(tmp_path / "question_01.parquet")
+    csv_path = str(tmp_path / "question_01.csv")
+
+    executed, rows, schema, _ = db_service.export_sql_query(
+        "SELECT n_nationkey, n_name FROM nation WHERE n_nationkey < 10", "duckdb", file_path, csv_path=csv_path
+    )
+
+    assert (executed, rows) == (True, 10)
+    assert schema == [["n_nationkey", "BIGINT"], ["n_name", "VARCHAR"]]
+    assert len(pd.read_parquet(file_path)) == 10
+    assert len(pd.read_csv(csv_path, sep="\t")) == 10
+
+
+def test_a_failed_export_leaves_no_files(db_service, tmp_path):
+    file_path = str(tmp_path / "question_01.parquet")
+    csv_path = str(tmp_path / "question_01.csv")
+
+    exported = db_service.export_sql_query(RUNTIME_ERROR_QUERY, "duckdb", file_path, csv_path=csv_path)
+
+    assert exported == (False, 0, [], 0)
+    assert list(tmp_path.glob("question_01*")) == []
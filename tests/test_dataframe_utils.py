@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from utils.data_utils import DataUtils
+from utils.dataframe_utils import (
+    align_columns_by_signature,
+    arrow_to_dataframe,
+    column_signatures,
+    match_column_signatures,
+    row_fingerprints,
+)
+
+DECIMALS_QUERY = """
+SELECT
+    CAST(v AS DECIMAL(15, 2)) AS small,
+    CAST(v AS DECIMAL(38, 2)) AS wide,
+    CAST(v * 1e20 AS DECIMAL(38, 2)) AS huge
+FROM (VALUES (0.0), (1.25), (-1.25), (17964999.93), (-11053181.80), (-8325522.74), (NULL)) AS t(v)
+"""
+
+
+def test_arrow_to_dataframe_converts_decimals_as_duckdb():
+    with duckdb.connect() as connection:
+        expected = connection.execute(DECIMALS_QUERY).df()
+        result = connection.execute(DECIMALS_QUERY)
+        # to_arrow_table replaces fetch_arrow_table in recent DuckDB versions
+        df = arrow_to_dataframe((getattr(result, "to_arrow_table", None) or result.fetch_arrow_table)())
+
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_row_fingerprints_follow_the_equality_of_python_tuples():
+    numbers = pd.DataFrame({"key": [5, 7], "name": ["a", "b"]})
+    objects = pd.DataFrame({"key": [Decimal("5"), 7.0], "name": ["a", "b"]}, dtype=object)
+    swapped = pd.DataFrame({"name": ["a", "b"], "key": [5, 7]})
+    strings = pd.DataFrame({"key": ["5", "7"], "name": ["a", "b"]})
+
+    fingerprints, matchable = row_fingerprints(numbers)
+    assert matchable.all()
+    # 5 == 5.0 == Decimal("5")
+    assert (row_fingerprints(objects)[0] == fingerprints).all()
+    # the values are compared in the order of the columns, and "5" != 5
+    assert not (row_fingerprints(swapped)[0] == fingerprints).any()
+    assert not (row_fingerprints(strings)[0] == fingerprints).any()
+
+
+def test_rows_with_nan_numbers_are_not_matchable():
+    df = pd.DataFrame({"key": [1.0, np.nan, 3.0], "name": pd.Series(["a", "b", None], dtype=object)})
+
+    fingerprints, matchable = row_fingerprints(df)
+
+    assert matchable.tolist() == [True, False, True]
+    # None is a value like any other
+    other = pd.DataFrame({"key": [3.0], "name": pd.Series([None], dtype=object)})
+    assert fingerprints[2] == row_fingerprints(other)[0][0]
+
+
+def test_compare_dataframes_counts_distinct_and_duplicated_rows():
+    baseline = pd.DataFrame({"nation": ["FRANCE", "FRANCE", "GERMANY", "JAPAN"], "orders": [3, 3, 5, 8]})
+    llm = pd.DataFrame({"orders": [3, 5, 9], "nation": ["FRANCE", "GERMANY", "PERU"]})
+
+    rows, columns, datasets, multiset = DataUtils.compare_dataframes(baseline, llm, 1)
+
+    assert (rows, columns) == (0.75, 1.0)
+    # 2 of the 3 distinct rows, 2 of the 4 rows
+    assert (datasets, multiset) == (0.67, 0.5)
+
+
+def test_columns_are_aligned_by_their_values_not_their_names():
+    baseline = pd.DataFrame(
+        {"nation": ["FRANCE", "GERMANY", "JAPAN"], "orders": [3, 5, 8], "revenue": [10.5, 20.25, 30.0]}
+    )
+    # same first row values in two columns, renamed and reordered columns, an extra column
+    llm = pd.DataFrame(
+        {
+            "total": [10.5, 20.25, 30.0],
+            "region": ["EUROPE", "EUROPE", "ASIA"],
+            "n": [3, 5, 8],
+            "name": ["FRANCE", "GERMANY", "JAPAN"],
+        }
+    )
+
+    _, aligned = align_columns_by_signature(baseline, llm)
+
+    assert aligned.columns.tolist() == ["name", "n", "total"]
+
+
+def test_columns_are_matched_one_to_one():
+    baseline = pd.DataFrame({"low": [1, 1, 2], "high": [1, 5, 9]})
+    llm = pd.DataFrame({"a": [1, 5, 9], "b": [1, 1, 2]})
+
+    # both columns of the LLM result start with 1, each one is matched once
+    assert match_column_signatures(column_signatures(baseline), column_signatures(llm)) == {0: 1, 1: 0}
+
+
+def test_columns_of_different_kinds_never_match():
+    baseline = pd.DataFrame({"key": [1, 2, 3]})
+    llm = pd.DataFrame({"key": ["1", "2", "3"]})
+
+    assert match_column_signatures(column_signatures(baseline), column_signatures(llm)) == {}
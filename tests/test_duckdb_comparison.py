@@ -0,0 +1,92 @@
+import duckdb
+import pytest
+
+from services.database_service import DatabaseService
+from utils.data_utils import DataUtils
+
+BASELINES = {
+    "orders": (
+        "SELECT o_orderkey, o_custkey, o_totalprice, o_orderdate, o_comment FROM orders ORDER BY o_orderkey",
+        "o_orderkey, o_custkey, o_totalprice, o_orderdate, o_comment",
+    ),
+    "revenue": (
+        "SELECT o_custkey, SUM(o_totalprice) AS revenue, COUNT(*) AS orders FROM orders GROUP BY o_custkey",
+        "o_custkey, revenue, orders",
+    ),
+}
+
+VARIANTS = {
+    "same": "SELECT {columns} FROM ({baseline})",
+    "reordered": "SELECT {reversed} FROM ({baseline})",
+    "truncated": "SELECT {columns} FROM ({baseline}) LIMIT 7",
+    "duplicated": "SELECT {columns} FROM ({baseline}) UNION ALL SELECT {columns} FROM ({baseline}) LIMIT 5",
+    "rounded": "SELECT {rounded} FROM ({baseline})",
+    "filtered": "SELECT {columns} FROM ({baseline}) WHERE o_custkey % 3 = 0",
+    "extra_column": "SELECT {columns}, 1 AS one FROM ({baseline})",
+    "missing_column": "SELECT {first} FROM ({baseline})",
+    "empty": "SELECT {columns} FROM ({baseline}) WHERE false",
+}
+
+
+@pytest.fixture(scope="module")
+def db_service(tmp_path_factory):
+    database_path = str(tmp_path_factory.mktemp("duckdb") / "tpch.db")
+    with duckdb.connect(database_path) as connection:
+        connection.execute(
+            "CREATE TABLE orders AS SELECT range AS o_orderkey, range % 7 AS o_custkey, "
+            "CAST(range * 10.37 / 3 AS DECIMAL(15, 2)) AS o_totalprice, "
+            "DATE '1996-01-01' + CAST(range AS INTEGER) AS o_orderdate, "
+            "CASE WHEN range % 5 = 0 THEN NULL ELSE 'comment ' || (range % 4) END AS o_comment FROM range(40)"
+        )
+    db_service = DatabaseService(duckdb_path=database_path, sandbox=False, result_cache=None)
+    yield db_service
+    db_service.close()
+
+
+def _variant(baseline, columns, variant):
+    names = [name.strip() for name in columns.split(",")]
+    rounded = [f"ROUND({name}, 1) AS {name}" if name in ("o_totalprice", "revenue") else name for name in names]
+    return VARIANTS[variant].format(
+        baseline=baseline,
+        columns=columns,
+        reversed=", ".join(reversed(names)),
+        rounded=", ".join(rounded),
+        first=names[0],
+    )
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_duckdb_backend_matches_compare_dataframes(db_service, baseline, variant):
+    baseline_query, columns = BASELINES[baseline]
+    llm_query = _variant(baseline_query, columns, variant)
+    baseline_df = db_service.execute_sql_query(baseline_query, "duckdb")[0]
+    llm_df = db_service.execute_sql_query(llm_query, "duckdb")[0]
+
+    *_, metrics, timed_out = db_service.compare_with_baseline(llm_query, "duckdb", baseline_df, 1)
+
+    assert not timed_out
+    assert metrics == DataUtils.compare_dataframes(baseline_df, llm_df, 1)
+
+
+def _temporary_relations(db_service):
+    conn = db_service.get_connection("duckdb")
+    tables = conn.execute("SELECT table_name FROM duckdb_tables() WHERE temporary").fetchall()
+    views = conn.execute("SELECT view_name FROM duckdb_views() WHERE temporary AND NOT internal").fetchall()
+    return tables + views
+
+
+def test_temporary_tables_are_dropped_after_a_failing_query(db_service):
+    baseline_df = db_service.execute_sql_query(BASELINES["orders"][0], "duckdb")[0]
+    failing_query = "SELECT CAST(CASE WHEN o_orderkey = 30 THEN 'x' ELSE '1' END AS INTEGER) AS v FROM orders"
+
+    sample_df, executed, *_, metrics, timed_out = db_service.compare_with_baseline(
+        failing_query, "duckdb", baseline_df, 1
+    )
+
+    assert (sample_df, executed, metrics, timed_out) == (None, False, (0.0, 0.0, 0.0, 0.0), False)
+    assert _temporary_relations(db_service) == []
+
+    # and after a comparison
+    db_service.compare_with_baseline(BASELINES["orders"][0], "duckdb", baseline_df, 1)
+    assert _temporary_relations(db_service) == []
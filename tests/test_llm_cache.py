@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+import pytest
+
+from services.llm_cache import LLMResponseCache
+
+
+def _key(user_prompt="List the customers."):
+    return LLMResponseCache.make_key("ollama", "m", "sys", user_prompt, 0.1, 100)
+
+
+def test_responses_are_cached_between_runs(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode="readwrite")
+    cache.put(_key(), "SELECT c_name FROM customer", {"total_tokens": 42}, "ollama", "m")
+
+    cached = LLMResponseCache(str(tmp_path), mode="read")
+    assert cached.get(_key()) == ("SELECT c_name FROM customer", {"total_tokens": 42})
+    assert cached.get(_key("List the orders.")) is None
+    assert (cached.hits, cached.misses) == (1, 1)
+
+
+def test_modes(tmp_path):
+    LLMResponseCache(str(tmp_path)).put(_key(), "SELECT 1", {})
+
+    read = LLMResponseCache(str(tmp_path), mode="read")
+    read.put(_key("other"), "SELECT 2", {})
+    assert read.get(_key("other")) is None
+
+    refresh = LLMResponseCache(str(tmp_path), mode="refresh")
+    assert refresh.get(_key()) is None
+    refresh.put(_key(), "SELECT 3", {})
+    assert read.get(_key()) == ("SELECT 3", {})
+
+    # failed calls are not cached
+    LLMResponseCache(str(tmp_path)).put(_key("failed"), "", {})
+    assert read.get(_key("failed")) is None
+
+    with pytest.raises(ValueError):
+        LLMResponseCache(str(tmp_path), mode="write")
+
+
+def test_expired_entries_are_removed(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), max_age_days=1)
+    cache.put(_key(), "SELECT 1", {})
+    file_path = cache._entry_path(_key())
+    with open(file_path, encoding="utf-8") as file:
+        entry = json.load(file)
+    entry["created_at"] -= 2 * 24 * 3600
+    with open(file_path, "w", encoding="utf-8") as file:
+        json.dump(entry, file)
+
+    assert cache.get(_key()) is None
+    assert not os.path.exists(file_path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), max_size_mb=1)
+    sql_query = "SELECT '" + "x" * 300_000 + "'"
+    for number, user_prompt in enumerate(("first", "second", "third", "fourth")):
+        cache.put(_key(user_prompt), sql_query, {})
+        os.utime(cache._entry_path(_key(user_prompt)), (time.time() - 100 + number, time.time() - 100 + number))
+    # a read makes the first entry the most recently used
+    assert cache.get(_key("first")) is not None
+
+    assert cache.evict() == 1
+    assert cache.get(_key("second")) is None
+    assert all(cache.get(_key(user_prompt)) is not None for user_prompt in ("first", "third", "fourth"))
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from services.latency_tracker import LatencyTracker
+from services.llm_service import LLMService
+from utils.llm_utils import rate_limit_error, transient_error
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    """
+    Ollama chat endpoint answering with the SQL of its port, after the delay and with
+    the status of the next planned answer (200 once the plan is empty).
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            status, delay = server.plan.pop(0) if server.plan else (200, 0)
+        time.sleep(delay)
+
+        if status == 200:
+            answer = {
+                "message": {"content": f"```sql\nSELECT {server.server_address[1]}\n```"},
+                "prompt_eval_count": 11,
+                "eval_count": 7,
+            }
+        else:
+            answer = {"error": "unavailable"}
+        data = json.dumps(answer).encode()
+        try:
+            self.send_response(status)
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except ConnectionError:
+            pass  # the client timed out
+
+
+@pytest.fixture
+def ollama():
+    servers = []
+
+    def start(plan=()):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _OllamaHandler)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.plan = list(plan)
+        server.requests = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _config(server, provider_id, **config):
+    return {"id": provider_id, "endpoint": f"http://127.0.0.1:{server.server_address[1]}", "api_key": "k", **config}
+
+
+def _generate(service, model_config, question_number=1):
+    return service.generate_sql_query(
+        "ollama", {"name": "m"}, question_number, "q", 0.1, 100, "ctx", "sys", "rules", **model_config
+    )
+
+
+def test_transient_errors_are_retried(ollama):
+    server = ollama([(503, 0), (503, 0)])
+    service = LLMService(max_retries=2, retry_backoff=0.01)
+
+    sql_query, metadata_json = _generate(service, _config(server, "flaky"))
+    service.close()
+
+    assert f"SELECT {server.server_address[1]}" in sql_query
+    assert metadata_json["attempts"] == 3
+    assert server.requests == 3
+
+
+def test_retries_are_bounded(ollama):
+    server = ollama([(503, 0)] * 5)
+    service = LLMService(max_retries=1, retry_backoff=0.01)
+
+    sql_query, metadata_json = _generate(service, _config(server, "down"))
+    service.close()
+
+    assert sql_query == ""
+    assert metadata_json["attempts"] == 2
+    assert server.requests == 2
+
+
+def test_slow_requests_time_out_and_are_retried(ollama):
+    server = ollama([(200, 2)])
+    service = LLMService(max_retries=1, retry_backoff=0.01, request_timeout=0.5)
+
+    start = time.time()
+    sql_query, metadata_json = _generate(service, _config(server, "hang"))
+    service.close()
+
+    assert "SELECT" in sql_query
+    assert metadata_json["attempts"] == 2
+    assert time.time() - start < 2
+
+
+def test_slow_calls_are_hedged_to_the_hedge_provider(ollama):
+    primary = ollama([(200, 0.01)] * 5 + [(200, 2)])
+    hedge = ollama()
+    model_config = _config(primary, "slow", hedge=_config(hedge, "slow-hedge"))
+    service = LLMService(latency_tracker=LatencyTracker(min_samples=5))
+
+    for question_number in range(5):
+        _generate(service, model_config, question_number)
+    start = time.time()
+    sql_query, metadata_json = _generate(service, model_config, 5)
+    duration = time.time() - start
+    service.close()
+
+    # the duplicate answered first, the tokens of the slow request are wasted
+    assert f"SELECT {hedge.server_address[1]}" in sql_query
+    assert duration < 1
+    assert metadata_json["hedges"] == 1
+    assert metadata_json["attempts"] == 2
+    assert metadata_json["wasted_prompt_tokens"] == 11
+
+
+def test_hedge_delay_is_a_quantile_of_the_recent_durations():
+    tracker = LatencyTracker(window=20, min_samples=10, quantile=0.95)
+    key = ("provider", "model")
+
+    for duration in range(1, 10):
+        tracker.record(key, duration / 10)
+    # not enough samples yet
+    assert tracker.hedge_delay(key) is None
+
+    for duration in range(10, 30):
+        tracker.record(key, duration / 10)
+    # only the last 20 durations (1.0 to 2.9) are kept
+    assert tracker.hedge_delay(key) == 2.9
+    assert tracker.hedge_delay(("provider", "other")) is None
+
+
+def test_retry_delay_is_a_jittered_exponential_backoff():
+    service = LLMService(max_retries=3, retry_backoff=1, retry_backoff_max=3)
+    stats = service._new_stats()
+    error = requests.ConnectionError("connection reset")
+
+    for retries, backoff in enumerate((1, 2, 3)):
+        for _ in range(20):
+            assert 0 <= service._retry_delay(error, {"id": "p"}, retries, stats) <= backoff
+    # out of retries, or not transient
+    assert service._retry_delay(error, {"id": "p"}, 3, stats) is None
+    assert service._retry_delay(ValueError("bad request"), {"id": "p"}, 0, stats) is None
+
+
+def test_transient_errors_are_found_in_the_chained_exceptions():
+    response = requests.Response()
+    response.status_code = 429
+    response.headers["retry-after"] = "3"
+    try:
+        try:
+            raise requests.HTTPError(response=response)
+        except requests.HTTPError as e:
+            raise RuntimeError("LLM call failed") from e
+    except RuntimeError as e:
+        error = e
+
+    assert transient_error(error)
+    assert rate_limit_error(error) == (True, 3.0)
+    assert not transient_error(RuntimeError("LLM call failed"))
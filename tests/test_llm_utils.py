@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from utils.llm_utils import _astreamed_output, _streamed_output
+
+
+def _deltas(texts, usage, closed):
+    try:
+        for text in texts:
+            yield text
+        usage.update(prompt_tokens=40, completion_tokens=len(texts))
+    finally:
+        closed.append(True)
+
+
+async def _adeltas(texts, closed):
+    try:
+        for text in texts:
+            yield text
+    finally:
+        closed.append(True)
+
+
+def test_stream_stops_at_the_closing_sql_fence():
+    texts = ["Here is the query:\n", "```sql\nSELECT c_name", "\nFROM customer\n", "```", "\nIt lists", " the names."]
+    usage = {}
+    closed = []
+
+    output, metadata_json = _streamed_output(_deltas(texts, usage, closed), time.time(), usage, "x" * 160)
+
+    assert output == "".join(texts[:4])
+    assert closed == [True]
+    assert metadata_json["stream_stopped"]
+    assert metadata_json["time_to_sql"] is not None
+    # the stream was closed before the usage of the provider
+    assert metadata_json["usage_estimated"]
+    assert metadata_json["prompt_tokens"] == 40
+    assert metadata_json["completion_tokens"] == max(4, (len(output) + 3) // 4)
+
+
+def test_stream_without_sql_fence_is_read_to_its_end():
+    texts = ["SELECT c_name", " FROM customer"]
+    usage = {}
+    closed = []
+
+    output, metadata_json = _streamed_output(_deltas(texts, usage, closed), time.time(), usage, "prompt")
+
+    assert output == "SELECT c_name FROM customer"
+    assert not metadata_json["stream_stopped"]
+    assert metadata_json["time_to_sql"] is None
+    assert not metadata_json["usage_estimated"]
+    assert metadata_json["total_tokens"] == 42
+
+
+def test_async_stream_stops_at_the_closing_sql_fence():
+    texts = ["```sql\nSELECT 1\n", "```", " explanation"]
+    closed = []
+
+    output, metadata_json = asyncio.run(_astreamed_output(_adeltas(texts, closed), time.time(), {}, "prompt"))
+
+    assert output == "```sql\nSELECT 1\n```"
+    assert closed == [True]
+    assert metadata_json["stream_stopped"]
@@ -0,0 +1,78 @@
+import duckdb
+import pytest
+
+from utils.plan_utils import duckdb_plan_summary, format_plan_summary, plan_rejection
+
+
+@pytest.fixture(scope="module")
+def connection():
+    with duckdb.connect() as connection:
+        connection.execute(
+            "CREATE TABLE orders AS SELECT range AS o_orderkey, range % 5000 AS o_custkey FROM range(100000)"
+        )
+        connection.execute("CREATE TABLE customer AS SELECT range AS c_custkey FROM range(50000)")
+        yield connection
+
+
+def _summary(connection, sql_query):
+    # as DatabaseService.explain_sql_query
+    return duckdb_plan_summary(connection.execute(f"EXPLAIN (FORMAT json) {sql_query}").fetchall()[0][1])
+
+
+def test_hash_join_is_admitted(connection):
+    summary = _summary(connection, "SELECT * FROM orders JOIN customer ON o_custkey = c_custkey")
+
+    assert summary["operators"].get("HASH_JOIN") == 1
+    assert summary["cartesian_rows"] == 0
+    assert summary["estimated_rows"] > 0
+    assert plan_rejection(summary, baseline_rows=100000) is None
+
+
+def test_cross_join_is_rejected(connection):
+    summary = _summary(connection, "SELECT * FROM orders, customer")
+
+    assert summary["cartesian_rows"] == 100000 * 50000
+    assert plan_rejection(summary, baseline_rows=100000) == "cartesian product of 5,000,000,000 estimated rows"
+    assert "cartesian product of 5,000,000,000 rows" in format_plan_summary(summary)
+
+
+def test_scalar_subquery_cross_product_is_not_cartesian(connection):
+    summary = _summary(connection, "SELECT o_orderkey, (SELECT MAX(c_custkey) FROM customer) FROM orders")
+
+    assert summary["operators"].get("CROSS_PRODUCT") == 1
+    assert summary["cartesian_rows"] == 0
+    assert plan_rejection(summary, baseline_rows=100000) is None
+
+
+def test_top_n_rows_are_its_top(connection):
+    summary = _summary(connection, "SELECT * FROM orders ORDER BY o_orderkey LIMIT 10")
+
+    assert summary["operators"].get("TOP_N") == 1
+    assert summary["estimated_rows"] == 10
+    assert plan_rejection(summary, baseline_rows=10) is None
+
+    # the whole cross product is sorted
+    summary = _summary(connection, "SELECT * FROM orders, customer ORDER BY o_orderkey LIMIT 10")
+    assert plan_rejection(summary, baseline_rows=10) is not None
+
+
+def test_cross_product_stopped_by_a_limit_is_admitted(connection):
+    summary = _summary(connection, "SELECT * FROM orders, customer LIMIT 10")
+
+    assert summary["estimated_rows"] is None
+    assert summary["cartesian_rows"] == 0
+    assert plan_rejection(summary, baseline_rows=10) is None
+
+    # the limit is applied after the aggregate of the whole cross product
+    summary = _summary(connection, "SELECT o_custkey, COUNT(*) FROM orders, customer GROUP BY o_custkey LIMIT 10")
+    assert plan_rejection(summary, baseline_rows=10) is not None
+
+
+def test_far_more_rows_than_the_baseline_are_rejected(connection):
+    summary = _summary(connection, "SELECT * FROM orders")
+
+    assert (
+        plan_rejection(summary, baseline_rows=10, min_rows=1000) == "100,000 estimated rows for a baseline of 10 row(s)"
+    )
+    assert plan_rejection(summary, baseline_rows=10) is None
+    assert plan_rejection(summary, baseline_rows=None, min_rows=1000) is None
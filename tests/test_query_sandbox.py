@@ -0,0 +1,45 @@
+import duckdb
+import pytest
+
+from services.query_sandbox import QuerySandbox
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    database_path = str(tmp_path / "tpch.db")
+    with duckdb.connect(database_path) as connection:
+        connection.execute(
+            "CREATE TABLE nation AS SELECT range AS n_nationkey, 'NATION ' || range AS n_name FROM range(25)"
+        )
+    sandbox = QuerySandbox(database_path, max_workers=1, memory_limit="256MB", threads=1, max_memory_mb=0)
+    sandbox.start()
+    yield sandbox
+    sandbox.close()
+
+
+def test_queries_run_in_a_worker_process(sandbox):
+    table, duration_sql = sandbox.execute("SELECT n_nationkey, n_name FROM nation WHERE n_nationkey < 3")
+
+    assert table.column_names == ["n_nationkey", "n_name"]
+    assert table.column("n_name").to_pylist() == ["NATION 0", "NATION 1", "NATION 2"]
+    assert duration_sql >= 0
+
+
+def test_failed_queries_raise_and_keep_the_worker(sandbox):
+    with pytest.raises(RuntimeError, match="missing_table"):
+        sandbox.execute("SELECT * FROM missing_table")
+
+    assert sandbox.execute("SELECT COUNT(*) AS nations FROM nation")[0].column("nations").to_pylist() == [25]
+
+
+def test_the_database_is_read_only(sandbox):
+    with pytest.raises(RuntimeError):
+        sandbox.execute("DROP TABLE nation")
+
+
+def test_slow_queries_are_killed_at_their_timeout(sandbox):
+    with pytest.raises(TimeoutError):
+        sandbox.execute("SELECT COUNT(*) FROM range(100000000000) a", timeout=0.5)
+
+    # the worker was replaced
+    assert sandbox.execute("SELECT 1 AS one", timeout=30)[0].column("one").to_pylist() == [1]
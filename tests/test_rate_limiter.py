@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from services.rate_limiter import RateLimiter
+
+
+def test_concurrency_is_halved_once_per_429_burst(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    limiter = RateLimiter("provider", max_concurrency=8, backoff=0)
+    for _ in range(8):
+        limiter.acquire(100)
+
+    # the requests in flight when the first 429 was answered are refused as well
+    for _ in range(3):
+        limiter.release(100, rate_limited=True, retry_after=5)
+
+    assert limiter.limit == 4
+    assert limiter.rate_limited == 3
+    # the next request waits for the Retry-After of the provider
+    limiter.release(100)
+    limiter.release(100)
+    limiter.acquire(100)
+    assert 4.9 < sleeps[-1] <= 5
+
+
+def test_concurrency_grows_back_up_to_max_concurrency():
+    limiter = RateLimiter("provider", max_concurrency=4, backoff=0)
+    limiter.acquire(100)
+    limiter.release(100, rate_limited=True)
+    assert limiter.limit == 2
+
+    # about one more slot every `limit` successful calls
+    for _ in range(2):
+        limiter.acquire(100)
+        limiter.release(100)
+    assert 2 < limiter.limit < 3
+    limiter.acquire(100)
+    limiter.release(100)
+    assert int(limiter.limit) == 3
+
+    for _ in range(20):
+        limiter.acquire(100)
+        limiter.release(100)
+    assert limiter.limit == 4
+
+
+def test_no_concurrency_limit_until_the_first_429():
+    limiter = RateLimiter("provider", backoff=0)
+    for _ in range(10):
+        limiter.acquire(100)
+    assert limiter.limit is None and limiter.in_flight == 10
+
+    limiter.release(100, rate_limited=True)
+    # half of the requests in flight when the provider refused one
+    assert limiter.limit == 5
+    assert not limiter._has_slot()
+
+
+def test_requests_wait_for_the_rpm_budget(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    limiter = RateLimiter("provider", rpm=60)
+
+    for _ in range(61):
+        limiter.acquire(100)
+        limiter.release(100)
+
+    # a minute of budget is available at once, then one request per second
+    assert len(sleeps) == 1
+    assert 0.9 < sleeps[0] <= 1
+
+
+def test_used_tokens_correct_the_tpm_budget(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    limiter = RateLimiter("provider", tpm=6000)
+
+    limiter.acquire(5000)
+    # the provider reported fewer tokens than estimated
+    limiter.release(5000, used_tokens=1000)
+    limiter.acquire(5000)
+
+    assert sleeps == []
+
+
+def test_async_callers_wait_for_a_free_slot():
+    limiter = RateLimiter("provider", max_concurrency=1)
+    limiter.acquire(100)
+
+    async def acquire():
+        task = asyncio.create_task(limiter.aacquire(100))
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        limiter.release(100)
+        return await task
+
+    assert asyncio.run(acquire()) >= 0.05
+    assert limiter.in_flight == 1
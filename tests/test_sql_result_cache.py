@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from services.sql_result_cache import SQLResultCache
+
+
+def _result(value):
+    # about 0.08 MB each
+    return pd.DataFrame({"o_orderkey": range(5_000), "value": [value] * 5_000})
+
+
+def _execute(df):
+    def execute():
+        execute.calls += 1
+        return df, 1.5
+
+    execute.calls = 0
+    return execute
+
+
+def test_spilled_results_are_read_back(tmp_path):
+    cache = SQLResultCache(max_memory_mb=0.1, spill_dir=str(tmp_path))
+    first = _execute(_result(1))
+    cache.get_or_execute("duckdb", "SELECT * FROM orders WHERE value = 1", first)
+    cache.get_or_execute("duckdb", "SELECT * FROM orders WHERE value = 2", _execute(_result(2)))
+
+    # the first result was spilled when the second one was cached
+    assert len(os.listdir(tmp_path)) == 1
+
+    df, duration_sql, cache_hit = cache.get_or_execute("duckdb", "SELECT * FROM orders WHERE value = 1", first)
+    assert cache_hit
+    assert first.calls == 1
+    assert duration_sql == 1.5
+    pd.testing.assert_frame_equal(df, _result(1))
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_spill_files_are_written_and_read_without_the_lock(tmp_path, monkeypatch):
+    cache = SQLResultCache(max_memory_mb=0.1, spill_dir=str(tmp_path))
+    write_feather = feather.write_feather
+    read_feather = feather.read_feather
+    locked = []
+
+    def checked_write(*args, **kwargs):
+        locked.append(cache._lock.locked())
+        return write_feather(*args, **kwargs)
+
+    def checked_read(*args, **kwargs):
+        locked.append(cache._lock.locked())
+        return read_feather(*args, **kwargs)
+
+    monkeypatch.setattr(feather, "write_feather", checked_write)
+    monkeypatch.setattr(feather, "read_feather", checked_read)
+
+    for value in (1, 2, 1):
+        cache.get_or_execute("duckdb", f"SELECT * FROM orders WHERE value = {value}", _execute(_result(value)))
+
+    # two spills and one read back
+    assert locked == [False, False, False]
+
+
+def test_clear_removes_the_spilled_results(tmp_path):
+    cache = SQLResultCache(max_memory_mb=0.1, spill_dir=str(tmp_path))
+    for value in (1, 2, 3):
+        cache.get_or_execute("duckdb", f"SELECT * FROM orders WHERE value = {value}", _execute(_result(value)))
+    assert os.listdir(tmp_path)
+
+    cache.clear()
+
+    assert os.listdir(tmp_path) == []
+    execute = _execute(_result(1))
+    cache.get_or_execute("duckdb", "SELECT * FROM orders WHERE value = 1", execute)
+    assert execute.calls == 1
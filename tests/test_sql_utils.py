@@ -0,0 +1,101 @@
+import pandas as pd
+
+from services.sql_result_cache import SQLResultCache
+from utils.sql_utils import canonicalize_sql, has_complete_sql_block, remove_quotations
+
+
+def test_canonicalize_sql_ignores_whitespace_case_and_comments():
+    first, _ = canonicalize_sql("SELECT  c_name\nFROM customer -- all\nWHERE c_custkey = 1;")
+    second, _ = canonicalize_sql("select C_NAME from CUSTOMER /* all */ where c_custkey = 1")
+
+    assert first == second
+
+
+def test_canonicalize_sql_renames_aliases_positionally():
+    first, first_aliases = canonicalize_sql(
+        "SELECT o.o_orderdate AS d, SUM(l.l_tax) AS total FROM orders AS ord JOIN lineitem AS l "
+        "ON ord.o_orderkey = l.l_orderkey GROUP BY 1 ORDER BY total DESC"
+    )
+    second, second_aliases = canonicalize_sql(
+        "SELECT o.o_orderdate AS day, SUM(l.l_tax) AS tax FROM orders AS o2 JOIN lineitem AS l "
+        "ON o2.o_orderkey = l.l_orderkey GROUP BY 1 ORDER BY tax DESC"
+    )
+
+    assert first == second
+    assert first_aliases == ["d", "total", "ord"]
+    assert second_aliases == ["day", "tax", "o2"]
+
+
+def test_canonicalize_sql_keeps_the_types_of_cast():
+    canonical, aliases = canonicalize_sql("SELECT CAST(x AS INTEGER) AS v FROM t ORDER BY v")
+
+    assert "as integer" in canonical
+    assert aliases == ["v"]
+
+
+def test_canonicalize_sql_alias_named_as_a_table():
+    orders, _ = canonicalize_sql("SELECT COUNT(*) AS orders FROM orders")
+    lineitem, _ = canonicalize_sql("SELECT COUNT(*) AS lineitem FROM lineitem")
+
+    assert orders != lineitem
+
+
+def test_canonicalize_sql_alias_named_as_a_column():
+    first, _ = canonicalize_sql("SELECT b AS a, a AS b FROM t")
+    second, _ = canonicalize_sql("SELECT b AS c, c AS b FROM t")
+
+    assert first != second
+
+
+def test_canonicalize_sql_alias_named_as_a_qualified_column():
+    first, _ = canonicalize_sql("SELECT COUNT(*) AS total FROM t WHERE t.total > 0")
+    second, _ = canonicalize_sql("SELECT COUNT(*) AS amount FROM t WHERE t.amount > 0")
+
+    assert first != second
+
+
+def test_canonicalize_sql_alias_in_a_window_order_by():
+    first, _ = canonicalize_sql("SELECT SUM(x) AS s, RANK() OVER (ORDER BY s) FROM t")
+    second, _ = canonicalize_sql("SELECT SUM(x) AS r, RANK() OVER (ORDER BY r) FROM t")
+
+    assert first != second
+
+
+def test_sql_result_cache_does_not_mix_tables_named_as_aliases():
+    cache = SQLResultCache(max_memory_mb=16, spill_dir="")
+    counts = {"orders": 20000, "lineitem": 80000}
+
+    def execute(table):
+        return lambda: (pd.DataFrame({table: [counts[table]]}), 0.1)
+
+    orders, _, orders_hit = cache.get_or_execute("duckdb", "SELECT COUNT(*) AS orders FROM orders", execute("orders"))
+    lineitem, _, lineitem_hit = cache.get_or_execute(
+        "duckdb", "SELECT COUNT(*) AS lineitem FROM lineitem", execute("lineitem")
+    )
+
+    assert not orders_hit and not lineitem_hit
+    assert orders.iloc[0, 0] == 20000
+    assert lineitem.iloc[0, 0] == 80000
+
+
+def test_sql_result_cache_renames_the_aliases_of_a_hit():
+    cache = SQLResultCache(max_memory_mb=16, spill_dir="")
+    execute = lambda: (pd.DataFrame({"total": [1.5]}), 0.1)  # noqa: E731
+
+    cache.get_or_execute("duckdb", "SELECT SUM(x) AS total FROM t ORDER BY total", execute)
+    df, duration_sql, hit = cache.get_or_execute("duckdb", "select sum(x) as amount from t order by amount", execute)
+
+    assert hit
+    assert duration_sql == 0.1
+    assert list(df.columns) == ["amount"]
+
+
+def test_has_complete_sql_block_waits_for_the_closing_fence():
+    assert not has_complete_sql_block("Here is the query:\n```sql\nSELECT c_name FROM customer")
+    assert not has_complete_sql_block("```sql\n```")
+    assert not has_complete_sql_block("SELECT c_name FROM customer")
+
+    text = "Here is the query:\n```sql\nSELECT c_name FROM customer\n```"
+    assert has_complete_sql_block(text)
+    # the block is the one remove_quotations extracts from the whole response
+    assert remove_quotations(text + "\nIt lists the names.") == remove_quotations(text)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from utils.data_utils import DataUtils
+from utils.streaming_comparison import StreamingComparator
+
+BASELINE = pd.DataFrame({"n_nationkey": [1, 2, 3], "n_regionkey": [10, 20, 30]})
+
+
+def cartesian_chunks(chunk_rows, chunks):
+    """Chunks of a 10-column result holding the baseline rows many times."""
+    rng = np.random.default_rng(0)
+    for _ in range(chunks):
+        keys = np.tile([1, 2, 3], chunk_rows // 3 + 1)[:chunk_rows]
+        columns = {"key": keys, "region": keys * 10}
+        for i in range(8):
+            columns[f"extra_{i}"] = rng.integers(0, 1000, chunk_rows)
+        yield pd.DataFrame(columns)
+
+
+def test_stops_on_the_first_chunk_over_the_baseline_rows():
+    comparator = StreamingComparator(BASELINE, 1, buffer_rows=1_000_000)
+
+    read = 0
+    for chunk in cartesian_chunks(1024, 1024):
+        read += 1
+        if not comparator.update(chunk):
+            break
+
+    assert read == 1
+    assert comparator.rows == 1024
+    rows_equality, _, datasets_equality, multiset_equality = comparator.result()
+    assert rows_equality == 0.0
+    assert datasets_equality == 1.0
+    assert multiset_equality == 1.0
+
+
+def test_stops_when_the_columns_cannot_match():
+    comparator = StreamingComparator(BASELINE, 1, buffer_rows=1_000_000)
+    chunk = pd.DataFrame({"key": np.arange(100)})
+
+    assert not comparator.update(chunk)
+    assert comparator.result() == (0.0, 0.5, 0.0, 0.0)
+
+
+def test_results_within_the_baseline_are_compared_as_a_whole():
+    llm_df = pd.DataFrame({"region": [30, 10], "key": [3, 1]})
+    comparator = StreamingComparator(BASELINE, 1)
+
+    assert comparator.update(llm_df.iloc[:1])
+    assert comparator.update(llm_df.iloc[1:])
+    assert comparator.result() == DataUtils.compare_dataframes(BASELINE, llm_df, 1)
+
+
+def test_max_rows_stops_the_comparison():
+    comparator = StreamingComparator(BASELINE, 1, max_rows=2)
+
+    assert not comparator.update(BASELINE.iloc[:2])
+    assert comparator.stopped
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from core.task_scheduler import TaskScheduler
+from services.rate_limiter import RateLimiter
+
+
+class _QuestionProcessor:
+    """Records the tasks running at once, in total and per provider."""
+
+    def __init__(self, delay=0.02, fail_question=None, rate_limiters=None, refused=()):
+        self.delay = delay
+        self.fail_question = fail_question
+        # the LLM calls of each provider go through its rate limiter, as in LLMService
+        self.rate_limiters = rate_limiters or {}
+        # providers answering 429 to every call
+        self.refused = refused
+        self.max_wait = 0.0
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+        self.max_total = 0
+
+    def process_question(self, question, model, model_config, **kwargs):
+        provider_id = model_config["id"]
+        with self.lock:
+            self.running[provider_id] = self.running.get(provider_id, 0) + 1
+            self.max_running[provider_id] = max(self.max_running.get(provider_id, 0), self.running[provider_id])
+            self.max_total = max(self.max_total, sum(self.running.values()))
+        rate_limiter = self.rate_limiters.get(provider_id)
+        try:
+            if rate_limiter is not None:
+                wait = rate_limiter.acquire(0)
+                with self.lock:
+                    self.max_wait = max(self.max_wait, wait)
+            time.sleep(self.delay)
+            if rate_limiter is not None:
+                rate_limiter.release(0, rate_limited=provider_id in self.refused, retry_after=0)
+            if question["question_number"] == self.fail_question:
+                raise RuntimeError("question failed")
+            question["processed"] = model["name"]
+            return f"{model['name']}\t{question['question_number']}"
+        finally:
+            with self.lock:
+                self.running[provider_id] -= 1
+
+
+def _run(scheduler, models, questions):
+    return list(scheduler.run(models, questions, None, "sys", "rules", 0.1, 100, 1, "duckdb"))
+
+
+def test_tasks_are_bounded_by_the_workers_and_the_providers():
+    processor = _QuestionProcessor()
+    models = [
+        ({"name": "a"}, {"id": "slow", "max_concurrency": 1}),
+        ({"name": "b"}, {"id": "fast"}),
+        ({"name": "c"}, {"id": "fast"}),
+    ]
+    questions = [{"question_number": number} for number in range(1, 7)]
+
+    results = _run(TaskScheduler(processor, max_workers=4), models, questions)
+
+    assert processor.max_running["slow"] == 1
+    assert processor.max_total == 4
+    # one result per model, in the order of the models and of the questions
+    assert [model["name"] for model, _, _ in results] == ["a", "b", "c"]
+    assert results[1][2] == [f"b\t{number}" for number in range(1, 7)]
+    assert [question["processed"] for question in results[2][1]] == ["c"] * 6
+    # each task works on its own copy of the question
+    assert questions == [{"question_number": number} for number in range(1, 7)]
+
+
+def test_provider_tasks_follow_the_limit_of_the_rate_limiter():
+    rate_limiters = {"limited": RateLimiter("limited", max_concurrency=4), "other": RateLimiter("other")}
+    # halved twice by 429 answers
+    rate_limiters["limited"].limit = 1.0
+    processor = _QuestionProcessor(delay=0.05, rate_limiters=rate_limiters, refused=("limited",))
+    models = [
+        ({"name": "a"}, {"id": "limited", "max_concurrency": 4}),
+        ({"name": "b"}, {"id": "other"}),
+    ]
+    questions = [{"question_number": number} for number in range(1, 7)]
+    scheduler = TaskScheduler(processor, max_workers=4, get_rate_limiter=lambda config: rate_limiters[config["id"]])
+
+    _run(scheduler, models, questions)
+
+    assert processor.max_running["limited"] == 1
+    # the workers the limited provider cannot use run the tasks of the other one
+    assert processor.max_running["other"] == 3
+    # no worker waits for a slot of the rate limiter
+    assert processor.max_wait < 0.05
+
+
+def test_failed_task_is_raised():
+    processor = _QuestionProcessor(fail_question=2)
+    models = [({"name": "a"}, {"id": "p", "max_concurrency": 1}), ({"name": "b"}, {"id": "p"})]
+    questions = [{"question_number": number} for number in range(1, 4)]
+
+    with pytest.raises(RuntimeError, match="question failed"):
+        _run(TaskScheduler(processor, max_workers=1), models, questions)
+
+
+def test_max_workers_must_be_positive():
+    with pytest.raises(ValueError):
+        TaskScheduler(_QuestionProcessor(), max_workers=0)